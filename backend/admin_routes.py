@@ -0,0 +1,112 @@
+"""
+Admin Routes - Profiling, slow request and logging diagnostics
+"""
+from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from typing import Optional
+from config import PROFILER_DEFAULT_INTERVAL_MS, PROFILER_MAX_SECONDS
+from diagnostics import profiler, slow_requests
+import structured_logging
+import logging
+import hmac
+import os
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Check X-Admin-Token against ADMIN_TOKEN (the endpoints stay disabled while ADMIN_TOKEN is unset)"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if not hmac.compare_digest(x_admin_token or "", expected):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+class ProfilerStartRequest(BaseModel):
+    interval_ms: float = PROFILER_DEFAULT_INTERVAL_MS
+    duration_seconds: float = 30.0
+    include_idle: bool = False
+
+class LoggingConfig(BaseModel):
+    level: Optional[str] = None
+    sample_rate: Optional[float] = None
+    redact_content: Optional[bool] = None
+
+class SlowRequestConfig(BaseModel):
+    threshold_ms: Optional[float] = None
+    buffer_size: Optional[int] = None
+
+
+@router.post("/profiler/start")
+async def start_profiler(request: ProfilerStartRequest):
+    """Start a sampling session; it stops by itself after duration_seconds"""
+    if request.interval_ms <= 0 or request.duration_seconds <= 0:
+        raise HTTPException(status_code=400, detail="interval_ms and duration_seconds must be positive")
+    if request.duration_seconds > PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"duration_seconds is capped at {PROFILER_MAX_SECONDS}")
+    try:
+        profiler.start(request.interval_ms, request.duration_seconds, request.include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profiler.status()
+
+
+@router.post("/profiler/stop", response_class=PlainTextResponse)
+def stop_profiler():
+    """Stop sampling and return the profile as folded stacks (feed to flamegraph.pl or speedscope)"""
+    profiler.stop()
+    return PlainTextResponse(profiler.folded())
+
+
+@router.get("/profiler")
+async def profiler_status():
+    return profiler.status()
+
+
+@router.get("/profiler/folded", response_class=PlainTextResponse)
+async def profiler_folded():
+    """Folded stacks of the running or most recent session"""
+    return PlainTextResponse(profiler.folded())
+
+
+@router.get("/slow-requests")
+async def list_slow_requests(limit: int = 20, path: Optional[str] = None):
+    """Most recent requests over the threshold, newest first, with per-stage timings"""
+    return {
+        **slow_requests.status(),
+        "requests": slow_requests.list(limit=max(1, limit), path_prefix=path),
+    }
+
+
+@router.post("/slow-requests/config")
+async def configure_slow_requests(config: SlowRequestConfig):
+    if config.threshold_ms is not None and config.threshold_ms < 0:
+        raise HTTPException(status_code=400, detail="threshold_ms must not be negative")
+    if config.buffer_size is not None and config.buffer_size < 1:
+        raise HTTPException(status_code=400, detail="buffer_size must be at least 1")
+    slow_requests.configure(threshold_ms=config.threshold_ms, size=config.buffer_size)
+    return slow_requests.status()
+
+
+@router.delete("/slow-requests")
+async def clear_slow_requests():
+    slow_requests.clear()
+    return slow_requests.status()
+
+
+@router.get("/logging")
+async def logging_status():
+    """Log level, sampling, redaction and queue/drop counters"""
+    return structured_logging.stats()
+
+
+@router.post("/logging")
+async def configure_logging(config: LoggingConfig):
+    if config.level is not None and not isinstance(logging.getLevelName(config.level.upper()), int):
+        raise HTTPException(status_code=400, detail=f"Unknown log level: {config.level}")
+    if config.sample_rate is not None and not 0 <= config.sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
+    structured_logging.configure(level=config.level, sample_rate=config.sample_rate, redact=config.redact_content)
+    return structured_logging.stats()
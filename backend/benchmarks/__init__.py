@@ -0,0 +1,3 @@
+"""
+Benchmarks - Load tests and stand-in services for performance work
+"""
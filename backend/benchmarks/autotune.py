@@ -0,0 +1,302 @@
+"""
+Autotune - Sweep Ollama options per model profile and keep the Pareto front
+
+For each profile in config.MODELS, candidate option sets are built around
+the current options: the current set, one-at-a-time variants of num_ctx,
+num_predict, num_thread, top_k and the mirostat settings, and a few random
+combinations. Candidates whose context window can't hold the longest
+prompt plus num_predict are skipped. Each candidate gets one warm-up
+request (Ollama reloads the model when num_ctx or num_thread change),
+then streams every prompt and records:
+- time to first token (client side) and total latency
+- generation speed (eval_count / eval_duration)
+- answer length and completion rate (answers not cut off at num_predict)
+
+The Pareto front over (TTFT low, tokens/s high, completion high) is kept
+per profile. From the front, the candidate with the lowest median total
+latency whose completion rate is at least --min-completion (or the
+current options' rate, if lower) becomes the profile's options. The output
+file is loaded by config.py in place of the built-in options.
+
+Usage:
+    cd backend
+    python -m benchmarks.autotune --mock-ollama          # stand-in server with option costs (model_profiles.mock.json)
+    python -m benchmarks.autotune --profiles fast,ultra_fast --repeats 2 --output model_profiles.json
+    python -m benchmarks.autotune --prompts prompts.txt  # one prompt per line (or JSON lines with "prompt")
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+import requests
+
+from benchmarks.load_test import SAMPLE_QUESTIONS, make_document, percentile, _git_commit
+from benchmarks.mock_ollama import MockOllamaConfig, start_mock_ollama
+from config import MODELS, OLLAMA_URL, MAX_CONTEXT_LENGTH, MODEL_PROFILES_PATH
+
+# Same shape as the mixed-mode prompt built by query_llama
+MIXED_PROMPT = """Answer the question using both the provided document content and your general knowledge for a comprehensive response.
+
+DOCUMENT CONTENT:
+{context}
+
+USER QUESTION: {question}
+
+Please provide a comprehensive answer combining the document information with relevant general knowledge:"""
+
+# Stand-in results never land where config.py looks by default
+MOCK_OUTPUT = "model_profiles.mock.json"
+
+CHARS_PER_TOKEN = 4  # Rough estimate, used only to rule out windows that can't hold the prompt
+
+
+def search_space(cores: int) -> Dict[str, list]:
+    return {
+        "num_ctx": [1024, 2048, 4096],
+        "num_predict": [192, 256, 400, 512],
+        "num_thread": [0, max(1, cores // 2), cores],
+        "top_k": [10, 20, 40],
+        "mirostat": [0, 2],
+        "mirostat_tau": [3.0, 5.0],
+    }
+
+
+def default_prompts() -> List[str]:
+    """Questions with and without retrieved context, sized like real chat requests"""
+    context = make_document(4).decode()[:MAX_CONTEXT_LENGTH]
+    prompts = []
+    for i, question in enumerate(SAMPLE_QUESTIONS):
+        if i % 2 == 0:
+            prompts.append(MIXED_PROMPT.format(context=context, question=question))
+        else:
+            prompts.append(f"Question: {question}\n\nAnswer:")
+    return prompts
+
+
+def load_prompts(path: str) -> List[str]:
+    prompts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            prompts.append(json.loads(line)["prompt"] if line.startswith("{") else line)
+    return prompts
+
+
+def normalize(options: dict) -> dict:
+    """Drop mirostat tuning when mirostat is off (Ollama ignores it)"""
+    options = dict(options)
+    if not options.get("mirostat"):
+        options.pop("mirostat_tau", None)
+        options.pop("mirostat_eta", None)
+    return options
+
+
+def context_fits(options: dict, prompt_tokens: int) -> bool:
+    return options.get("num_ctx", 2048) >= prompt_tokens + max(options.get("num_predict", 128), 0)
+
+
+def candidates(baseline: dict, space: Dict[str, list], random_count: int, rng: random.Random,
+               prompt_tokens: int) -> List[dict]:
+    """Current options first, then one-at-a-time variants and random combinations that fit the prompts"""
+    base = normalize(baseline)
+    found = [base]
+    for key, values in space.items():
+        for value in values:
+            if base.get(key) != value:
+                found.append(normalize({**base, key: value}))
+    for _ in range(random_count):
+        found.append(normalize({**base, **{key: rng.choice(values) for key, values in space.items()}}))
+
+    unique, seen = [], set()
+    for options in found:
+        key = json.dumps(options, sort_keys=True)
+        if key in seen:
+            continue
+        seen.add(key)
+        # Keep the current options even if they don't fit, so the report shows it
+        if options is base or context_fits(options, prompt_tokens):
+            unique.append(options)
+    return unique
+
+
+def run_request(session: requests.Session, url: str, model: str, prompt: str, options: dict,
+                timeout: float) -> dict:
+    """One streamed generation: TTFT, total latency, tokens/s, answer length, truncation"""
+    payload = {"model": model, "prompt": prompt, "stream": True, "options": options}
+    start = time.perf_counter()
+    ttft = None
+    final = {}
+    with session.post(url, json=payload, stream=True, timeout=(5, timeout)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if ttft is None and chunk.get("response"):
+                ttft = time.perf_counter() - start
+            if chunk.get("done"):
+                final = chunk  # Keep reading to the end of the stream so the connection can be reused
+    total = time.perf_counter() - start
+    eval_count = final.get("eval_count") or 0
+    eval_seconds = (final.get("eval_duration") or 0) / 1e9
+    limit = options.get("num_predict")
+    if "done_reason" in final:
+        truncated = final["done_reason"] == "length"
+    else:
+        truncated = bool(limit and limit > 0 and eval_count >= limit)
+    return {
+        "ttft_ms": (ttft if ttft is not None else total) * 1000,
+        "total_ms": total * 1000,
+        "tokens_per_second": eval_count / eval_seconds if eval_count and eval_seconds else 0.0,
+        "answer_tokens": eval_count,
+        "truncated": truncated,
+    }
+
+
+def evaluate(session: requests.Session, url: str, model: str, options: dict, prompts: List[str],
+             repeats: int, timeout: float) -> dict:
+    """Median metrics of one candidate over the prompt set"""
+    run_request(session, url, model, prompts[0], options, timeout)  # Warm-up (model reload)
+    runs = [run_request(session, url, model, prompt, options, timeout)
+            for _ in range(repeats) for prompt in prompts]
+    return {
+        "ttft_ms": percentile([r["ttft_ms"] for r in runs], 50),
+        "total_ms": percentile([r["total_ms"] for r in runs], 50),
+        "total_ms_p95": percentile([r["total_ms"] for r in runs], 95),
+        "tokens_per_second": percentile([r["tokens_per_second"] for r in runs], 50),
+        "answer_tokens": round(sum(r["answer_tokens"] for r in runs) / len(runs), 1),
+        "completion_rate": round(sum(not r["truncated"] for r in runs) / len(runs), 3),
+    }
+
+
+def dominates(a: dict, b: dict) -> bool:
+    """a is at least as good as b on every objective and better on one"""
+    at_least = (a["ttft_ms"] <= b["ttft_ms"] and a["tokens_per_second"] >= b["tokens_per_second"]
+                and a["completion_rate"] >= b["completion_rate"])
+    better = (a["ttft_ms"] < b["ttft_ms"] or a["tokens_per_second"] > b["tokens_per_second"]
+              or a["completion_rate"] > b["completion_rate"])
+    return at_least and better
+
+
+def pareto_front(results: List[dict]) -> List[dict]:
+    front = [r for r in results if not any(dominates(other["metrics"], r["metrics"]) for other in results)]
+    return sorted(front, key=lambda r: r["metrics"]["ttft_ms"])
+
+
+def select(front: List[dict], baseline: dict, min_completion: float) -> dict:
+    """Fastest front member (median total latency) that completes answers about as often as required"""
+    required = min(min_completion, baseline["metrics"]["completion_rate"])
+    eligible = [r for r in front if r["metrics"]["completion_rate"] >= required]
+    if not eligible:
+        return baseline
+    return min(eligible, key=lambda r: r["metrics"]["total_ms"])
+
+
+def tune_profile(session: requests.Session, url: str, profile_name: str, prompts: List[str], args,
+                 rng: random.Random) -> dict:
+    profile = MODELS[profile_name]
+    prompt_tokens = max(len(p) for p in prompts) // CHARS_PER_TOKEN
+    options_list = candidates(profile["options"], search_space(args.cores), args.random, rng, prompt_tokens)
+    print(f"\n{profile_name} ({profile['name']}): {len(options_list)} candidates x "
+          f"{len(prompts) * args.repeats} requests")
+
+    results = []
+    for i, options in enumerate(options_list):
+        try:
+            metrics = evaluate(session, url, profile["name"], options, prompts, args.repeats, args.timeout)
+        except (requests.RequestException, ValueError) as e:
+            print(f"  [{i + 1}/{len(options_list)}] failed: {e}")
+            continue
+        results.append({"options": options, "metrics": metrics})
+        print(f"  [{i + 1}/{len(options_list)}] ttft {metrics['ttft_ms']:.0f} ms, "
+              f"{metrics['tokens_per_second']:.1f} tok/s, total {metrics['total_ms']:.0f} ms, "
+              f"{metrics['answer_tokens']:.0f} tokens, complete {metrics['completion_rate']:.0%}")
+    if not results or results[0]["options"] != options_list[0]:
+        raise RuntimeError(f"Current options of {profile_name} could not be measured")
+
+    baseline = results[0]
+    front = pareto_front(results)
+    chosen = select(front, baseline, args.min_completion)
+    base, best = baseline["metrics"], chosen["metrics"]
+    print(f"  Pareto front: {len(front)} of {len(results)}; chosen total {best['total_ms']:.0f} ms "
+          f"(was {base['total_ms']:.0f}), ttft {best['ttft_ms']:.0f} ms (was {base['ttft_ms']:.0f})")
+    return {"baseline": baseline, "front": front, "chosen": chosen}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune Ollama options per model profile")
+    parser.add_argument("--profiles", default=",".join(MODELS), help="Comma-separated MODELS profiles")
+    parser.add_argument("--url", default=OLLAMA_URL, help="Ollama /api/generate URL")
+    parser.add_argument("--mock-ollama", action="store_true", help="Start the stand-in server with option costs")
+    parser.add_argument("--prompts", help="Prompt file (one per line, or JSON lines with a prompt key)")
+    parser.add_argument("--repeats", type=int, default=1, help="Passes over the prompt set per candidate")
+    parser.add_argument("--random", type=int, default=6, help="Random option combinations per profile")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 4, help="Cores for the num_thread sweep")
+    parser.add_argument("--min-completion", type=float, default=0.9,
+                        help="Share of answers that must finish before num_predict")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help=f"Default {MODEL_PROFILES_PATH} ({MOCK_OUTPUT} with --mock-ollama)")
+    args = parser.parse_args()
+
+    profiles = [name.strip() for name in args.profiles.split(",") if name.strip()]
+    unknown = [name for name in profiles if name not in MODELS]
+    if unknown:
+        parser.error(f"Unknown profiles: {', '.join(unknown)}")
+
+    url = args.url
+    output = args.output or (MOCK_OUTPUT if args.mock_ollama else MODEL_PROFILES_PATH)
+    if args.mock_ollama:
+        server = start_mock_ollama(MockOllamaConfig(
+            prefill_ms=40, tokens_per_second=1500, num_tokens=150, num_tokens_spread=300,
+            option_costs=True, cpu_cores=args.cores
+        ))
+        url = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    prompts = load_prompts(args.prompts) if args.prompts else default_prompts()
+    rng = random.Random(args.seed)
+    session = requests.Session()
+
+    tuned = {name: tune_profile(session, url, name, prompts, args, rng) for name in profiles}
+
+    generated_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    summary_keys = ("ttft_ms", "total_ms", "tokens_per_second", "answer_tokens", "completion_rate")
+    report = {
+        "generated_at": generated_at,
+        "commit": _git_commit(),
+        "ollama_url": url,
+        "mock_ollama": args.mock_ollama,
+        "config": {"prompts": len(prompts), "repeats": args.repeats, "random": args.random,
+                   "seed": args.seed, "min_completion": args.min_completion},
+        # Loaded by config.py: same shape as MODELS entries
+        "profiles": {
+            name: {
+                "name": MODELS[name]["name"],
+                "description": MODELS[name]["description"],
+                "options": result["chosen"]["options"],
+                "tuned": {
+                    "generated_at": generated_at,
+                    **{key: result["chosen"]["metrics"][key] for key in summary_keys},
+                    "baseline": {key: result["baseline"]["metrics"][key] for key in summary_keys},
+                },
+            }
+            for name, result in tuned.items()
+        },
+        "pareto": {name: result["front"] for name, result in tuned.items()},
+        "baseline": {name: result["baseline"] for name, result in tuned.items()},
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}; config.py loads MODEL_PROFILES_PATH at startup")
+    if args.mock_ollama:
+        print("Options were tuned against the stand-in server's cost model; rerun against Ollama before deploying",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Embedding Backends - Parity check and CPU benchmark
+
+Compares each candidate backend against the reference "torch" backend:
+- parity: per-text cosine similarity between vectors and top-k retrieval
+  overlap on a query set (exits non-zero when below tolerance)
+- speed: encodes per second at the configured batch size
+- memory: peak RSS of a fresh process that loads the backend and encodes
+
+Usage:
+    cd backend
+    python -m benchmarks.embedding_backends --backends torch_int8,onnx --corpus docs.txt --output emb.json
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_BATCH_SIZE
+
+DEFAULT_CORPUS = [
+    "Quarterly revenue grew by twelve percent driven by enterprise subscriptions.",
+    "The launch was delayed because the payment provider integration failed certification.",
+    "Hiring plans for the next quarter include four backend engineers and a designer.",
+    "Infrastructure costs dropped after migrating batch jobs to spot instances.",
+    "Customer churn increased in the small business segment during the summer.",
+    "The security audit found two medium severity issues in the authentication flow.",
+    "Meeting notes: agree on the API freeze date and assign owners for documentation.",
+    "The marketing campaign generated three thousand qualified leads in September.",
+    "Support ticket volume fell after the onboarding tutorial was redesigned.",
+    "The board approved the budget for the new data center in Frankfurt.",
+    "Latency of the search endpoint improved after adding a result cache.",
+    "Legal review of the partner contract is expected to finish next week.",
+]
+DEFAULT_QUERIES = [
+    "How much did revenue grow?",
+    "Why was the launch delayed?",
+    "What did the security audit find?",
+    "Which costs went down?",
+    "How many leads did marketing generate?",
+    "What improved search latency?",
+]
+
+
+def _load_texts(path: str, fallback: List[str], by_line: bool = False) -> List[str]:
+    """Blank-line separated passages (falling back to lines), or one item per line when by_line is set"""
+    if not path:
+        return fallback
+    text = Path(path).read_text(encoding="utf-8", errors="replace")
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if by_line:
+        return lines
+    chunks = [c.strip() for c in text.split("\n\n") if c.strip()]
+    return chunks or lines
+
+
+def _encode_worker(backend: str, model_name: str, corpus: List[str], queries: List[str],
+                   batch_size: int, repeats: int, queue):
+    """Runs in a fresh process so peak RSS reflects only this backend"""
+    try:
+        from embeddings import create_backend
+
+        load_start = time.perf_counter()
+        model = create_backend(backend, model_name)
+        load_seconds = time.perf_counter() - load_start
+
+        model.encode(corpus[:batch_size], batch_size=batch_size)  # warm-up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            corpus_vectors = model.encode(corpus, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+
+        query_start = time.perf_counter()
+        query_vectors = np.concatenate([model.encode([q]) for q in queries]) if queries else np.zeros((0, 0))
+        query_elapsed = time.perf_counter() - query_start
+
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        queue.put({
+            "backend": backend,
+            "load_seconds": round(load_seconds, 3),
+            "encodes_per_second": round(len(corpus) * repeats / elapsed, 2) if elapsed > 0 else None,
+            "single_query_ms": round(query_elapsed / max(len(queries), 1) * 1000, 3),
+            "peak_rss_mb": round(peak_rss_kb / 1024, 1),  # ru_maxrss is KiB on Linux
+            "corpus_vectors": corpus_vectors.tolist(),
+            "query_vectors": query_vectors.tolist(),
+        })
+    except Exception as e:
+        queue.put({"backend": backend, "error": f"{type(e).__name__}: {e}"})
+
+
+def run_backend(backend: str, args, corpus: List[str], queries: List[str]) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(
+        target=_encode_worker,
+        args=(backend, args.model, corpus, queries, args.batch_size, args.repeats, queue),
+    )
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def parity(reference: dict, candidate: dict, top_k: int) -> Dict[str, float]:
+    """Cosine agreement of vectors and top-k retrieval overlap against the reference"""
+    ref_corpus = np.asarray(reference["corpus_vectors"], dtype=np.float32)
+    cand_corpus = np.asarray(candidate["corpus_vectors"], dtype=np.float32)
+    cosines = np.sum(ref_corpus * cand_corpus, axis=1)
+
+    ref_queries = np.asarray(reference["query_vectors"], dtype=np.float32)
+    cand_queries = np.asarray(candidate["query_vectors"], dtype=np.float32)
+    k = min(top_k, len(ref_corpus))
+    overlaps = []
+    top1_matches = 0
+    for ref_q, cand_q in zip(ref_queries, cand_queries):
+        ref_top = np.argsort(-(ref_corpus @ ref_q))[:k]
+        cand_top = np.argsort(-(cand_corpus @ cand_q))[:k]
+        overlaps.append(len(set(ref_top) & set(cand_top)) / k)
+        top1_matches += int(ref_top[0] == cand_top[0])
+
+    return {
+        "min_cosine": round(float(cosines.min()), 5),
+        "mean_cosine": round(float(cosines.mean()), 5),
+        "recall_at_k": round(float(np.mean(overlaps)), 4) if overlaps else None,
+        "top1_agreement": round(top1_matches / len(ref_queries), 4) if len(ref_queries) else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare embedding backends against the reference model")
+    parser.add_argument("--backends", default="torch_int8,onnx", help="Comma-separated candidates")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--corpus", help="Text file split into paragraphs (default: built-in sample)")
+    parser.add_argument("--queries", help="Text file with one query per line")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=2)
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Parity tolerance per vector")
+    parser.add_argument("--min-recall", type=float, default=0.9, help="Parity tolerance for top-k overlap")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    corpus = _load_texts(args.corpus, DEFAULT_CORPUS)
+    queries = _load_texts(args.queries, DEFAULT_QUERIES, by_line=True) if args.queries else DEFAULT_QUERIES
+    candidates = [b.strip() for b in args.backends.split(",") if b.strip() and b.strip() != "torch"]
+
+    print(f"Reference: torch ({args.model}), {len(corpus)} texts, {len(queries)} queries")
+    reference = run_backend("torch", args, corpus, queries)
+    if "error" in reference:
+        sys.exit(f"Reference backend failed: {reference['error']}")
+
+    report = {"model": args.model, "corpus_size": len(corpus), "batch_size": args.batch_size, "backends": {}}
+    report["backends"]["torch"] = {k: v for k, v in reference.items() if not k.endswith("_vectors")}
+
+    failed = False
+    for backend in candidates:
+        result = run_backend(backend, args, corpus, queries)
+        if "error" in result:
+            print(f"  {backend}: {result['error']}")
+            report["backends"][backend] = result
+            failed = True
+            continue
+        summary = {k: v for k, v in result.items() if not k.endswith("_vectors")}
+        summary["parity"] = parity(reference, result, args.top_k)
+        summary["parity"]["passed"] = (
+            summary["parity"]["min_cosine"] >= args.min_cosine
+            and (summary["parity"]["recall_at_k"] or 0) >= args.min_recall
+        )
+        failed = failed or not summary["parity"]["passed"]
+        speedup = (summary["encodes_per_second"] or 0) / (reference["encodes_per_second"] or 1)
+        summary["speedup_vs_torch"] = round(speedup, 2)
+        report["backends"][backend] = summary
+        print(f"  {backend}: {summary['encodes_per_second']} enc/s ({speedup:.2f}x), "
+              f"{summary['peak_rss_mb']} MB peak RSS, min cosine {summary['parity']['min_cosine']}, "
+              f"recall@{args.top_k} {summary['parity']['recall_at_k']} "
+              f"{'PASS' if summary['parity']['passed'] else 'FAIL'}")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+        print(f"Results written to {args.output}")
+    else:
+        print(output)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+KB Shards - Query latency of one collection vs a sharded one as the corpus grows
+
+Fills a plain Chroma collection and a ShardedCollection (shards.py) with
+the same random unit vectors at each corpus size, then times top-k queries
+against both: unfiltered (fan-out to every shard) and filtered by tenant
+(a single shard under the tenant key, one shard per tenant). No embedding
+model is loaded.
+
+Usage:
+    cd backend
+    python -m benchmarks.kb_shards --sizes 5000,20000,80000 --key tenant --tenants 8 --output shards.json
+    python -m benchmarks.kb_shards --key hash --shards 4
+"""
+import argparse
+import json
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from shards import ShardedCollection
+
+DIMENSION = 384  # all-MiniLM-L6-v2
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _fill(collections: list, start: int, stop: int, tenants: int, rng, batch_size: int = 2000):
+    for offset in range(start, stop, batch_size):
+        count = min(batch_size, stop - offset)
+        vectors = rng.standard_normal((count, DIMENSION)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        doc_ids = [f"doc_{1700000000 + (offset + i) // 10}_{(offset + i) // 10:08x}" for i in range(count)]
+        ids = [f"{doc_id}_chunk_{(offset + i) % 10}" for i, doc_id in enumerate(doc_ids)]
+        metadatas = [{"doc_id": doc_id, "tenant": f"tenant{(offset + i) // 10 % tenants}",
+                      "timestamp": 1700000000 + (offset + i) // 10} for i, doc_id in enumerate(doc_ids)]
+        documents = [f"chunk {chunk_id}" for chunk_id in ids]
+        for collection in collections:
+            collection.upsert(ids=ids, embeddings=vectors.tolist(), documents=documents, metadatas=metadatas)
+
+
+def _time_queries(collection, queries: np.ndarray, top_k: int, where=None) -> Dict[str, float]:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=top_k, where=where)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(_percentile(timings, 0.95), 2),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="5000,20000,80000", help="Corpus sizes in chunks (cumulative)")
+    parser.add_argument("--shards", type=int, default=4, help="Shard count for --key hash")
+    parser.add_argument("--key", choices=("tenant", "hash"), default="tenant")
+    parser.add_argument("--tenants", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    import chromadb
+
+    rng = np.random.default_rng(args.seed)
+    workdir = tempfile.mkdtemp(prefix="kb_shards_")
+    try:
+        client = chromadb.PersistentClient(path=workdir)
+        single = client.get_or_create_collection("bench_single")
+        # Shards are created as the fill writes to them (shards.py routes; knowledge_base.py pre-creates hash shards)
+        sharded = ShardedCollection("bench", {}, {"key": args.key, "count": args.shards}, {},
+                                    create_shard=client.get_or_create_collection)
+
+        queries = rng.standard_normal((args.queries, DIMENSION)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        tenant_filter = {"tenant": "tenant0"}
+
+        rows, filled = [], 0
+        for size in sorted(int(s) for s in args.sizes.split(",") if s.strip()):
+            print(f"Filling to {size} chunks...")
+            _fill([single, sharded], filled, size, args.tenants, rng)
+            filled = size
+            for collection in (single, sharded):  # Warm-up: load the HNSW indexes
+                collection.query(query_embeddings=[queries[0].tolist()], n_results=args.top_k)
+            row = {
+                "chunks": size,
+                "single": _time_queries(single, queries, args.top_k),
+                "sharded": _time_queries(sharded, queries, args.top_k),
+                "single_tenant": _time_queries(single, queries, args.top_k, tenant_filter),
+                "sharded_tenant": _time_queries(sharded, queries, args.top_k, tenant_filter),
+            }
+            rows.append(row)
+            print(f"  {size:>8} chunks  all: single {row['single']['p50_ms']} ms, sharded {row['sharded']['p50_ms']} ms"
+                  f"  |  tenant: single {row['single_tenant']['p50_ms']} ms, "
+                  f"sharded {row['sharded_tenant']['p50_ms']} ms")
+
+        results = {"shards": len(sharded.shards()), "key": args.key, "tenants": args.tenants, "top_k": args.top_k,
+                   "results": rows}
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            print(f"Results written to {args.output}")
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Load Test - Drives /chat, /chat/stream and /upload-document at fixed concurrency
+
+Reports p50/p95/p99 latency, time-to-first-token and throughput as JSON so
+runs can be compared across commits.
+
+Usage (self-contained, starts the mock Ollama server and the API):
+    cd backend
+    python -m benchmarks.load_test --spawn-server --mock-ollama --concurrency 8 --requests 100 \\
+        --output bench_results.json
+
+    # Compare with a previous run
+    python -m benchmarks.load_test --spawn-server --mock-ollama --compare bench_results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.mock_ollama import MockOllamaConfig, start_mock_ollama
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SCENARIOS = ("chat", "chat_stream", "upload")
+
+SAMPLE_QUESTIONS = [
+    "What were the main findings of the quarterly report?",
+    "Summarize the project timeline",
+    "Which risks were identified for the launch?",
+    "How did revenue change compared to last year?",
+    "List the action items from the meeting notes",
+]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return round(ordered[rank], 2)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": round(sum(values) / len(values), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def make_document(size_kb: int) -> bytes:
+    paragraph = ("The quarterly review covered revenue, hiring, infrastructure costs and the "
+                 "launch schedule for the next release. ") * 3
+    paragraphs = []
+    total = 0
+    while total < size_kb * 1024:
+        text = f"Section {len(paragraphs) + 1}. {paragraph}"
+        paragraphs.append(text)
+        total += len(text) + 2
+    return "\n\n".join(paragraphs).encode()
+
+
+class ScenarioResult:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.ttfb: List[float] = []
+        self.ttft: List[float] = []
+        self.errors = 0
+        self.error_samples: List[str] = []
+
+    def error(self, detail: str):
+        self.errors += 1
+        if len(self.error_samples) < 5:
+            self.error_samples.append(detail[:200])
+
+
+async def _run_chat(client: httpx.AsyncClient, args, i: int, result: ScenarioResult):
+    question = SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]
+    if args.unique_prompts:
+        # Defeat the response cache so every request reaches the model
+        question = f"{question} (request {uuid.uuid4().hex[:8]})"
+    start = time.perf_counter()
+    response = await client.post("/chat", json={"message": question, "mode": args.mode, "model": args.model})
+    elapsed = (time.perf_counter() - start) * 1000
+    if response.status_code != 200:
+        result.error(f"{response.status_code}: {response.text}")
+        return
+    result.latencies.append(elapsed)
+    # Non-streaming: the first token reaches the client with the full body
+    result.ttfb.append(elapsed)
+    result.ttft.append(elapsed)
+
+
+async def _run_chat_stream(client: httpx.AsyncClient, args, i: int, result: ScenarioResult):
+    question = SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]
+    if args.unique_prompts:
+        question = f"{question} (request {uuid.uuid4().hex[:8]})"
+    start = time.perf_counter()
+    first_byte = None
+    first_token = None
+    failed = None
+    async with client.stream("POST", "/chat/stream", json={"message": question, "mode": args.mode, "model": args.model}) as response:
+        if response.status_code != 200:
+            result.error(f"{response.status_code}: {(await response.aread()).decode(errors='replace')}")
+            return
+        async for line in response.aiter_lines():
+            now = (time.perf_counter() - start) * 1000
+            if first_byte is None:
+                first_byte = now
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            try:
+                event = json.loads(line[len("data: "):])
+            except json.JSONDecodeError:
+                continue
+            if event.get("type") in ("token", "response") and first_token is None:
+                first_token = now
+            elif event.get("type") == "error":
+                failed = event.get("error", "stream error")
+    elapsed = (time.perf_counter() - start) * 1000
+    if failed:
+        result.error(failed)
+        return
+    result.latencies.append(elapsed)
+    if first_byte is not None:
+        result.ttfb.append(first_byte)
+    if first_token is not None:
+        result.ttft.append(first_token)
+
+
+async def _run_upload(client: httpx.AsyncClient, args, i: int, result: ScenarioResult):
+    files = {"file": (f"bench_{i}.txt", make_document(args.upload_kb), "text/plain")}
+    start = time.perf_counter()
+    response = await client.post("/upload-document", files=files)
+    elapsed = (time.perf_counter() - start) * 1000
+    if response.status_code != 200:
+        result.error(f"{response.status_code}: {response.text}")
+        return
+    result.latencies.append(elapsed)
+    result.ttfb.append(elapsed)
+
+
+RUNNERS = {"chat": _run_chat, "chat_stream": _run_chat_stream, "upload": _run_upload}
+
+
+async def run_scenario(name: str, args) -> dict:
+    result = ScenarioResult()
+    counter = iter(range(args.requests))
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        async def worker():
+            for i in counter:
+                try:
+                    await RUNNERS[name](client, args, i, result)
+                except Exception as e:
+                    result.error(f"{type(e).__name__}: {e}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        duration = time.perf_counter() - start
+
+    completed = len(result.latencies)
+    return {
+        "requests": args.requests,
+        "completed": completed,
+        "errors": result.errors,
+        "error_samples": result.error_samples,
+        "concurrency": args.concurrency,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(completed / duration, 3) if duration > 0 else None,
+        "latency_ms": summarize(result.latencies),
+        "ttfb_ms": summarize(result.ttfb),
+        "ttft_ms": summarize(result.ttft),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def _wait_for_server(base_url: str, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"API server at {base_url} did not become ready within {timeout}s")
+
+
+def compare(current: dict, baseline: dict):
+    """Print a per-metric comparison against a previous results file"""
+    print(f"\nComparison: {baseline.get('commit')} -> {current.get('commit')}")
+    for name, scenario in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        print(f"  {name}")
+        rows = [("throughput_rps", scenario["throughput_rps"], old.get("throughput_rps"))]
+        for group in ("latency_ms", "ttft_ms"):
+            for pct in ("p50", "p95", "p99"):
+                rows.append((f"{group}.{pct}", scenario[group][pct], old.get(group, {}).get(pct)))
+        for label, new_value, old_value in rows:
+            if new_value is None or old_value in (None, 0):
+                continue
+            change = (new_value - old_value) / old_value * 100
+            print(f"    {label:<18} {old_value:>10} -> {new_value:>10} ({change:+.1f}%)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Jarvis API load test")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated: chat,chat_stream,upload")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=40, help="Requests per scenario")
+    parser.add_argument("--mode", default="mixed", choices=["mixed", "context_only", "general_only"])
+    parser.add_argument("--model", default="fast")
+    parser.add_argument("--upload-kb", type=int, default=16, help="Size of each uploaded document")
+    parser.add_argument("--no-unique-prompts", dest="unique_prompts", action="store_false",
+                        help="Reuse prompts so the response cache can serve repeats")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    # Self-contained mode
+    parser.add_argument("--mock-ollama", action="store_true", help="Start the stand-in Ollama server")
+    parser.add_argument("--prefill-ms", type=float, default=150.0)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--num-tokens", type=int, default=60)
+    parser.add_argument("--spawn-server", action="store_true", help="Start uvicorn main:app for the run")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --spawn-server")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in RUNNERS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {unknown}. Choose from {list(RUNNERS)}")
+
+    mock_server = None
+    api_process = None
+    env = dict(os.environ)
+    try:
+        if args.mock_ollama:
+            mock_config = MockOllamaConfig(
+                prefill_ms=args.prefill_ms,
+                tokens_per_second=args.tokens_per_second,
+                num_tokens=args.num_tokens,
+            )
+            mock_server = start_mock_ollama(mock_config)
+            mock_port = mock_server.server_address[1]
+            env["OLLAMA_URL"] = f"http://127.0.0.1:{mock_port}/api/generate"
+            env["MOCK_MODE"] = "false"
+            print(f"Mock Ollama on port {mock_port}")
+
+        if args.spawn_server:
+            args.base_url = f"http://127.0.0.1:{args.port}"
+            api_process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+                cwd=BACKEND_DIR,
+                env=env,
+            )
+            _wait_for_server(args.base_url, timeout=120)
+
+        results = {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "config": {
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "mode": args.mode,
+                "model": args.model,
+                "upload_kb": args.upload_kb,
+                "mock_ollama": args.mock_ollama,
+                "prefill_ms": args.prefill_ms if args.mock_ollama else None,
+                "tokens_per_second": args.tokens_per_second if args.mock_ollama else None,
+            },
+            "scenarios": {},
+        }
+        # Upload first so chat scenarios have something to retrieve
+        ordered = sorted(scenarios, key=lambda s: 0 if s == "upload" else 1)
+        for name in ordered:
+            print(f"Running {name}: {args.requests} requests at concurrency {args.concurrency}")
+            results["scenarios"][name] = asyncio.run(run_scenario(name, args))
+            summary = results["scenarios"][name]
+            print(f"  p50 {summary['latency_ms']['p50']} ms, p95 {summary['latency_ms']['p95']} ms, "
+                  f"p99 {summary['latency_ms']['p99']} ms, {summary['throughput_rps']} req/s, "
+                  f"{summary['errors']} errors")
+
+        output = json.dumps(results, indent=2)
+        if args.output:
+            Path(args.output).write_text(output)
+            print(f"Results written to {args.output}")
+        else:
+            print(output)
+
+        if args.compare:
+            compare(results, json.loads(Path(args.compare).read_text()))
+        return results
+    finally:
+        if api_process is not None:
+            api_process.terminate()
+            try:
+                api_process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                api_process.kill()
+        if mock_server is not None:
+            mock_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Mock IMAP Server - Local stand-in for Gmail IMAP
+
+Implements the subset of IMAP4rev1 that mail_sync.py uses (CAPABILITY,
+LOGIN, SELECT/EXAMINE, UID SEARCH, UID FETCH of UID/FLAGS/RFC822.SIZE/
+INTERNALDATE/BODY.PEEK[...], NOOP, LOGOUT) over plain TCP, with an
+in-memory mailbox that can be changed while a client syncs: add messages,
+change flags, expunge, or bump UIDVALIDITY.
+
+Usage:
+    python -m benchmarks.mock_imap --port 1143 --messages 1000
+    IMAP_HOST=127.0.0.1 IMAP_PORT=1143 IMAP_SECURITY=none uvicorn main:app --port 8000
+"""
+import argparse
+import email.utils
+import re
+import socketserver
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+@dataclass
+class MockMessage:
+    uid: int
+    raw: bytes
+    flags: List[str] = field(default_factory=list)
+    internaldate: float = field(default_factory=time.time)
+
+
+class MockMailbox:
+    """Thread-safe single mailbox"""
+
+    def __init__(self, uidvalidity: int = 1):
+        self.uidvalidity = uidvalidity
+        self.messages: Dict[int, MockMessage] = {}
+        self.next_uid = 1
+        self.commands: List[str] = []  # Every command received, for assertions
+        self.lock = threading.Lock()
+
+    def add(self, sender: str, subject: str, body: str, to: str = "me@example.com",
+            flags: Optional[List[str]] = None, date: Optional[float] = None) -> int:
+        date = date or time.time()
+        raw = (
+            f"From: {sender}\r\nTo: {to}\r\nSubject: {subject}\r\n"
+            f"Date: {email.utils.formatdate(date)}\r\nMessage-ID: <{self.next_uid}.{int(date)}@mock>\r\n"
+            f"Content-Type: text/plain; charset=utf-8\r\n\r\n{body}\r\n"
+        ).encode()
+        with self.lock:
+            uid = self.next_uid
+            self.messages[uid] = MockMessage(uid, raw, list(flags or []), date)
+            self.next_uid += 1
+        return uid
+
+    def set_flags(self, uid: int, flags: List[str]):
+        with self.lock:
+            self.messages[uid].flags = list(flags)
+
+    def expunge(self, uid: int):
+        with self.lock:
+            self.messages.pop(uid, None)
+
+    def renumber(self):
+        """Simulate a server rebuild: new UIDVALIDITY, UIDs reassigned from 1"""
+        with self.lock:
+            self.uidvalidity += 1
+            old = sorted(self.messages.values(), key=lambda m: m.uid)
+            self.messages = {}
+            for i, message in enumerate(old, start=1):
+                message.uid = i
+                self.messages[i] = message
+            self.next_uid = len(old) + 1
+
+
+def _parse_set(spec: str, max_uid: int) -> List[range]:
+    ranges = []
+    for part in spec.split(","):
+        if ":" in part:
+            a, b = part.split(":")
+            lo = max_uid if a == "*" else int(a)
+            hi = max_uid if b == "*" else int(b)
+            lo, hi = min(lo, hi), max(lo, hi)
+            ranges.append(range(lo, hi + 1))
+        else:
+            value = max_uid if part == "*" else int(part)
+            ranges.append(range(value, value + 1))
+    return ranges
+
+
+def _internaldate(ts: float) -> str:
+    return time.strftime("%d-%b-%Y %H:%M:%S +0000", time.gmtime(ts))
+
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    mailbox: MockMailbox
+
+    def _send(self, data):
+        self.wfile.write(data if isinstance(data, bytes) else (data + "\r\n").encode())
+
+    def handle(self):
+        self._send("* OK [CAPABILITY IMAP4rev1 AUTH=PLAIN] mock-imap ready")
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            tag, _, rest = line.partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            with self.mailbox.lock:
+                self.mailbox.commands.append(rest)
+            if command == "CAPABILITY":
+                self._send("* CAPABILITY IMAP4rev1 AUTH=PLAIN")
+                self._send(f"{tag} OK CAPABILITY completed")
+            elif command == "LOGIN":
+                self._send(f"{tag} OK LOGIN completed")
+            elif command in ("SELECT", "EXAMINE"):
+                with self.mailbox.lock:
+                    self._send(f"* {len(self.mailbox.messages)} EXISTS")
+                    self._send(f"* OK [UIDVALIDITY {self.mailbox.uidvalidity}] UIDs valid")
+                    self._send(f"* OK [UIDNEXT {self.mailbox.next_uid}] Predicted next UID")
+                self._send(f"{tag} OK [READ-ONLY] {command} completed")
+            elif command == "UID":
+                self._uid_command(tag, args)
+            elif command == "NOOP":
+                self._send(f"{tag} OK NOOP completed")
+            elif command == "LOGOUT":
+                self._send("* BYE mock-imap logging out")
+                self._send(f"{tag} OK LOGOUT completed")
+                return
+            else:
+                self._send(f"{tag} BAD Unknown command")
+
+    def _uid_command(self, tag: str, args: str):
+        sub, _, rest = args.partition(" ")
+        with self.mailbox.lock:
+            messages = sorted(self.mailbox.messages.values(), key=lambda m: m.uid)
+        max_uid = messages[-1].uid if messages else 0
+        sequence = {m.uid: i + 1 for i, m in enumerate(messages)}
+
+        if sub.upper() == "SEARCH":
+            match = re.search(r"UID (\S+)", rest, re.I)
+            ranges = _parse_set(match.group(1), max_uid) if match else [range(1, max_uid + 1)]
+            uids = [m.uid for m in messages if any(m.uid in r for r in ranges)]
+            self._send("* SEARCH" + "".join(f" {u}" for u in uids))
+            self._send(f"{tag} OK SEARCH completed")
+            return
+
+        if sub.upper() == "FETCH":
+            spec, _, items = rest.partition(" ")
+            items_upper = items.upper()
+            ranges = _parse_set(spec, max_uid)
+            for message in messages:
+                if not any(message.uid in r for r in ranges):
+                    continue
+                parts = [f"UID {message.uid}", f"FLAGS ({' '.join(message.flags)})"]
+                if "RFC822.SIZE" in items_upper:
+                    parts.append(f"RFC822.SIZE {len(message.raw)}")
+                if "INTERNALDATE" in items_upper:
+                    parts.append(f'INTERNALDATE "{_internaldate(message.internaldate)}"')
+                literal = None
+                header_match = re.search(r"BODY\.PEEK\[HEADER\.FIELDS \(([^)]*)\)\]", items, re.I)
+                if header_match:
+                    wanted = {f.upper() for f in header_match.group(1).split()}
+                    header_section = message.raw.split(b"\r\n\r\n", 1)[0].decode()
+                    kept = [h for h in header_section.split("\r\n") if h.split(":", 1)[0].upper() in wanted]
+                    literal = ("\r\n".join(kept) + "\r\n\r\n").encode()
+                    parts.append(f"BODY[HEADER.FIELDS ({header_match.group(1)})] {{{len(literal)}}}")
+                elif re.search(r"BODY\.PEEK\[\]", items, re.I):
+                    literal = message.raw
+                    parts.append(f"BODY[] {{{len(literal)}}}")
+                head = f"* {sequence[message.uid]} FETCH (" + " ".join(parts)
+                if literal is None:
+                    self._send(head + ")")
+                else:
+                    self._send((head + "\r\n").encode() + literal + b")\r\n")
+            self._send(f"{tag} OK FETCH completed")
+            return
+
+        self._send(f"{tag} BAD Unsupported UID command")
+
+
+def start_mock_imap(mailbox: Optional[MockMailbox] = None, host: str = "127.0.0.1",
+                    port: int = 0) -> socketserver.ThreadingTCPServer:
+    """
+    Start the mock server on a daemon thread
+
+    Returns:
+        The running server; the bound port is server.server_address[1] and
+        the mailbox is server.mailbox.
+    """
+    mailbox = mailbox or MockMailbox()
+    handler = type("Handler", (_IMAPHandler,), {"mailbox": mailbox})
+    server = socketserver.ThreadingTCPServer((host, port), handler)
+    server.daemon_threads = True
+    server.mailbox = mailbox
+    thread = threading.Thread(target=server.serve_forever, name="mock-imap", daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in IMAP server for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--messages", type=int, default=100, help="Generated messages in INBOX")
+    args = parser.parse_args()
+
+    mailbox = MockMailbox()
+    now = time.time()
+    for i in range(args.messages):
+        mailbox.add(f"Sender {i % 7} <sender{i % 7}@example.com>", f"Message {i}",
+                    f"Body of message {i}.\n\nSecond paragraph of message {i}.",
+                    flags=["\\Seen"] if i % 3 else [], date=now - (args.messages - i) * 60)
+    start_mock_imap(mailbox, host=args.host, port=args.port)
+    print(f"Mock IMAP listening on {args.host}:{args.port} with {args.messages} messages")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
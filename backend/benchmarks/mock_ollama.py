@@ -0,0 +1,219 @@
+"""
+Mock Ollama Server - Stand-in for the Ollama HTTP API used by benchmarks
+
+Implements /api/tags and /api/generate (streaming and non-streaming) with a
+configurable prefill delay and token rate, so the real request path in
+main.py can be exercised without a GPU or a downloaded model. Responses are
+filler tokens, a fixed response_text, or whatever a responder callable
+returns for the request payload (e.g. JSON derived from the prompt).
+
+With option_costs the request options change the timings the way they
+roughly do on a CPU host (a larger num_ctx costs prefill, fewer threads or
+mirostat sampling cost generation speed), so option sweeps such as
+benchmarks.autotune have something to measure. The model is deterministic
+and illustrative, not a prediction of real hardware.
+
+Usage:
+    python -m benchmarks.mock_ollama --port 11500 --prefill-ms 200 --tokens-per-second 40
+    OLLAMA_URL=http://127.0.0.1:11500/api/generate uvicorn main:app --port 8000
+"""
+import argparse
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional, Tuple
+
+
+@dataclass
+class MockOllamaConfig:
+    prefill_ms: float = 150.0          # Delay before the first token (model load + prompt eval)
+    tokens_per_second: float = 50.0    # Generation rate after prefill
+    num_tokens: int = 60               # Tokens per response (capped by options.num_predict)
+    num_tokens_spread: int = 0         # Add 0..spread tokens depending on the prompt, so answer lengths vary
+    option_costs: bool = False         # Let num_ctx, num_thread, top_k and mirostat change the timings
+    cpu_cores: int = 8                 # Cores assumed by the option cost model
+    models: List[str] = field(default_factory=lambda: ["llama3.2:1b", "llama3.2:3b", "llama3:latest"])
+    response_text: Optional[str] = None  # Fixed response instead of generated filler
+    responder: Optional[Callable[[dict], str]] = field(default=None, repr=False)  # Response text per request payload
+    requests: List[dict] = field(default_factory=list, repr=False)  # Every /api/generate payload, for assertions
+
+
+def _response_tokens(config: MockOllamaConfig, payload: dict, limit: Optional[int]) -> List[str]:
+    """Build the token list for a response"""
+    text = config.responder(payload) if config.responder is not None else config.response_text
+    if text is not None:
+        # Keep whitespace attached so streamed chunks concatenate back to the exact text
+        tokens = []
+        for i, word in enumerate(text.split(" ")):
+            tokens.append(word if i == 0 else " " + word)
+        return tokens
+    seed = len(payload.get("prompt", ""))
+    wanted = config.num_tokens + (seed * 31 % (config.num_tokens_spread + 1) if config.num_tokens_spread else 0)
+    count = wanted if not limit or limit < 0 else min(wanted, limit)
+    return [("" if i == 0 else " ") + f"tok{(seed + i) % 97}" for i in range(count)]
+
+
+def _option_timings(config: MockOllamaConfig, options: dict) -> Tuple[float, float]:
+    """Prefill milliseconds and tokens/second for a request's options"""
+    if not config.option_costs:
+        return config.prefill_ms, config.tokens_per_second
+    # KV cache allocation and attention over the window grow with num_ctx
+    prefill_ms = config.prefill_ms * (0.6 + 0.4 * options.get("num_ctx", 2048) / 2048)
+    threads = options.get("num_thread", 0)
+    thread_factor = 1.0 if threads <= 0 else min(threads, config.cpu_cores) / config.cpu_cores
+    # Mirostat adjusts the sampling distribution every token; a small top_k shortens the sort
+    sampling_factor = 0.92 if options.get("mirostat", 0) else 1.0
+    top_k_factor = 1.0 + 0.05 * (1 - min(options.get("top_k", 40), 40) / 40)
+    return prefill_ms, config.tokens_per_second * thread_factor * sampling_factor * top_k_factor
+
+
+def _make_handler(config: MockOllamaConfig):
+    class MockOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            # Keep benchmark output clean
+            pass
+
+        def _send_json(self, status: int, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/api/tags":
+                self._send_json(200, {"models": [{"name": name} for name in config.models]})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/api/generate":
+                self._send_json(404, {"error": "not found"})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": "invalid json"})
+                return
+
+            model = payload.get("model", config.models[0])
+            prompt = payload.get("prompt", "")
+            options = payload.get("options") or {}
+            config.requests.append(payload)
+            limit = options.get("num_predict")
+            tokens = _response_tokens(config, payload, limit)
+            # Like Ollama: "length" when generation stopped at num_predict
+            done_reason = "length" if limit and 0 < limit <= len(tokens) else "stop"
+            prompt_tokens = max(1, len(prompt.split()))
+            prefill_ms, tokens_per_second = _option_timings(config, options)
+            token_interval = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+            start = time.perf_counter()
+            time.sleep(prefill_ms / 1000.0)
+            prefill_ns = int((time.perf_counter() - start) * 1e9)
+
+            if payload.get("stream", True):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                eval_start = time.perf_counter()
+                for token in tokens:
+                    self._write_chunk({"model": model, "response": token, "done": False})
+                    time.sleep(token_interval)
+                eval_ns = int((time.perf_counter() - eval_start) * 1e9)
+                self._write_chunk({
+                    "model": model,
+                    "response": "",
+                    "done": True,
+                    "done_reason": done_reason,
+                    **self._stats(prefill_ns, eval_ns, prompt_tokens, len(tokens), start),
+                })
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                eval_start = time.perf_counter()
+                time.sleep(token_interval * len(tokens))
+                eval_ns = int((time.perf_counter() - eval_start) * 1e9)
+                self._send_json(200, {
+                    "model": model,
+                    "response": "".join(tokens),
+                    "done": True,
+                    "done_reason": done_reason,
+                    **self._stats(prefill_ns, eval_ns, prompt_tokens, len(tokens), start),
+                })
+
+        def _write_chunk(self, body: dict):
+            data = (json.dumps(body) + "\n").encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        @staticmethod
+        def _stats(prefill_ns: int, eval_ns: int, prompt_tokens: int, eval_count: int, start: float) -> dict:
+            return {
+                "total_duration": int((time.perf_counter() - start) * 1e9),
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": prefill_ns,
+                "eval_count": eval_count,
+                "eval_duration": max(eval_ns, 1),
+            }
+
+    return MockOllamaHandler
+
+
+def start_mock_ollama(config: Optional[MockOllamaConfig] = None, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the mock server on a daemon thread
+
+    Returns:
+        The running server; the bound port is server.server_address[1].
+        Call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(config or MockOllamaConfig()))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="mock-ollama", daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--prefill-ms", type=float, default=150.0)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--num-tokens", type=int, default=60)
+    parser.add_argument("--num-tokens-spread", type=int, default=0, help="Vary response length by up to this many tokens")
+    parser.add_argument("--option-costs", action="store_true", help="Let request options change the timings")
+    parser.add_argument("--response-text", default=None, help="Fixed response text instead of filler tokens")
+    args = parser.parse_args()
+
+    config = MockOllamaConfig(
+        prefill_ms=args.prefill_ms,
+        tokens_per_second=args.tokens_per_second,
+        num_tokens=args.num_tokens,
+        num_tokens_spread=args.num_tokens_spread,
+        option_costs=args.option_costs,
+        response_text=args.response_text,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(config))
+    server.daemon_threads = True
+    print(f"Mock Ollama listening on http://{args.host}:{args.port} "
+          f"(prefill {args.prefill_ms} ms, {args.tokens_per_second} tok/s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Mock SMTP Server - Local stand-in for Gmail SMTP
+
+Speaks enough plain-text SMTP (EHLO/HELO, AUTH PLAIN/LOGIN, MAIL, RCPT,
+DATA, RSET, NOOP, QUIT) for smtplib, with a configurable connect delay to
+model the TLS handshake + login cost and optional transient failures, so
+connection pooling and the outbound queue can be exercised without Gmail.
+Accepted messages are kept in memory.
+
+Usage:
+    python -m benchmarks.mock_smtp --port 2525 --connect-delay-ms 300
+    SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_SECURITY=none uvicorn main:app --port 8000
+"""
+import argparse
+import socketserver
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class MockSMTPConfig:
+    connect_delay_ms: float = 0.0     # Delay before the greeting (stands in for TLS handshake + AUTH)
+    send_delay_ms: float = 0.0        # Delay before accepting DATA
+    fail_every: int = 0               # Answer every Nth message with a transient 451 (0 = never)
+    advertise_auth: bool = True
+    messages: List[dict] = field(default_factory=list)
+    connections: int = 0
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    config: MockSMTPConfig
+    lock = threading.Lock()
+
+    def _reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        config = self.config
+        with self.lock:
+            config.connections += 1
+        if config.connect_delay_ms:
+            time.sleep(config.connect_delay_ms / 1000)
+        self._reply("220 mock-smtp ready")
+        sender: Optional[str] = None
+        recipients: List[str] = []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            verb = line.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self._reply("250-mock-smtp")
+                if config.advertise_auth:
+                    self._reply("250-AUTH PLAIN LOGIN")
+                self._reply("250 8BITMIME")
+            elif verb == "HELO":
+                self._reply("250 mock-smtp")
+            elif verb == "AUTH":
+                if line.upper().startswith("AUTH LOGIN") and len(line.split()) == 2:
+                    self._reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self._reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                self._reply("235 Authentication successful")
+            elif verb == "MAIL":
+                sender, recipients = line[10:].strip("<> "), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(line[8:].strip("<> "))
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    body.append(data_line.decode(errors="replace"))
+                if config.send_delay_ms:
+                    time.sleep(config.send_delay_ms / 1000)
+                with self.lock:
+                    attempt = len(config.messages) + 1
+                    failed = config.fail_every and attempt % config.fail_every == 0
+                    config.messages.append({
+                        "from": sender, "to": recipients, "data": "".join(body), "accepted": not failed
+                    })
+                self._reply("451 Temporary failure, try again later" if failed else "250 OK queued")
+            elif verb == "RSET":
+                sender, recipients = None, []
+                self._reply("250 OK")
+            elif verb == "NOOP":
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+def start_mock_smtp(config: Optional[MockSMTPConfig] = None, host: str = "127.0.0.1",
+                    port: int = 0) -> socketserver.ThreadingTCPServer:
+    """
+    Start the mock server on a daemon thread
+
+    Returns:
+        The running server; the bound port is server.server_address[1] and
+        the config (with received messages) is server.config.
+    """
+    config = config or MockSMTPConfig()
+    handler = type("Handler", (_SMTPHandler,), {"config": config})
+    server = socketserver.ThreadingTCPServer((host, port), handler)
+    server.daemon_threads = True
+    server.config = config
+    thread = threading.Thread(target=server.serve_forever, name="mock-smtp", daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in SMTP server for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--connect-delay-ms", type=float, default=0.0)
+    parser.add_argument("--send-delay-ms", type=float, default=0.0)
+    parser.add_argument("--fail-every", type=int, default=0, help="Transient 451 for every Nth message")
+    args = parser.parse_args()
+
+    server = start_mock_smtp(
+        MockSMTPConfig(connect_delay_ms=args.connect_delay_ms, send_delay_ms=args.send_delay_ms,
+                       fail_every=args.fail_every),
+        host=args.host, port=args.port,
+    )
+    print(f"Mock SMTP listening on {args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Task Interpreter - Tier mix, latency and fallbacks of the email interpreter
+
+Starts the mock Ollama server with a responder that answers the
+interpreter's JSON prompt, then interprets generated tasks three times:
+cold (rules plus LLM within the budget), warm (cache), and with the LLM
+slower than the budget (rule fallback). Reports per-tier counts and
+p50/p95 latency, and checks that no pass exceeds the budget.
+
+Usage:
+    cd backend
+    python -m benchmarks.task_interpreter --tasks 200 --prefill-ms 150 --budget 0.5
+"""
+import argparse
+import asyncio
+import json
+import math
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.mock_ollama import MockOllamaConfig, start_mock_ollama
+from benchmarks.task_parser import generate_tasks
+from email_interpreter import EmailTaskInterpreter
+
+_TASK_LINE = re.compile(r"^Task: (.*)$", re.M)
+_ADDRESS = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+_STOPWORDS = {"send", "draft", "email", "an", "a", "the", "to", "please", "note", "and", "on", "for"}
+
+
+def email_task_responder(payload: dict) -> str:
+    """Stand-in for the model: a plausible JSON interpretation of the task in the prompt"""
+    match = _TASK_LINE.search(payload.get("prompt", ""))
+    task = match.group(1) if match else ""
+    addresses = _ADDRESS.findall(task)
+    words = [w for w in re.findall(r"[A-Za-z0-9]+", _ADDRESS.sub(" ", task)) if w.lower() not in _STOPWORDS]
+    return json.dumps({
+        "to": addresses[0] if addresses else None,
+        "cc": None,
+        "subject": " ".join(words[:4]).title() or "Quick Note",
+        "body": f"Hello,\n\n{task}\n\nBest regards",
+        "action": "send" if task.lower().startswith("send") else "draft",
+    })
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)], 2)
+
+
+async def run_pass(interpreter: EmailTaskInterpreter, tasks: List[str], concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one(task: str):
+        async with semaphore:
+            results.append(await interpreter.interpret(task))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(task) for task in tasks))
+    elapsed = time.perf_counter() - start
+
+    tiers: Dict[str, List[float]] = {}
+    for result in results:
+        tiers.setdefault(result["tier"], []).append(result["latency_ms"])
+    return {
+        "tasks_per_second": round(len(tasks) / elapsed, 1),
+        "max_latency_ms": max(r["latency_ms"] for r in results),
+        "tiers": {
+            tier: {"count": len(latencies), "p50_ms": _percentile(latencies, 0.5), "p95_ms": _percentile(latencies, 0.95)}
+            for tier, latencies in sorted(tiers.items())
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Tier mix and latency of the email task interpreter")
+    parser.add_argument("--tasks", type=int, default=200, help="Generated tasks (edge cases are added)")
+    parser.add_argument("--prefill-ms", type=float, default=150.0, help="Mock LLM delay before answering")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--budget", type=float, default=0.5, help="LLM latency budget in seconds")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    config = MockOllamaConfig(prefill_ms=args.prefill_ms, tokens_per_second=args.tokens_per_second,
+                              responder=email_task_responder)
+    server = start_mock_ollama(config)
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    tasks = generate_tasks(args.tasks)
+    report = {"tasks": len(tasks), "budget_seconds": args.budget, "prefill_ms": args.prefill_ms}
+
+    interpreter = EmailTaskInterpreter(url=url, budget_seconds=args.budget, llm_enabled=True)
+    report["cold"] = asyncio.run(run_pass(interpreter, tasks, args.concurrency))
+    report["warm"] = asyncio.run(run_pass(interpreter, tasks, args.concurrency))
+    report["llm_requests"] = len(config.requests)
+
+    # LLM slower than the budget: every low-confidence task must fall back to the rules in time
+    config.prefill_ms = args.budget * 1000 * 2
+    slow = EmailTaskInterpreter(url=url, budget_seconds=args.budget, llm_enabled=True)
+    report["slow_llm"] = asyncio.run(run_pass(slow, tasks, args.concurrency))
+    server.shutdown()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    # Small allowance for scheduling on top of the budget
+    limit_ms = args.budget * 1000 + 100
+    over = [name for name in ("cold", "warm", "slow_llm") if report[name]["max_latency_ms"] > limit_ms]
+    if over:
+        sys.exit(f"Latency budget exceeded in: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
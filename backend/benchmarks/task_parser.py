@@ -0,0 +1,207 @@
+"""
+Task Parser - Parity check and throughput of the email task parser
+
+Runs the compiled parser in email_agent_routes against the original
+implementation (kept below as the reference) on generated tasks plus edge
+cases, exits non-zero on any output difference, and reports tasks/sec for
+both. With --url, also posts the tasks to /process-tasks in batches and
+reports end-to-end tasks/sec.
+
+Usage:
+    cd backend
+    python -m benchmarks.task_parser --tasks 20000
+    python -m benchmarks.task_parser --tasks 20000 --url http://localhost:8000 --batch-size 1000
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from typing import Callable, List, Optional
+
+from email_agent_routes import parse_email_task
+
+TEMPLATES = [
+    "Send an email to {address} confirming our {topic} meeting tomorrow at 2 PM",
+    "Draft an email to {address} about the {topic} deadline extension",
+    "Send a thank you email to {address} for the {topic} feedback",
+    "Email the team about the {topic} results and next quarter planning",
+    "Draft an email to {address} requesting a meeting on {topic}",
+    "Please send {address} a note regarding {topic} and the budget",
+    "Send {address} the {topic} numbers before Friday",
+    "Reply to {address}: thanks, the {topic} looks good. About the invoice, send it to finance",
+]
+TOPICS = ["Q4", "project", "roadmap", "hiring plan", "vendor contract", "launch checklist", "offsite"]
+EDGE_CASES = [
+    "About the launch: send it to ops@example.com",  # keyword only in a different case
+    "Send john@example.com notes about budget about travel",  # keyword twice
+    "Email aboutabout@example.com",  # keyword inside an address
+    "Send a note to sam@example.com abouthank you",  # overlapping keywords
+    "Thank Regarding CONFIRMING about", "send draft", "x" * 12,
+    "Send to İstanbul team ista@example.com about İzmir plans",  # lowercasing changes length
+    "Draft to a@b.co and c@d.org regarding the merger.!?",
+    "No recipient here but a long enough description",
+]
+
+
+def _reference_extract_email_address(text: str) -> Optional[str]:
+    """Extract email address from text using regex"""
+    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+    matches = re.findall(email_pattern, text)
+    return matches[0] if matches else None
+
+def reference_parse_email_task(task_description: str) -> dict:
+    """
+    Original parser, kept verbatim as the parity reference
+    
+    Examples:
+    - "Send an email to john@example.com confirming our 2 PM meeting tomorrow"
+    - "Draft an email to sarah@company.com about the project deadline"
+    - "Email the team about the Q4 results"
+    """
+    
+    task_lower = task_description.lower()
+    
+    # Determine action
+    action = 'draft'  # Default to draft for safety
+    if 'send' in task_lower and 'draft' not in task_lower:
+        action = 'send'
+    
+    # Extract recipient email
+    recipient_email = _reference_extract_email_address(task_description)
+    
+    # Extract subject/topic
+    subject = ""
+    cc = None
+    bcc = None
+    
+    # Common patterns to find subject
+    subject_keywords = [
+        'about', 'regarding', 'confirming', 'discussing', 'meeting',
+        'project', 'deadline', 'proposal', 'results', 'update',
+        'follow-up', 'invitation', 'invitation to', 'schedule',
+        'thank', 'approval', 'review'
+    ]
+    
+    # Simple subject extraction
+    if 'about' in task_lower:
+        parts = task_description.split('about')
+        if len(parts) > 1:
+            subject = parts[1].strip().rstrip('.,!?')
+    elif 'confirming' in task_lower:
+        subject = "Meeting Confirmation"
+    elif 'regarding' in task_lower:
+        parts = task_description.split('regarding')
+        if len(parts) > 1:
+            subject = parts[1].strip().rstrip('.,!?')
+    elif 'thank' in task_lower:
+        subject = "Thank You"
+    else:
+        # Extract meaningful words from the task
+        words = [w for w in task_description.split() if len(w) > 4]
+        if words:
+            subject = ' '.join(words[:3])
+    
+    if not subject:
+        subject = "Important Message"
+    
+    # Capitalize subject properly
+    subject = ' '.join(word.capitalize() for word in subject.split())
+    
+    # Generate body based on task description
+    body = f"Hello,\n\n{task_description}\n\nBest regards"
+    
+    # Try to make body more natural
+    if 'confirming' in task_lower:
+        body = f"Hello,\n\nI wanted to confirm {task_description.lower().split('confirming')[-1].strip()}.\n\nPlease let me know if you have any questions.\n\nBest regards"
+    elif 'thank' in task_lower:
+        body = f"Hello,\n\nThank you for {task_description.lower().split('thank')[-1].strip()}.\n\nI really appreciate your help.\n\nBest regards"
+    elif 'about' in task_lower or 'regarding' in task_lower:
+        topic = task_description.lower().split('about' if 'about' in task_lower else 'regarding')[-1].strip()
+        body = f"Hello,\n\nI wanted to reach out regarding {topic}.\n\nPlease let me know your thoughts.\n\nBest regards"
+    
+    return {
+        'to': recipient_email or 'recipient@example.com',
+        'subject': subject,
+        'body': body,
+        'cc': cc,
+        'bcc': bcc,
+        'action': action,
+        'interpretation': f"{action.capitalize()} email to {recipient_email or 'recipient'} about '{subject}'"
+    }
+
+
+def generate_tasks(count: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    tasks = [
+        rng.choice(TEMPLATES).format(address=f"user{i}@example.com", topic=rng.choice(TOPICS))
+        for i in range(count)
+    ]
+    return tasks + EDGE_CASES
+
+
+def tasks_per_second(parse: Callable[[str], dict], tasks: List[str], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for task in tasks:
+            parse(task)
+        best = min(best, time.perf_counter() - start)
+    return len(tasks) / best
+
+
+def check_parity(tasks: List[str]) -> List[dict]:
+    mismatches = []
+    for task in tasks:
+        expected, actual = reference_parse_email_task(task), parse_email_task(task)
+        if expected != actual:
+            mismatches.append({"task": task, "expected": expected, "actual": actual})
+    return mismatches
+
+
+def http_tasks_per_second(url: str, tasks: List[str], batch_size: int) -> float:
+    import httpx
+    start = time.perf_counter()
+    with httpx.Client(base_url=url, timeout=120) as client:
+        for i in range(0, len(tasks), batch_size):
+            response = client.post("/personal-assistant/email/agent/process-tasks",
+                                   json={"tasks": tasks[i:i + batch_size]})
+            response.raise_for_status()
+    return len(tasks) / (time.perf_counter() - start)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Parity check and throughput of the email task parser")
+    parser.add_argument("--tasks", type=int, default=20000, help="Generated tasks (edge cases are added)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--url", help="Also benchmark /process-tasks on a running server")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Tasks per /process-tasks request")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    tasks = generate_tasks(args.tasks)
+    mismatches = check_parity(tasks)
+    report = {
+        "tasks": len(tasks),
+        "mismatches": len(mismatches),
+        "reference_tasks_per_second": round(tasks_per_second(reference_parse_email_task, tasks, args.repeats)),
+        "compiled_tasks_per_second": round(tasks_per_second(parse_email_task, tasks, args.repeats)),
+    }
+    report["speedup"] = round(report["compiled_tasks_per_second"] / report["reference_tasks_per_second"], 2)
+    if args.url:
+        report["http_tasks_per_second"] = round(http_tasks_per_second(args.url, tasks, args.batch_size))
+        report["http_batch_size"] = args.batch_size
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if mismatches:
+        for mismatch in mismatches[:5]:
+            print(json.dumps(mismatch, indent=2, ensure_ascii=False))
+        sys.exit(f"{len(mismatches)} tasks parsed differently from the reference")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,10 @@
 # Configuration for Jarvis Assistant
+import json
+import os
+
+# Ollama endpoint (override to point at a remote host or the benchmark stand-in server)
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+OLLAMA_BASE_URL = OLLAMA_URL.split("/api/")[0]
 
 # Model configurations (ordered by speed - fastest first)
 MODELS = {
@@ -60,9 +66,145 @@ MODELS = {
     }
 }
 
+# Option sets measured by benchmarks/autotune.py replace the hand-picked ones above when the file exists
+MODEL_PROFILES_PATH = os.getenv("MODEL_PROFILES_PATH", "./model_profiles.json")
+if os.path.exists(MODEL_PROFILES_PATH):
+    try:
+        with open(MODEL_PROFILES_PATH) as _f:
+            _tuned_profiles = json.load(_f)["profiles"]
+        for _name, _profile in _tuned_profiles.items():
+            # Only options tuned for the same model carry over
+            if _name in MODELS and _profile.get("name") == MODELS[_name]["name"]:
+                MODELS[_name] = {**MODELS[_name], "options": dict(_profile["options"]), "tuned": _profile.get("tuned")}
+            else:
+                print(f"⚠ Ignoring tuned profile {_name} from {MODEL_PROFILES_PATH}: unknown profile or different model")
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        print(f"⚠ Could not load tuned model profiles from {MODEL_PROFILES_PATH}: {e}")
+
 # Current model setting
 CURRENT_MODEL = "ultra_fast"  # Change to "balanced" or "quality" as needed
 
 # Vector search settings
 MAX_CONTEXT_LENGTH = 2000  # Increased for better context
-TOP_K_RESULTS = 2
\ No newline at end of file
+TOP_K_RESULTS = 2
+
+# Knowledge base storage and embedding model
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+COLLECTION_NAME = "knowledge_base"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Knowledge base sharding (applies to collection versions created from now on; re-index to change an existing store)
+# "none", "tenant" (one shard per tenant), "hash" (doc_id hashed onto KB_SHARD_COUNT shards)
+# or "time" (one shard per KB_SHARD_PERIOD_DAYS of upload time)
+KB_SHARD_KEY = os.getenv("KB_SHARD_KEY", "none").lower()
+KB_SHARD_COUNT = int(os.getenv("KB_SHARD_COUNT", "4"))
+KB_SHARD_PERIOD_DAYS = int(os.getenv("KB_SHARD_PERIOD_DAYS", "30"))
+# Directories for shard stores, comma-separated (e.g. one per disk); new shards go to the least used one
+KB_SHARD_PATHS = [p.strip() for p in os.getenv("KB_SHARD_PATHS", CHROMA_PATH).split(",") if p.strip()]
+KB_SHARD_QUERY_WORKERS = int(os.getenv("KB_SHARD_QUERY_WORKERS", "8"))  # Parallel shard queries per process
+
+# Embedding backend: "torch" (reference), "torch_int8" (quantized, faster on CPU) or "onnx" (needs optimum[onnxruntime])
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_BATCH_SIZE = 32
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = library default
+
+# Document ingestion and lifecycle
+MAX_CHUNKS_PER_DOCUMENT = 100
+SESSION_DOCUMENT_TTL_SECONDS = 24 * 60 * 60  # Lifetime of documents uploaded with session_only=true
+DOCUMENT_EXPIRY_INTERVAL_SECONDS = 300       # How often expired session-only documents are purged
+
+# Knowledge base inspection/export paging
+INSPECT_MAX_LIMIT = 100
+EXPORT_BATCH_SIZE = 500
+
+# Background re-index into a new embedding model version (see reindex.py)
+REINDEX_BATCH_SIZE = 64
+REINDEX_BATCH_DELAY_SECONDS = 0.05  # Pause between batches to leave CPU for queries
+
+# Vector store snapshots (see snapshot.py)
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "./snapshots")
+
+# Seconds a retrieval request waits for the embedding model while it is still loading
+KNOWLEDGE_BASE_READY_TIMEOUT = 60
+
+# Per-session in-memory vector index (session-scoped retrieval)
+SESSION_INDEX_MAX_BYTES = 256 * 1024 * 1024  # Evict least-recently-used sessions above this
+SESSION_INDEX_IDLE_SECONDS = 60 * 60         # Drop sessions idle for longer than this
+
+# Outbound SMTP connection pool (host/port/security come from .env, see simple_email_manager.py)
+SMTP_POOL_SIZE = 2                    # Logged-in sessions kept per account
+SMTP_IDLE_TIMEOUT_SECONDS = 60        # Close sessions idle longer than this (Gmail drops them after a few minutes)
+SMTP_HEALTHCHECK_AFTER_SECONDS = 5    # NOOP a session before reuse if it sat idle longer than this
+SMTP_TIMEOUT_SECONDS = 30
+
+# Outbound email queue (see email_queue.py)
+EMAIL_QUEUE_WORKERS = SMTP_POOL_SIZE  # One worker per pooled session
+EMAIL_RATE_PER_MINUTE = 20            # Sustained send rate (token bucket)
+EMAIL_RATE_BURST = 5
+EMAIL_DAILY_LIMIT = 500               # Gmail's rolling 24h cap for regular accounts; 0 = no cap
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BASE_SECONDS = 2          # Backoff doubles per attempt, with jitter
+EMAIL_RETRY_MAX_SECONDS = 300
+EMAIL_OUTBOX_RETENTION = 1000         # Finished messages kept for status lookups
+EMAIL_BULK_MAX_ITEMS = 100
+
+EMAIL_TASK_BATCH_MAX = 5000           # Tasks per /process-tasks request
+
+# Tiered email task interpretation (see email_interpreter.py)
+EMAIL_INTERPRETER_MODEL = "fast"               # MODELS profile used for JSON extraction
+EMAIL_INTERPRETER_CONFIDENCE = 0.8             # Rule results at or above this skip the LLM
+EMAIL_INTERPRETER_BUDGET_SECONDS = 2.5         # Wait this long for the LLM, then answer from the rules
+EMAIL_INTERPRETER_LLM_TIMEOUT_SECONDS = 60     # Cap for LLM calls still running after the budget
+EMAIL_INTERPRETER_NUM_PREDICT = 256
+EMAIL_INTERPRETER_CACHE_SIZE = 1000
+EMAIL_INTERPRETER_COOLDOWN_SECONDS = 30        # Skip the LLM this long after a connection failure
+
+# Email drafts (see draft_store.py)
+DRAFTS_DB_PATH = os.getenv("DRAFTS_DB_PATH", "./drafts.sqlite3")
+DRAFTS_PAGE_MAX = 100
+
+# Inbox sync over IMAP into a local SQLite cache (host/port/security from .env, see mail_sync.py)
+MAIL_CACHE_PATH = os.getenv("MAIL_CACHE_PATH", "./mail_cache.sqlite3")
+MAIL_SYNC_INTERVAL_SECONDS = 120   # Background sync period; 0 disables it
+MAIL_INITIAL_SYNC_LIMIT = 500      # First sync of a mailbox only pulls the newest N messages
+IMAP_FETCH_BATCH_SIZE = 200        # UIDs per header FETCH
+IMAP_TIMEOUT_SECONDS = 30
+INBOX_PAGE_MAX = 100
+
+# Semantic mail index (see mail_index.py)
+MAIL_COLLECTION_NAME = "mail_index"
+MAIL_INDEX_BATCH_SIZE = 16              # Messages embedded per background batch
+MAIL_INDEX_BATCH_DELAY_SECONDS = 0.05   # Pause between batches so queries keep the CPU
+MAIL_INDEX_RETRY_BASE_SECONDS = 5       # Wait after a failed batch (e.g. IMAP outage); doubles per failure in a row
+MAIL_INDEX_RETRY_MAX_SECONDS = 300
+MAIL_MAX_CHUNKS_PER_MESSAGE = 20
+MAIL_CONTEXT_RESULTS = 2                # Mail chunks added to chat context when include_mail is set
+MAIL_SEARCH_MAX_RESULTS = 50
+
+# Diagnostics (see diagnostics.py; /admin endpoints are disabled until ADMIN_TOKEN is set)
+PROFILER_DEFAULT_INTERVAL_MS = 10   # Stack sampling period
+PROFILER_MAX_SECONDS = 300          # Longest profiling session before it stops by itself
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "2000"))
+SLOW_REQUEST_BUFFER_SIZE = 100      # Slow requests kept for /admin/slow-requests
+
+# Structured logging (see structured_logging.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))   # Share of requests whose DEBUG payload records are kept
+LOG_REDACT_CONTENT = os.getenv("LOG_REDACT_CONTENT", "true").lower() == "true"  # Replace message/document text with its length
+LOG_QUEUE_SIZE = 10000           # Records waiting for the writer thread
+LOG_SHED_DEBUG_AT = 0.5          # Queue fill at which DEBUG records are dropped
+LOG_SHED_INFO_AT = 0.8           # Queue fill at which INFO records are dropped as well
+
+# Ingestion-time document summaries (see summaries.py)
+SUMMARY_COLLECTION_NAME = "kb_summaries"
+SUMMARY_MODEL = "fast"                 # MODELS profile that writes summaries
+SUMMARY_SECTION_CHARS = 4000           # Consecutive chunks are summarized in sections of about this size
+SUMMARY_FAN_IN = 8                     # Summaries merged per step on the way up to the document summary
+SUMMARY_NUM_PREDICT = 200
+SUMMARY_LLM_TIMEOUT_SECONDS = 120
+SUMMARY_COOLDOWN_SECONDS = 60          # Summarize extractively this long after Ollama was unreachable
+SUMMARY_EXTRACTIVE_SENTENCES = 4       # Sentences kept by the extractive fallback
+SUMMARY_MAX_CHARS = 800                # Cap per stored summary
+SUMMARY_MAX_DOCUMENTS = 3              # Documents a summary query covers at most
+SUMMARY_MATCH_MAX_DISTANCE = 1.2       # Topic-to-summary distance (2 - 2 x cosine) beyond which no document is meant
+SUMMARY_BATCH_DELAY_SECONDS = 0.05     # Pause between documents so queries keep the CPU
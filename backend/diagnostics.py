@@ -0,0 +1,231 @@
+"""
+Diagnostics - On-demand sampling profiler and slow request capture
+
+The profiler samples every thread's Python stack (sys._current_frames) at
+a fixed interval from a background thread and aggregates them as folded
+stacks ("thread;outer;...;inner count" per line), the input format of
+flamegraph.pl, speedscope and similar tools. Threads parked in a wait or
+select are left out by default, so idle workers don't drown the profile.
+
+SlowRequestMiddleware times each HTTP request (streaming responses until
+the last chunk), collects the stage_timer records made while serving it
+and keeps requests slower than the threshold in a bounded ring buffer.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from config import (
+    PROFILER_DEFAULT_INTERVAL_MS, PROFILER_MAX_SECONDS, SLOW_REQUEST_THRESHOLD_MS, SLOW_REQUEST_BUFFER_SIZE
+)
+from metrics import capture_stages, counter
+from structured_logging import current_request_id
+
+SLOW_REQUESTS = counter("jarvis_slow_requests_total", "Requests slower than the slow request threshold")
+
+# Leaf functions of a thread that is waiting for work rather than doing it
+IDLE_FUNCTIONS = frozenset({"wait", "select", "poll", "epoll", "kqueue", "_wait_for_tstate_lock", "accept"})
+
+
+class SamplingProfiler:
+    """Wall-clock stack sampler for the running process (one session at a time)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._labels: Dict[object, str] = {}  # code object -> frame label
+        self.stacks: Counter = Counter()
+        self.interval = PROFILER_DEFAULT_INTERVAL_MS / 1000
+        self.include_idle = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.samples = 0
+        self.sampling_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = PROFILER_DEFAULT_INTERVAL_MS, duration_seconds: float = 30.0,
+              include_idle: bool = False):
+        """Start sampling; stops by itself after duration_seconds (capped at PROFILER_MAX_SECONDS)"""
+        with self._lock:
+            if self.running:
+                raise RuntimeError("The profiler is already running")
+            self.stacks = Counter()
+            self.interval = max(1.0, interval_ms) / 1000
+            self.include_idle = include_idle
+            self.samples = 0
+            self.sampling_seconds = 0.0
+            self.started_at = time.time()
+            self.finished_at = None
+            self._stop.clear()
+            duration = min(max(duration_seconds, self.interval), PROFILER_MAX_SECONDS)
+            self._thread = threading.Thread(target=self._run, args=(duration,), name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        return self.status()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _run(self, duration: float):
+        own_ident = threading.get_ident()
+        deadline = time.monotonic() + duration
+        names: Dict[int, str] = {}
+        names_refreshed = 0.0
+        while not self._stop.wait(self.interval):
+            sample_start = time.perf_counter()
+            if sample_start - names_refreshed > 1.0:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                names_refreshed = sample_start
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                if not self.include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+                stack.reverse()
+                self.stacks[";".join(stack)] += 1
+            self.samples += 1
+            self.sampling_seconds += time.perf_counter() - sample_start
+            if time.monotonic() >= deadline:
+                break
+        self.finished_at = time.time()
+
+    def folded(self) -> str:
+        """Folded stacks, heaviest first; frames are "function (file:line)" """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def status(self) -> dict:
+        end = self.finished_at or time.time()
+        wall = end - self.started_at if self.started_at else 0.0
+        return {
+            "running": self.running,
+            "interval_ms": round(self.interval * 1000, 2),
+            "include_idle": self.include_idle,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "samples": self.samples,
+            "distinct_stacks": len(self.stacks),
+            # Share of wall time spent taking samples (holds the GIL, so it is the cost to the app)
+            "overhead_percent": round(100 * self.sampling_seconds / wall, 2) if wall else None,
+        }
+
+
+class SlowRequestLog:
+    """Ring buffer of the most recent requests over the latency threshold"""
+
+    def __init__(self, threshold_ms: float = SLOW_REQUEST_THRESHOLD_MS, size: int = SLOW_REQUEST_BUFFER_SIZE):
+        self.threshold_ms = threshold_ms
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.captured = 0
+
+    def configure(self, threshold_ms: Optional[float] = None, size: Optional[int] = None):
+        with self._lock:
+            if threshold_ms is not None:
+                self.threshold_ms = threshold_ms
+            if size is not None and size != self._records.maxlen:
+                self._records = deque(self._records, maxlen=size)
+
+    def record(self, entry: dict):
+        with self._lock:
+            self._records.append(entry)
+            self.captured += 1
+        SLOW_REQUESTS.inc()
+
+    def list(self, limit: Optional[int] = None, path_prefix: Optional[str] = None) -> List[dict]:
+        """Newest first"""
+        with self._lock:
+            records = list(reversed(self._records))
+        if path_prefix:
+            records = [r for r in records if r["path"].startswith(path_prefix)]
+        return records[:limit] if limit else records
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "threshold_ms": self.threshold_ms,
+                "buffer_size": self._records.maxlen,
+                "buffered": len(self._records),
+                "captured_total": self.captured,
+            }
+
+
+class SlowRequestMiddleware:
+    """ASGI middleware feeding a SlowRequestLog (plain ASGI, so streaming responses pass through untouched)"""
+
+    def __init__(self, app, log: "SlowRequestLog", exclude_prefixes: tuple = ("/admin",)):
+        self.app = app
+        self.log = log
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        stages = capture_stages()
+        start = time.perf_counter()
+        response = {"status": None, "first_byte": None}
+
+        async def send_and_observe(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body" and response["first_byte"] is None:
+                response["first_byte"] = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_observe)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms >= self.log.threshold_ms:
+                self.log.record(self._entry(scope, response, start, elapsed_ms, stages))
+
+    @staticmethod
+    def _entry(scope, response: dict, start: float, elapsed_ms: float, stages: List[dict]) -> dict:
+        breakdown = [
+            {"operation": s["operation"], "stage": s["stage"],
+             "offset_ms": round((s["started"] - start) * 1000, 1), "ms": s["ms"]}
+            for s in sorted(stages, key=lambda s: s["started"])
+        ]
+        slowest = max(breakdown, key=lambda s: s["ms"], default=None)
+        return {
+            "request_id": current_request_id(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "status": response["status"],
+            "duration_ms": round(elapsed_ms, 1),
+            "time_to_first_byte_ms": round((response["first_byte"] - start) * 1000, 1) if response["first_byte"] else None,
+            "finished_at": time.time(),
+            "slowest_stage": f"{slowest['operation']}.{slowest['stage']}" if slowest else None,
+            "stages": breakdown,
+        }
+
+
+profiler = SamplingProfiler()
+slow_requests = SlowRequestLog()
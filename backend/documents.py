@@ -0,0 +1,269 @@
+"""
+Documents - Ingestion and lifecycle of knowledge base documents
+
+Text extraction, chunking, embedding and storage for uploads, plus
+document-level delete/replace, TTL expiry of session-only documents and
+compaction of the Chroma SQLite store. Stored documents are queued for
+background summarizing (see summaries.py).
+"""
+import os
+import sqlite3
+import time
+import uuid
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from config import CHROMA_PATH, MAX_CHUNKS_PER_DOCUMENT, EXPORT_BATCH_SIZE
+from knowledge_base import (
+    get_collection, get_embedding_model, iter_batches, mirror_upsert, mirror_delete, storage_paths,
+    write_token, write_lock, encode_for_shadow
+)
+from metrics import stage_timer, INGESTED_CHUNKS, counter
+from session_index import session_indexes
+from structured_logging import get_logger
+from kb_stats import knowledge_stats
+from summaries import summary_index
+
+log = get_logger("documents")
+
+DELETED_CHUNKS = counter("jarvis_deleted_chunks_total", "Document chunks removed from the knowledge base", ("reason",))
+
+
+class DocumentError(ValueError):
+    """Uploaded content could not be turned into chunks"""
+
+
+def extract_text(filename: str, content: bytes) -> str:
+    """Extract plain text from an uploaded PDF or text file"""
+    if filename.endswith('.pdf'):
+        # PDF processing with PyPDF2 (imported lazily, it's slow to import)
+        try:
+            import PyPDF2
+            pdf_reader = PyPDF2.PdfReader(BytesIO(content))
+            text_content = ""
+
+            # Extract text from all pages
+            for page in pdf_reader.pages:
+                text_content += page.extract_text() + "\n\n"
+        except Exception as e:
+            log.warning("pdf_parse_failed", filename=filename, error=str(e))
+            raise DocumentError(f"Error parsing PDF: {str(e)}")
+
+        if not text_content.strip():
+            raise DocumentError("No text found in PDF. It might be scanned or image-based.")
+
+        log.debug("pdf_extracted", filename=filename, chars=len(text_content))
+        return text_content
+
+    # Handle text files
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        try:
+            return content.decode('latin-1')
+        except UnicodeDecodeError:
+            raise DocumentError("Unable to decode file. Please ensure it's a valid text file.")
+
+
+def chunk_text(text_content: str) -> List[str]:
+    """Split text into paragraph chunks (falling back to lines), capped at MAX_CHUNKS_PER_DOCUMENT"""
+    chunks = [chunk.strip() for chunk in text_content.split('\n\n') if chunk.strip()]
+
+    if not chunks:
+        # If no paragraphs, split by sentences or lines
+        chunks = [chunk.strip() for chunk in text_content.split('\n') if chunk.strip()]
+
+    if not chunks:
+        raise DocumentError("No content found in the file")
+
+    # Limit chunk size to avoid memory issues
+    return chunks[:MAX_CHUNKS_PER_DOCUMENT]
+
+
+def new_doc_id(timestamp: int) -> str:
+    return f"doc_{timestamp}_{uuid.uuid4().hex[:8]}"
+
+
+def store_chunks(doc_id: str, filename: str, chunks: List[str], timestamp: int,
+                 extra_metadata: Optional[dict] = None, operation: str = "upload_document",
+                 timings: Optional[Dict[str, float]] = None):
+    """
+    Embed chunks and write them to the collection as {doc_id}_chunk_{i}
+
+    Returns:
+        (embeddings, metadatas) so callers can feed the session index
+    """
+    ids = [f"{doc_id}_chunk_{i}" for i in range(len(chunks))]
+    metadatas = [{
+        "filename": filename,
+        "chunk_id": i,
+        "timestamp": timestamp,
+        "doc_id": doc_id,
+        "chars": len(chunks[i]),  # Lets kb_stats.py rebuild from metadata alone
+        **(extra_metadata or {})
+    } for i in range(len(chunks))]
+
+    while True:
+        token = write_token()
+        with stage_timer(operation, "embedding", timings):
+            embeddings = get_embedding_model().encode(chunks)
+            # Keep a re-index in progress up to date, embedded with its own model
+            shadow_embeddings = encode_for_shadow(chunks)
+
+        with stage_timer(operation, "store", timings), write_lock(token) as current:
+            if current:
+                get_collection().upsert(
+                    embeddings=embeddings.tolist(),
+                    documents=chunks,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+                mirror_upsert(ids, chunks, metadatas, shadow_embeddings)
+                break
+        # A re-index started or cut over while encoding; the vectors are for the wrong model
+    knowledge_stats.record_document(doc_id, chunks, metadatas)
+    INGESTED_CHUNKS.inc(len(chunks))
+    summary_index.enqueue(doc_id, filename, chunks, {"timestamp": timestamp, **(extra_metadata or {})})
+    return embeddings, metadatas
+
+
+def get_document_metadata(doc_id: str) -> Optional[dict]:
+    """Metadata of the first chunk of a document, or None if it doesn't exist"""
+    results = get_collection().get(where={"doc_id": doc_id}, limit=1, include=["metadatas"])
+    metadatas = results.get("metadatas") or []
+    return metadatas[0] if metadatas else None
+
+
+def delete_document(doc_id: str, reason: str = "delete") -> int:
+    """Remove every chunk of a document. Returns the number of chunks removed."""
+    with write_lock():
+        collection = get_collection()
+        chunk_ids = collection.get(where={"doc_id": doc_id}, include=[]).get("ids") or []
+        if chunk_ids:
+            collection.delete(ids=chunk_ids)
+            mirror_delete(chunk_ids)
+    if chunk_ids:
+        knowledge_stats.record_delete(doc_id)
+        DELETED_CHUNKS.inc(len(chunk_ids), reason=reason)
+    session_indexes.remove_document(doc_id)
+    summary_index.remove(doc_id)
+    return len(chunk_ids)
+
+
+def replace_document(doc_id: str, filename: str, chunks: List[str],
+                     timings: Optional[Dict[str, float]] = None) -> dict:
+    """
+    Replace a document's content in place, keeping its doc_id
+
+    New chunks are upserted before surplus old chunks are deleted, so the
+    document never disappears from search while it is being replaced.
+    """
+    previous = get_document_metadata(doc_id)
+    if previous is None:
+        raise KeyError(doc_id)
+
+    old_ids = set(get_collection().get(where={"doc_id": doc_id}, include=[]).get("ids") or [])
+    timestamp = int(time.time())
+    # Carry over tenant and session ownership/expiry; bump the version
+    carried = {k: v for k, v in previous.items() if k in ("tenant", "conversation_id", "session_only", "expires_at")}
+    carried["version"] = int(previous.get("version", 1)) + 1
+
+    store_chunks(doc_id, filename, chunks, timestamp, extra_metadata=carried,
+                 operation="replace_document", timings=timings)
+
+    stale_ids = sorted(old_ids - {f"{doc_id}_chunk_{i}" for i in range(len(chunks))})
+    if stale_ids:
+        with write_lock():
+            get_collection().delete(ids=stale_ids)
+            mirror_delete(stale_ids)
+        DELETED_CHUNKS.inc(len(stale_ids), reason="replace")
+
+    # Sessions holding the old version reload it from the store on their next query
+    session_indexes.remove_document(doc_id)
+    return {"doc_id": doc_id, "chunks": len(chunks), "version": carried["version"], "removed_chunks": len(stale_ids)}
+
+
+def delete_conversation_documents(conversation_id: str, include_shared: bool = False) -> int:
+    """
+    Remove documents uploaded in a conversation, found by metadata so it works across restarts
+
+    Only session_only documents go unless include_shared is set: other
+    uploads carry the conversation_id too, but belong to the shared
+    knowledge base.
+    """
+    where = {"conversation_id": conversation_id}
+    if not include_shared:
+        where = {"$and": [where, {"session_only": True}]}
+    doc_ids = set()
+    for batch in iter_batches(EXPORT_BATCH_SIZE, where=where, include=["metadatas"]):
+        doc_ids.update(metadata["doc_id"] for metadata in batch["metadatas"])
+    return sum(delete_document(doc_id, reason="conversation_deleted") for doc_id in sorted(doc_ids))
+
+
+def find_expired_documents(now: Optional[float] = None) -> Dict[str, Optional[str]]:
+    """Session-only documents whose TTL has passed, as {doc_id: conversation_id}"""
+    now = now if now is not None else time.time()
+    expired: Dict[str, Optional[str]] = {}
+    for batch in iter_batches(EXPORT_BATCH_SIZE, where={"expires_at": {"$lte": now}}, include=["metadatas"]):
+        for metadata in batch["metadatas"]:
+            expired.setdefault(metadata["doc_id"], metadata.get("conversation_id"))
+    return expired
+
+
+def expire_documents(now: Optional[float] = None) -> List[Tuple[str, Optional[str]]]:
+    """Delete expired session-only documents. Returns [(doc_id, conversation_id)] removed."""
+    expired = find_expired_documents(now)
+    for doc_id in expired:
+        delete_document(doc_id, reason="expired")
+    if expired:
+        log.info("documents_expired", documents=len(expired))
+    return list(expired.items())
+
+
+def _vacuum(db_path: str) -> Optional[dict]:
+    if not os.path.exists(db_path):
+        return None
+    size_before = os.path.getsize(db_path)
+    start = time.perf_counter()
+    # Knowledge base writes, re-index copies and cutovers wait here rather than on SQLite's lock
+    with stage_timer("compact", "vacuum"), write_lock():
+        connection = sqlite3.connect(db_path, timeout=60)
+        try:
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+    size_after = os.path.getsize(db_path)
+    return {
+        "path": db_path,
+        "bytes_before": size_before,
+        "bytes_after": size_after,
+        "bytes_reclaimed": size_before - size_after,
+        "seconds": round(time.perf_counter() - start, 2)
+    }
+
+
+def compact_store() -> dict:
+    """
+    Reclaim space left by deleted chunks in Chroma's SQLite files
+
+    VACUUM rewrites each database file (CHROMA_PATH and every shard
+    directory) without free pages. Each file is vacuumed under the
+    knowledge base write lock, so uploads, deletes, re-index copies and
+    cutovers are blocked until that file is done; other writers to the
+    same file (mail and summary indexes) wait on SQLite's exclusive lock.
+
+    Only chroma.sqlite3 shrinks: the HNSW segment files next to it keep
+    deleted vectors, which Chroma only marks as deleted. Re-indexing into
+    a new version (reindex.py) writes fresh segments without them.
+    """
+    db_path = os.path.join(CHROMA_PATH, "chroma.sqlite3")
+    if not os.path.exists(db_path):
+        return {"compacted": False, "reason": f"{db_path} not found"}
+
+    vacuumed = (_vacuum(os.path.join(path, "chroma.sqlite3")) for path in storage_paths())
+    stores = [store for store in vacuumed if store]
+    totals = {key: sum(store[key] for store in stores) for key in ("bytes_before", "bytes_after", "bytes_reclaimed")}
+    result = {"compacted": True, **totals, "seconds": round(sum(store["seconds"] for store in stores), 2)}
+    if len(stores) > 1:
+        result["stores"] = stores
+    return result
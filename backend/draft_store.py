@@ -0,0 +1,157 @@
+"""
+Draft Store - SQLite-backed email drafts
+
+Drafts get random (uuid4) ids, so deleting one never lets a new draft take
+over its id, and they survive restarts. Listing is newest first and
+keyset-paginated on (created_at, id), served by indexes on creation time
+and on status. Queueing a draft for delivery is a conditional update, so
+two concurrent sends of one draft can't both queue it, and a draft that
+was already sent can't be queued again.
+"""
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import DRAFTS_DB_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS drafts (
+    id TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    cc TEXT,
+    bcc TEXT,
+    status TEXT NOT NULL DEFAULT 'draft',
+    tracking_id TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_drafts_created ON drafts (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_drafts_status ON drafts (status, created_at DESC, id DESC);
+"""
+
+_COLUMNS = "id, recipient, subject, body, cc, bcc, status, tracking_id, error, created_at, updated_at"
+
+
+def _draft(row: tuple) -> dict:
+    draft_id, recipient, subject, body, cc, bcc, status, tracking_id, error, created_at, updated_at = row
+    return {
+        "id": draft_id,
+        "to": recipient,
+        "subject": subject,
+        "body": body,
+        "cc": cc,
+        "bcc": bcc,
+        "status": status,
+        "tracking_id": tracking_id,
+        "error": error,
+        "created_at": created_at,
+        "updated_at": updated_at,
+    }
+
+
+class DraftStore:
+    """Thread-safe SQLite draft store (one connection, serialized)"""
+
+    def __init__(self, path: str = DRAFTS_DB_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def create_many(self, drafts: Iterable[dict]) -> List[dict]:
+        """Insert drafts (dicts with to, subject, body, cc, bcc) in one transaction"""
+        now = time.time()
+        rows = []
+        for i, draft in enumerate(drafts):
+            # Nudge timestamps so drafts created together keep their order when listed
+            created_at = now + i * 1e-6
+            rows.append((uuid.uuid4().hex, draft["to"], draft["subject"], draft["body"],
+                         draft.get("cc"), draft.get("bcc"), "draft", None, None, created_at, created_at))
+        with self._lock, self._conn:
+            self._conn.executemany(f"INSERT INTO drafts ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return [_draft(row) for row in rows]
+
+    def create(self, draft: dict) -> dict:
+        return self.create_many([draft])[0]
+
+    def get(self, draft_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM drafts WHERE id = ?", (draft_id,)).fetchone()
+        return _draft(row) if row else None
+
+    def list_drafts(self, limit: int, cursor: Optional[Tuple[float, str]] = None,
+                    status: Optional[str] = None) -> List[dict]:
+        """Newest first, keyset-paginated on (created_at, id)"""
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if cursor is not None:
+            clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params.extend([cursor[0], cursor[0], cursor[1]])
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM drafts {where}ORDER BY created_at DESC, id DESC LIMIT ?", params
+            ).fetchall()
+        return [_draft(row) for row in rows]
+
+    def delete_many(self, draft_ids: Iterable[str]) -> List[str]:
+        """Delete drafts; returns the ids that existed"""
+        draft_ids = list(dict.fromkeys(draft_ids))
+        deleted = []
+        with self._lock, self._conn:
+            for draft_id in draft_ids:
+                if self._conn.execute("DELETE FROM drafts WHERE id = ?", (draft_id,)).rowcount:
+                    deleted.append(draft_id)
+        return deleted
+
+    def delete(self, draft_id: str) -> bool:
+        return bool(self.delete_many([draft_id]))
+
+    def claim_for_sending(self, draft_id: str) -> bool:
+        """Mark an unsent (draft or failed) draft queued; False if it is already queued or sent"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE drafts SET status = 'queued', error = NULL, updated_at = ? "
+                "WHERE id = ? AND status IN ('draft', 'failed')",
+                (time.time(), draft_id),
+            )
+        return cursor.rowcount == 1
+
+    def set_status(self, draft_id: str, status: str, tracking_id: Optional[str] = None,
+                   error: Optional[str] = None, expected_tracking_id: Optional[str] = None):
+        """Update delivery status; with expected_tracking_id, only if that send is still the current one"""
+        sql = "UPDATE drafts SET status = ?, error = ?, updated_at = ?"
+        params: list = [status, error, time.time()]
+        if tracking_id is not None:
+            sql += ", tracking_id = ?"
+            params.append(tracking_id)
+        sql += " WHERE id = ?"
+        params.append(draft_id)
+        if expected_tracking_id is not None:
+            sql += " AND tracking_id = ?"
+            params.append(expected_tracking_id)
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def recover_interrupted(self) -> int:
+        """Return drafts left queued by a previous process (the outbound queue is in memory) to draft"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE drafts SET status = 'draft', error = ?, updated_at = ? WHERE status = 'queued'",
+                ("Restarted before delivery was confirmed; check Sent before resending", time.time()),
+            )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM drafts GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
@@ -2,26 +2,41 @@
 Email Agent - Interprets natural language email tasks
 """
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, List
+from config import EMAIL_TASK_BATCH_MAX
 import re
-import json
 
 router = APIRouter(prefix="/personal-assistant/email/agent", tags=["email-agent"])
 
 class EmailTaskRequest(BaseModel):
     task_description: str
 
+class EmailTaskBatchRequest(BaseModel):
+    tasks: List[str]
+
 class EmailTaskResponse(BaseModel):
     interpretation: str
     action: str  # 'draft' or 'send'
     email_data: dict
 
+EMAIL_ADDRESS_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+
 def extract_email_address(text: str) -> Optional[str]:
-    """Extract email address from text using regex"""
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    matches = re.findall(email_pattern, text)
-    return matches[0] if matches else None
+    """Extract the first email address from text"""
+    match = EMAIL_ADDRESS_PATTERN.search(text)
+    return match.group(0) if match else None
+
+def _first_segment_after(text: str, keyword: str) -> str:
+    """Text between the first and second occurrence of keyword, i.e. text.split(keyword)[1] (or '' if absent)"""
+    start = text.find(keyword)
+    if start < 0:
+        return ""
+    start += len(keyword)
+    end = text.find(keyword, start)
+    return text[start:end] if end >= 0 else text[start:]
 
 def parse_email_task(task_description: str) -> dict:
     """
@@ -31,78 +46,101 @@ def parse_email_task(task_description: str) -> dict:
     - "Send an email to john@example.com confirming our 2 PM meeting tomorrow"
     - "Draft an email to sarah@company.com about the project deadline"
     - "Email the team about the Q4 results"
-    """
     
+    Lowercases once and finds the last position of each keyword with one
+    rfind per keyword; the body topics are sliced from those positions.
+    The subject topic is cut from the original text (case-sensitive, as
+    the original split was), which takes up to two more find() scans for
+    "about" or "regarding" but builds no list of parts.
+    """
     task_lower = task_description.lower()
     
-    # Determine action
-    action = 'draft'  # Default to draft for safety
-    if 'send' in task_lower and 'draft' not in task_lower:
-        action = 'send'
+    # Last position of each keyword in the lowercased text (-1 when absent)
+    about = task_lower.rfind('about')
+    regarding = task_lower.rfind('regarding')
+    confirming = task_lower.rfind('confirming')
+    thank = task_lower.rfind('thank')
+    
+    # Determine action (default to draft for safety)
+    action = 'send' if 'send' in task_lower and 'draft' not in task_lower else 'draft'
     
     # Extract recipient email
     recipient_email = extract_email_address(task_description)
     
-    # Extract subject/topic
-    subject = ""
-    cc = None
-    bcc = None
-    
-    # Common patterns to find subject
-    subject_keywords = [
-        'about', 'regarding', 'confirming', 'discussing', 'meeting',
-        'project', 'deadline', 'proposal', 'results', 'update',
-        'follow-up', 'invitation', 'invitation to', 'schedule',
-        'thank', 'approval', 'review'
-    ]
-    
-    # Simple subject extraction
-    if 'about' in task_lower:
-        parts = task_description.split('about')
-        if len(parts) > 1:
-            subject = parts[1].strip().rstrip('.,!?')
-    elif 'confirming' in task_lower:
+    # Simple subject extraction (the topic is cut from the original text, so the match is case-sensitive)
+    if about >= 0:
+        subject = _first_segment_after(task_description, 'about').strip().rstrip('.,!?')
+    elif confirming >= 0:
         subject = "Meeting Confirmation"
-    elif 'regarding' in task_lower:
-        parts = task_description.split('regarding')
-        if len(parts) > 1:
-            subject = parts[1].strip().rstrip('.,!?')
-    elif 'thank' in task_lower:
+    elif regarding >= 0:
+        subject = _first_segment_after(task_description, 'regarding').strip().rstrip('.,!?')
+    elif thank >= 0:
         subject = "Thank You"
     else:
         # Extract meaningful words from the task
-        words = [w for w in task_description.split() if len(w) > 4]
-        if words:
-            subject = ' '.join(words[:3])
+        words = []
+        for word in task_description.split():
+            if len(word) > 4:
+                words.append(word)
+                if len(words) == 3:
+                    break
+        subject = ' '.join(words)
     
     if not subject:
         subject = "Important Message"
     
     # Capitalize subject properly
-    subject = ' '.join(word.capitalize() for word in subject.split())
+    subject = ' '.join([word.capitalize() for word in subject.split()])
     
-    # Generate body based on task description
-    body = f"Hello,\n\n{task_description}\n\nBest regards"
-    
-    # Try to make body more natural
-    if 'confirming' in task_lower:
-        body = f"Hello,\n\nI wanted to confirm {task_description.lower().split('confirming')[-1].strip()}.\n\nPlease let me know if you have any questions.\n\nBest regards"
-    elif 'thank' in task_lower:
-        body = f"Hello,\n\nThank you for {task_description.lower().split('thank')[-1].strip()}.\n\nI really appreciate your help.\n\nBest regards"
-    elif 'about' in task_lower or 'regarding' in task_lower:
-        topic = task_description.lower().split('about' if 'about' in task_lower else 'regarding')[-1].strip()
-        body = f"Hello,\n\nI wanted to reach out regarding {topic}.\n\nPlease let me know your thoughts.\n\nBest regards"
+    # Generate body based on task description; the topic is whatever follows the last keyword
+    if confirming >= 0:
+        body = f"Hello,\n\nI wanted to confirm {task_lower[confirming + 10:].strip()}.\n\nPlease let me know if you have any questions.\n\nBest regards"
+    elif thank >= 0:
+        body = f"Hello,\n\nThank you for {task_lower[thank + 5:].strip()}.\n\nI really appreciate your help.\n\nBest regards"
+    elif about >= 0 or regarding >= 0:
+        topic_start = about + 5 if about >= 0 else regarding + 9
+        body = f"Hello,\n\nI wanted to reach out regarding {task_lower[topic_start:].strip()}.\n\nPlease let me know your thoughts.\n\nBest regards"
+    else:
+        body = f"Hello,\n\n{task_description}\n\nBest regards"
     
     return {
         'to': recipient_email or 'recipient@example.com',
         'subject': subject,
         'body': body,
-        'cc': cc,
-        'bcc': bcc,
+        'cc': None,
+        'bcc': None,
         'action': action,
         'interpretation': f"{action.capitalize()} email to {recipient_email or 'recipient'} about '{subject}'"
     }
 
+def interpret_task(task_description: str) -> dict:
+    """
+    Validate and parse one task into the EmailTaskResponse fields
+    
+    Raises:
+        ValueError: the task is too short or names no recipient
+    """
+    if not task_description or len(task_description.strip()) < 10:
+        raise ValueError("Task description is too short. Please provide more details.")
+    
+    parsed = parse_email_task(task_description)
+    
+    # Validate email address
+    if '@' not in parsed['to']:
+        raise ValueError(f"Could not find a valid email address in your task. Please include the recipient's email address.")
+    
+    return {
+        'interpretation': parsed['interpretation'],
+        'action': parsed['action'],
+        'email_data': {
+            'to': parsed['to'],
+            'subject': parsed['subject'],
+            'body': parsed['body'],
+            'cc': parsed['cc'],
+            'bcc': parsed['bcc']
+        }
+    }
+
 @router.post("/process-task", response_model=EmailTaskResponse)
 async def process_email_task(request: EmailTaskRequest):
     """
@@ -127,33 +165,45 @@ async def process_email_task(request: EmailTaskRequest):
     }
     """
     try:
-        if not request.task_description or len(request.task_description.strip()) < 10:
-            raise ValueError("Task description is too short. Please provide more details.")
-        
-        # Parse the task
-        parsed = parse_email_task(request.task_description)
-        
-        # Validate email address
-        if '@' not in parsed['to']:
-            raise ValueError(f"Could not find a valid email address in your task. Please include the recipient's email address.")
-        
-        return EmailTaskResponse(
-            interpretation=parsed['interpretation'],
-            action=parsed['action'],
-            email_data={
-                'to': parsed['to'],
-                'subject': parsed['subject'],
-                'body': parsed['body'],
-                'cc': parsed['cc'],
-                'bcc': parsed['bcc']
-            }
-        )
-    
+        return EmailTaskResponse(**interpret_task(request.task_description))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing task: {str(e)}")
 
+@router.post("/process-tasks")
+async def process_email_tasks(request: EmailTaskBatchRequest):
+    """
+    Process many natural language email tasks in one request
+    
+    Results keep the input order. Each is either the /process-task response
+    fields with success=true, or success=false with the error, so one bad
+    task doesn't fail the batch.
+    
+    Example:
+    {
+        "tasks": [
+            "Send an email to john@example.com confirming our 2 PM meeting tomorrow",
+            "Draft an email to sarah@company.com about the project deadline"
+        ]
+    }
+    """
+    if len(request.tasks) > EMAIL_TASK_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {EMAIL_TASK_BATCH_MAX} tasks per request")
+    results = await run_in_threadpool(_interpret_tasks, request.tasks)
+    failed = sum(1 for result in results if not result['success'])
+    # Results are plain JSON types already; skip FastAPI's per-field encoding pass
+    return JSONResponse({"count": len(results), "succeeded": len(results) - failed, "failed": failed, "results": results})
+
+def _interpret_tasks(tasks: List[str]) -> List[dict]:
+    results = []
+    for task in tasks:
+        try:
+            results.append({'success': True, **interpret_task(task)})
+        except ValueError as e:
+            results.append({'success': False, 'error': str(e)})
+    return results
+
 @router.get("/examples")
 async def get_example_tasks():
     """Get example email tasks for users"""
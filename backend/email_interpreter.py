@@ -0,0 +1,271 @@
+"""
+Email Interpreter - Tiered natural language email task interpretation
+
+1. Cache: earlier LLM interpretations, keyed by normalized task text.
+2. Rules: parse_email_task answers at once when its confidence is high
+   (a recipient address plus a subject taken from an explicit cue such as
+   "about ..." or "confirming ...").
+3. LLM: other tasks go to the fast Ollama profile for JSON extraction under
+   a latency budget. On timeout or error the rule result is returned; a
+   request that finishes after the budget still fills the cache.
+
+After a connection failure the LLM tier is skipped for a cooldown period
+so an absent Ollama doesn't cost every request its budget.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from config import (
+    MODELS, OLLAMA_URL, EMAIL_INTERPRETER_MODEL, EMAIL_INTERPRETER_CONFIDENCE, EMAIL_INTERPRETER_BUDGET_SECONDS,
+    EMAIL_INTERPRETER_NUM_PREDICT, EMAIL_INTERPRETER_CACHE_SIZE, EMAIL_INTERPRETER_COOLDOWN_SECONDS,
+    EMAIL_INTERPRETER_LLM_TIMEOUT_SECONDS
+)
+from email_agent_routes import parse_email_task, extract_email_address, EMAIL_ADDRESS_PATTERN
+from metrics import counter, histogram, record_cache
+from structured_logging import get_logger
+
+log = get_logger("email_interpreter")
+
+INTERPRETATIONS = counter("jarvis_email_interpretations_total", "Email task interpretations by tier", ("tier",))
+INTERPRETATION_SECONDS = histogram(
+    "jarvis_email_interpretation_seconds", "Email task interpretation latency", ("tier",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+MOCK_MODE = os.getenv("MOCK_MODE", "false").lower() == "true"
+
+LLM_PROMPT = """Extract the email the user wants written from the task below.
+Reply with JSON only, using exactly these keys:
+"to": recipient email address from the task, or null
+"cc": cc email address from the task, or null
+"subject": short subject line, at most 8 words
+"body": the complete email text, with greeting and sign-off
+"action": "send" if the task says to send it now, otherwise "draft"
+
+Task: {task}
+"""
+
+_WHITESPACE = re.compile(r"\s+")
+_MAX_SUBJECT_WORDS = 8
+
+
+def normalize_task(task: str) -> str:
+    """Cache key: lowercase, single spaces, no trailing punctuation"""
+    return _WHITESPACE.sub(" ", task).strip().lower().rstrip(".!?")
+
+
+def rule_confidence(task: str, parsed: dict) -> float:
+    """
+    How much to trust the rule parser's result, from 0 to 1
+
+    0.4 for an explicit recipient address, up to 0.4 for a subject taken
+    from an explicit cue (mirroring parse_email_task's precedence), and 0.2
+    for an explicit send/draft verb.
+    """
+    task_lower = task.lower()
+    score = 0.4 if extract_email_address(task) else 0.0
+    if 'about' in task_lower or ('regarding' in task_lower and 'confirming' not in task_lower):
+        # Topic cut from the text: good unless empty or rambling
+        if parsed['subject'] != "Important Message":
+            score += 0.4 if len(parsed['subject'].split()) <= _MAX_SUBJECT_WORDS else 0.2
+    elif 'confirming' in task_lower or 'thank' in task_lower:
+        score += 0.4
+    # Otherwise the subject is the first long words of the task: no credit
+    if 'send' in task_lower or 'draft' in task_lower:
+        score += 0.2
+    return round(score, 2)
+
+
+def _response(parsed: dict, tier: str, confidence: Optional[float], started: float) -> dict:
+    elapsed = time.perf_counter() - started
+    INTERPRETATIONS.inc(tier=tier)
+    INTERPRETATION_SECONDS.observe(elapsed, tier=tier)
+    return {
+        'interpretation': parsed['interpretation'],
+        'action': parsed['action'],
+        'email_data': {
+            'to': parsed['to'],
+            'subject': parsed['subject'],
+            'body': parsed['body'],
+            'cc': parsed['cc'],
+            'bcc': parsed['bcc']
+        },
+        'recipient_found': parsed['recipient_found'],
+        'tier': tier,
+        'confidence': confidence,
+        'latency_ms': round(elapsed * 1000, 2)
+    }
+
+
+class EmailTaskInterpreter:
+    """Cache, rule and LLM tiers in front of one Ollama model profile"""
+
+    def __init__(self, model: str = EMAIL_INTERPRETER_MODEL, threshold: float = EMAIL_INTERPRETER_CONFIDENCE,
+                 budget_seconds: float = EMAIL_INTERPRETER_BUDGET_SECONDS,
+                 cache_size: int = EMAIL_INTERPRETER_CACHE_SIZE,
+                 cooldown_seconds: float = EMAIL_INTERPRETER_COOLDOWN_SECONDS,
+                 url: str = OLLAMA_URL, llm_enabled: bool = not MOCK_MODE, max_concurrent_llm: int = 4):
+        self.model = model
+        self.threshold = threshold
+        self.budget_seconds = budget_seconds
+        self.cache_size = cache_size
+        self.cooldown_seconds = cooldown_seconds
+        self.url = url
+        self.llm_enabled = llm_enabled
+        self.max_concurrent_llm = max_concurrent_llm
+        self._cache: "OrderedDict[str, dict]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._session = requests.Session()  # Keep-alive to Ollama
+        # Threads finishing after the budget keep running, so they get their own pool
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_llm, thread_name_prefix="email-interpreter")
+        self._llm_unavailable_until = 0.0
+
+    # Cache
+
+    def _cache_get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            parsed = self._cache.get(key)
+            if parsed is not None:
+                self._cache.move_to_end(key)
+        record_cache("email_interpretation", hit=parsed is not None)
+        return parsed
+
+    def _cache_put(self, key: str, parsed: dict):
+        with self._lock:
+            self._cache[key] = parsed
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    # Tiers
+
+    def rules(self, task: str) -> Tuple[dict, float]:
+        parsed = parse_email_task(task)
+        parsed['recipient_found'] = extract_email_address(task) is not None
+        return parsed, rule_confidence(task, parsed)
+
+    def llm_available(self) -> bool:
+        return self.llm_enabled and time.monotonic() >= self._llm_unavailable_until
+
+    def _query_llm(self, task: str) -> dict:
+        """Blocking Ollama call returning the raw JSON object the model produced"""
+        profile = MODELS[self.model]
+        payload = {
+            "model": profile["name"],
+            "prompt": LLM_PROMPT.format(task=task),
+            "format": "json",
+            "stream": False,
+            "options": {**profile["options"], "temperature": 0.0, "num_predict": EMAIL_INTERPRETER_NUM_PREDICT},
+        }
+        try:
+            response = self._session.post(self.url, json=payload,
+                                          timeout=(self.budget_seconds, EMAIL_INTERPRETER_LLM_TIMEOUT_SECONDS))
+        except requests.exceptions.ConnectionError:
+            self._llm_unavailable_until = time.monotonic() + self.cooldown_seconds
+            raise
+        response.raise_for_status()
+        result = json.loads(response.json()["response"])
+        if not isinstance(result, dict):
+            raise ValueError("LLM reply is not a JSON object")
+        return result
+
+    def _merge(self, task: str, rule: dict, llm: dict) -> dict:
+        """Combine LLM fields with the rule result, never trusting the LLM for addresses or escalation"""
+        def _address(value) -> Optional[str]:
+            # Only addresses that actually appear in the task (no invented recipients)
+            if isinstance(value, str) and EMAIL_ADDRESS_PATTERN.fullmatch(value.strip()) and value.strip() in task:
+                return value.strip()
+            return None
+
+        recipient = rule['to'] if rule['recipient_found'] else _address(llm.get('to'))
+        subject = llm.get('subject') if isinstance(llm.get('subject'), str) else ""
+        subject = ' '.join(subject.split()[:_MAX_SUBJECT_WORDS]) or rule['subject']
+        body = llm.get('body') if isinstance(llm.get('body'), str) and llm.get('body').strip() else rule['body']
+        # The LLM may downgrade send to draft, never the reverse
+        action = 'draft' if llm.get('action') == 'draft' else rule['action']
+        return {
+            'to': recipient or rule['to'],
+            'subject': subject,
+            'body': body.strip(),
+            'cc': _address(llm.get('cc')),
+            'bcc': None,
+            'action': action,
+            'recipient_found': recipient is not None,
+            'interpretation': f"{action.capitalize()} email to {recipient or 'recipient'} about '{subject}'"
+        }
+
+    def _llm_interpret(self, key: str, task: str, rule: dict) -> Optional[dict]:
+        """Worker thread: LLM interpretation merged with the rule result, cached; None on failure"""
+        try:
+            parsed = self._merge(task, rule, self._query_llm(task))
+            self._cache_put(key, parsed)
+            return parsed
+        except Exception as e:
+            # Errors are reported here: the caller may have stopped waiting
+            log.warning("email_interpreter_llm_failed", error=f"{type(e).__name__}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    # Entry point
+
+    async def interpret(self, task: str) -> dict:
+        """Interpret one task; never slower than the budget plus the rule parser"""
+        started = time.perf_counter()
+        key = normalize_task(task)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return _response(cached, "cache", None, started)
+
+        rule, confidence = self.rules(task)
+        if confidence >= self.threshold:
+            return _response(rule, "rules", confidence, started)
+        if not self.llm_available():
+            return _response(rule, "rules_fallback", confidence, started)
+
+        with self._lock:
+            # Identical tasks arriving together share one LLM call
+            future = self._inflight.get(key)
+            # When every worker is busy (likely with calls past their budget), don't queue behind them
+            if future is None and len(self._inflight) < self.max_concurrent_llm:
+                future = self._executor.submit(self._llm_interpret, key, task, rule)
+                self._inflight[key] = future
+        if future is None:
+            return _response(rule, "llm_busy", confidence, started)
+        try:
+            # shield: a timeout must not cancel the call other waiters share, nor stop it filling the cache
+            parsed = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.budget_seconds)
+        except asyncio.TimeoutError:
+            log.info("email_interpreter_llm_timeout", budget_seconds=self.budget_seconds)
+            return _response(rule, "llm_timeout", confidence, started)
+        if parsed is None:
+            return _response(rule, "llm_error", confidence, started)
+        return _response(parsed, "llm", confidence, started)
+
+    def stats(self) -> dict:
+        with self._lock:
+            cached, inflight = len(self._cache), len(self._inflight)
+        return {
+            "model": self.model,
+            "llm_enabled": self.llm_enabled,
+            "llm_available": self.llm_available(),
+            "confidence_threshold": self.threshold,
+            "budget_seconds": self.budget_seconds,
+            "cached": cached,
+            "in_flight": inflight,
+        }
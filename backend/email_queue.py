@@ -0,0 +1,258 @@
+"""
+Email Queue - Asynchronous outbound mail with retries and rate limiting
+
+Routes enqueue a message and return its tracking id immediately. Worker
+tasks on the event loop drain the queue, sending each message in the
+threadpool over the manager's pooled SMTP sessions. Sending is paced by a
+token bucket plus a rolling 24h cap (provider limits). Transient failures
+(4xx replies, dropped connections, timeouts) are retried with exponential
+backoff and jitter; permanent ones (5xx, bad credentials) fail at once.
+Delivery status of recent messages is kept in memory for lookups.
+"""
+import asyncio
+import random
+import smtplib
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    EMAIL_QUEUE_WORKERS, EMAIL_RATE_PER_MINUTE, EMAIL_RATE_BURST, EMAIL_DAILY_LIMIT,
+    EMAIL_MAX_ATTEMPTS, EMAIL_RETRY_BASE_SECONDS, EMAIL_RETRY_MAX_SECONDS, EMAIL_OUTBOX_RETENTION
+)
+from metrics import counter, gauge, histogram
+from simple_email_manager import SimpleEmailManager, EmailRequest
+from structured_logging import get_logger
+
+log = get_logger("email_queue")
+
+EMAIL_MESSAGES = counter("jarvis_email_messages_total", "Outbound email delivery outcomes", ("status",))
+EMAIL_QUEUE_DEPTH = gauge("jarvis_email_queue_depth", "Outbound emails waiting to be sent")
+EMAIL_DELIVERY_SECONDS = histogram(
+    "jarvis_email_delivery_seconds", "Time from enqueue to accepted by the SMTP server",
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+)
+
+FINAL_STATUSES = ("sent", "failed")
+# Replies that mean "slow down" rather than "this message is bad"
+_THROTTLE_CODES = (421, 450, 451, 452, 454)
+
+
+@dataclass
+class OutboundMessage:
+    id: str
+    request: EmailRequest
+    draft_id: Optional[str] = None
+    status: str = "queued"  # queued, sending, retrying, sent, failed
+    attempts: int = 0
+    error: Optional[str] = None
+    message_id: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    next_attempt_at: Optional[float] = None
+    on_complete: Optional[Callable[["OutboundMessage"], None]] = field(default=None, repr=False)
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "tracking_id": self.id,
+            "to": self.request.to,
+            "subject": self.request.subject,
+            "draft_id": self.draft_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "message_id": self.message_id,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "next_attempt_at": self.next_attempt_at,
+        }
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether retrying the same message later can succeed"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        return False  # e.g. no usable AUTH mechanism
+    return isinstance(error, (OSError, TimeoutError))
+
+
+class RateLimiter:
+    """Token bucket for the sustained rate plus a rolling 24h cap"""
+
+    def __init__(self, per_minute: float, burst: int, daily_limit: int = 0):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.daily_limit = daily_limit
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._sent = deque()  # monotonic timestamps within the last 24h
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Hold all sends, e.g. after the provider answered 421/454"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                while self._sent and now - self._sent[0] > 86400:
+                    self._sent.popleft()
+                if self.daily_limit and len(self._sent) >= self.daily_limit:
+                    await asyncio.sleep(86400 - (now - self._sent[0]))
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self._sent.append(now)
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "per_minute": round(self.rate * 60, 2),
+            "burst": self.burst,
+            "daily_limit": self.daily_limit,
+            "sent_last_24h": sum(1 for t in self._sent if now - t <= 86400),
+            "paused_for_seconds": round(max(0.0, self._paused_until - now), 1),
+        }
+
+
+class OutboundQueue:
+    """In-process outbound mail queue drained by worker tasks"""
+
+    def __init__(self, manager: SimpleEmailManager, workers: int = EMAIL_QUEUE_WORKERS,
+                 limiter: Optional[RateLimiter] = None, max_attempts: int = EMAIL_MAX_ATTEMPTS,
+                 retry_base: float = EMAIL_RETRY_BASE_SECONDS, retry_max: float = EMAIL_RETRY_MAX_SECONDS,
+                 retention: int = EMAIL_OUTBOX_RETENTION):
+        self.manager = manager
+        self.workers = workers
+        self.limiter = limiter or RateLimiter(EMAIL_RATE_PER_MINUTE, EMAIL_RATE_BURST, EMAIL_DAILY_LIMIT)
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.retention = retention
+        self.messages: "OrderedDict[str, OutboundMessage]" = OrderedDict()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, request: EmailRequest, draft_id: Optional[str] = None,
+                on_complete: Optional[Callable[[OutboundMessage], None]] = None) -> OutboundMessage:
+        """Queue a message for delivery (call from the event loop)"""
+        message = OutboundMessage(id=uuid.uuid4().hex, request=request, draft_id=draft_id, on_complete=on_complete)
+        self.messages[message.id] = message
+        self._queue.put_nowait(message.id)
+        EMAIL_QUEUE_DEPTH.set(self._queue.qsize())
+        self._trim()
+        return message
+
+    def get(self, tracking_id: str) -> Optional[OutboundMessage]:
+        return self.messages.get(tracking_id)
+
+    async def wait(self, tracking_ids: List[str], timeout: float):
+        """Wait until the given messages reach a final status or the timeout passes"""
+        events = [self.messages[i].done.wait() for i in tracking_ids if i in self.messages]
+        if events:
+            try:
+                await asyncio.wait_for(asyncio.gather(*events), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _trim(self):
+        """Forget the oldest finished messages beyond the retention limit"""
+        excess = len(self.messages) - self.retention
+        if excess <= 0:
+            return
+        for tracking_id in [i for i, m in self.messages.items() if m.status in FINAL_STATUSES][:excess]:
+            del self.messages[tracking_id]
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_max, self.retry_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _finish(self, message: OutboundMessage, status: str):
+        message.status = status
+        message.updated_at = time.time()
+        message.next_attempt_at = None
+        EMAIL_MESSAGES.inc(status=status)
+        if status == "sent":
+            EMAIL_DELIVERY_SECONDS.observe(message.updated_at - message.created_at)
+        message.done.set()
+        if message.on_complete is not None:
+            try:
+                message.on_complete(message)
+            except Exception as e:
+                log.error("email_callback_failed", message_id=message.id, error=str(e), exc_info=True)
+
+    async def _worker(self, index: int):
+        while True:
+            tracking_id = await self._queue.get()
+            EMAIL_QUEUE_DEPTH.set(self._queue.qsize())
+            message = self.messages.get(tracking_id)
+            if message is None or message.status in FINAL_STATUSES:
+                continue
+
+            await self.limiter.acquire()
+            message.status = "sending"
+            message.attempts += 1
+            message.updated_at = time.time()
+            try:
+                message.message_id = await run_in_threadpool(self.manager.deliver, message.request)
+            except Exception as e:
+                message.error = f"{type(e).__name__}: {e}"
+                if is_transient(e) and message.attempts < self.max_attempts:
+                    delay = self._retry_delay(message.attempts)
+                    if getattr(e, "smtp_code", None) in _THROTTLE_CODES:
+                        self.limiter.pause(delay)
+                    message.status = "retrying"
+                    message.updated_at = time.time()
+                    message.next_attempt_at = message.updated_at + delay
+                    EMAIL_MESSAGES.inc(status="retried")
+                    asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, message.id)
+                    log.warning("email_retry", message_id=message.id, attempt=message.attempts,
+                                delay_seconds=round(delay, 1), error=message.error)
+                else:
+                    self._finish(message, "failed")
+                    log.error("email_failed", message_id=message.id, attempts=message.attempts, error=message.error)
+                continue
+
+            message.error = None
+            self._finish(message, "sent")
+
+    def stats(self) -> dict:
+        counts: Dict[str, int] = {}
+        for message in self.messages.values():
+            counts[message.status] = counts.get(message.status, 0) + 1
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize(),
+            "statuses": counts,
+            "rate_limit": self.limiter.stats(),
+        }
@@ -0,0 +1,141 @@
+"""
+Embeddings - Pluggable sentence embedding backends
+
+Backends (selected with EMBEDDING_BACKEND in config.py):
+- torch:      reference SentenceTransformer model (PyTorch, fp32)
+- torch_int8: same model with Linear layers dynamically quantized to int8
+- onnx:       ONNX Runtime export of the model (requires optimum[onnxruntime])
+
+Every backend returns L2-normalised float32 numpy arrays, so vectors from
+different backends of the same model are directly comparable.
+"""
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+from config import EMBEDDING_BATCH_SIZE, EMBEDDING_THREADS
+
+EMBEDDING_BACKENDS = ("torch", "torch_int8", "onnx")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingBackend(ABC):
+    """Interface shared by all embedding backends"""
+
+    name = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        """Length of the vectors encode() returns"""
+
+    @abstractmethod
+    def encode(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+        """Encode texts into an (n, dimension) float32 array of unit vectors"""
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "model": self.model_name, "dimension": self.dimension}
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Reference PyTorch implementation"""
+
+    name = "torch"
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        from sentence_transformers import SentenceTransformer
+        if EMBEDDING_THREADS > 0:
+            import torch
+            torch.set_num_threads(EMBEDDING_THREADS)
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+        vectors = self.model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+        return _normalize(vectors)
+
+
+class QuantizedTorchBackend(SentenceTransformerBackend):
+    """PyTorch model with int8 dynamic quantization of Linear layers (CPU only)"""
+
+    name = "torch_int8"
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        import torch
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """ONNX Runtime export with mean pooling, matching the sentence-transformers pipeline"""
+
+    name = "onnx"
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        try:
+            import onnxruntime
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "The onnx embedding backend requires optimum[onnxruntime]: "
+                "pip install 'optimum[onnxruntime]'"
+            ) from e
+
+        repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        session_options = onnxruntime.SessionOptions()
+        if EMBEDDING_THREADS > 0:
+            session_options.intra_op_num_threads = EMBEDDING_THREADS
+        self.tokenizer = AutoTokenizer.from_pretrained(repo_id)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            repo_id, export=True, provider="CPUExecutionProvider", session_options=session_options
+        )
+        self._dimension = self.model.config.hidden_size
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    def encode(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            inputs = self.tokenizer(batch, padding=True, truncation=True, max_length=256, return_tensors="np")
+            outputs = self.model(**inputs)
+            token_embeddings = np.asarray(outputs.last_hidden_state, dtype=np.float32)
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled)
+        return _normalize(np.concatenate(batches, axis=0))
+
+
+_BACKEND_CLASSES = {
+    "torch": SentenceTransformerBackend,
+    "torch_int8": QuantizedTorchBackend,
+    "onnx": OnnxBackend,
+}
+
+
+def create_backend(backend: str, model_name: str) -> EmbeddingBackend:
+    """Instantiate an embedding backend by name"""
+    if backend not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Choose from: {list(EMBEDDING_BACKENDS)}")
+    return _BACKEND_CLASSES[backend](model_name)
@@ -0,0 +1,255 @@
+"""
+KB Stats - Knowledge base statistics maintained incrementally in memory
+
+Writes to the active collection update per-document counters here, so
+totals per document, filename and session, the chunk size distribution
+and token counts are served without touching Chroma. Memory grows with
+the number of documents, not chunks: ingestion records a document's full
+chunk set and deletes drop whole documents.
+
+At startup and after a version cutover the counters are seeded from
+collection.count() and rebuilt in one metadata-only pass (chunk lengths
+are stored in the chunk metadata as "chars"; only chunks written before
+that are read in full). Until the pass finishes the chunk total is the
+seeded count, or unknown (None) before even that is available.
+"""
+import threading
+from typing import Dict, List, Optional
+
+from config import EXPORT_BATCH_SIZE
+from metrics import gauge
+from structured_logging import get_logger
+
+log = get_logger("kb_stats")
+
+# Rough token estimate used for context budgeting (~4 characters per token for English)
+CHARS_PER_TOKEN = 4
+# Upper bounds (in characters) of the chunk size distribution buckets
+CHUNK_SIZE_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192)
+
+KB_CHUNKS = gauge("jarvis_kb_chunks", "Chunks in the active knowledge base collection")
+KB_DOCUMENTS = gauge("jarvis_kb_documents", "Documents in the active knowledge base collection")
+KB_TOKENS = gauge("jarvis_kb_tokens", "Estimated tokens stored in the active knowledge base collection")
+
+
+def estimate_tokens(text: str) -> int:
+    return _tokens_for(len(text))
+
+
+def _tokens_for(chars: int) -> int:
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _bucket_index(chars: int) -> int:
+    for i, bound in enumerate(CHUNK_SIZE_BUCKETS):
+        if chars <= bound:
+            return i
+    return len(CHUNK_SIZE_BUCKETS)
+
+
+def _new_document(filename: str, conversation_id: Optional[str]) -> dict:
+    return {"filename": filename, "conversation_id": conversation_id, "chunks": 0, "chars": 0, "tokens": 0,
+            "buckets": [0] * (len(CHUNK_SIZE_BUCKETS) + 1)}
+
+
+def _add_chunk(document: dict, chars: int):
+    document["chunks"] += 1
+    document["chars"] += chars
+    document["tokens"] += _tokens_for(chars)
+    document["buckets"][_bucket_index(chars)] += 1
+
+
+def document_entry(documents: List[str], metadatas: List[dict]) -> dict:
+    """Counters for a document's complete chunk set"""
+    first = metadatas[0] if metadatas else {}
+    document = _new_document(first.get("filename", "unknown"), first.get("conversation_id"))
+    for text in documents:
+        _add_chunk(document, len(text or ""))
+    return document
+
+
+class _StatsState:
+    """Counters for one collection; not thread-safe on its own"""
+
+    def __init__(self):
+        self.documents: Dict[str, dict] = {}
+        self.by_filename: Dict[str, dict] = {}
+        self.by_session: Dict[str, dict] = {}
+        self.size_buckets = [0] * (len(CHUNK_SIZE_BUCKETS) + 1)
+        self.total_chunks = 0
+        self.total_chars = 0
+        self.total_tokens = 0
+
+    @staticmethod
+    def _adjust(groups: Dict[str, dict], key: Optional[str], document: dict, sign: int):
+        if key is None:
+            return
+        group = groups.setdefault(key, {"documents": 0, "chunks": 0, "tokens": 0})
+        group["documents"] += sign
+        group["chunks"] += sign * document["chunks"]
+        group["tokens"] += sign * document["tokens"]
+        if group["documents"] <= 0:
+            del groups[key]
+
+    def _apply(self, document: dict, sign: int):
+        self._adjust(self.by_filename, document["filename"], document, sign)
+        self._adjust(self.by_session, document["conversation_id"], document, sign)
+        for i, count in enumerate(document["buckets"]):
+            self.size_buckets[i] += sign * count
+        self.total_chunks += sign * document["chunks"]
+        self.total_chars += sign * document["chars"]
+        self.total_tokens += sign * document["tokens"]
+
+    def set_document(self, doc_id: str, document: dict):
+        self.remove_document(doc_id)
+        if document["chunks"]:
+            self.documents[doc_id] = document
+            self._apply(document, +1)
+
+    def remove_document(self, doc_id: str):
+        previous = self.documents.pop(doc_id, None)
+        if previous is not None:
+            self._apply(previous, -1)
+
+    def scan(self, ids: List[str], metadatas: List[dict], chars: Dict[str, int]):
+        """Add chunks read by a rebuild; each chunk id must be seen once"""
+        for chunk_id, metadata in zip(ids, metadatas):
+            metadata = metadata or {}
+            document = self.documents.setdefault(
+                metadata.get("doc_id", chunk_id),
+                _new_document(metadata.get("filename", "unknown"), metadata.get("conversation_id")),
+            )
+            _add_chunk(document, metadata["chars"] if "chars" in metadata else chars.get(chunk_id, 0))
+
+    def finish_scan(self):
+        """Derive the totals from the scanned documents"""
+        for document in self.documents.values():
+            self._apply(document, +1)
+
+
+class KnowledgeBaseStats:
+    """Thread-safe incremental statistics for the active collection"""
+
+    def __init__(self):
+        self._state = _StatsState()
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        # Writes seen while a rebuild scans the collection, replayed onto the rebuilt state
+        self._pending: Optional[list] = None
+        self._ready = False
+        self._seed_chunks: Optional[int] = None  # collection.count() taken when the rebuild started
+
+    def _record(self, op: str, *args):
+        with self._lock:
+            getattr(self._state, op)(*args)
+            if self._pending is not None:
+                self._pending.append((op, args))
+            self._update_gauges()
+
+    def record_document(self, doc_id: str, documents: List[str], metadatas: List[dict]):
+        """A document was written; documents/metadatas are its complete chunk set"""
+        self._record("set_document", doc_id, document_entry(documents, metadatas))
+
+    def record_delete(self, doc_id: str):
+        """Every chunk of a document was removed"""
+        self._record("remove_document", doc_id)
+
+    def _update_gauges(self):
+        if self._ready:
+            KB_CHUNKS.set(self._state.total_chunks)
+            KB_DOCUMENTS.set(len(self._state.documents))
+            KB_TOKENS.set(self._state.total_tokens)
+
+    def rebuild(self, batch_size: int = EXPORT_BATCH_SIZE):
+        """Recount from the active collection (startup, version cutover, snapshot restore)"""
+        from knowledge_base import get_collection, iter_batches
+
+        with self._rebuild_lock:
+            collection = get_collection()
+            with self._lock:
+                self._pending = []
+                self._ready = False
+                self._seed_chunks = collection.count()
+            try:
+                fresh = _StatsState()
+                for batch in iter_batches(batch_size, include=["metadatas"]):
+                    # Chunks stored before "chars" was recorded in their metadata are read in full
+                    legacy = [chunk_id for chunk_id, metadata in zip(batch["ids"], batch["metadatas"])
+                              if "chars" not in (metadata or {})]
+                    chars = {}
+                    if legacy:
+                        rows = collection.get(ids=legacy, include=["documents"])
+                        chars = {chunk_id: len(text or "") for chunk_id, text in zip(rows["ids"], rows["documents"])}
+                    fresh.scan(batch["ids"], batch["metadatas"], chars)
+                fresh.finish_scan()
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                # Document writes and deletes are idempotent, so replaying is safe either way
+                for op, args in self._pending:
+                    getattr(fresh, op)(*args)
+                self._pending = None
+                self._state = fresh
+                self._ready = True
+                self._update_gauges()
+                counted = fresh.total_chunks
+            stored = collection.count()
+            if stored != counted:
+                # Offset paging skips rows deleted mid-scan; the next rebuild corrects it
+                log.warning("kb_stats_count_mismatch", counted=counted, stored=stored)
+            else:
+                log.info("kb_stats_loaded", chunks=counted)
+
+    def rebuild_in_background(self):
+        def run():
+            try:
+                self.rebuild()
+            except Exception as e:
+                log.error("kb_stats_rebuild_failed", error=str(e), exc_info=True)
+        threading.Thread(target=run, name="knowledge-base-stats", daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def total_chunks(self) -> Optional[int]:
+        """Chunks in the active collection; None while unknown (stats still loading)"""
+        return self._state.total_chunks if self._ready else self._seed_chunks
+
+    def session_summary(self, conversation_id: str) -> dict:
+        with self._lock:
+            group = self._state.by_session.get(conversation_id)
+            if group is None:
+                return {"documents": 0, "chunks": 0, "tokens": 0}
+            return dict(group)
+
+    def summary(self, include_documents: bool = False) -> dict:
+        with self._lock:
+            state = self._state
+            chunks = state.total_chunks
+            buckets = {f"<={bound}": count for bound, count in zip(CHUNK_SIZE_BUCKETS, state.size_buckets)}
+            buckets[f">{CHUNK_SIZE_BUCKETS[-1]}"] = state.size_buckets[-1]
+            result = {
+                "ready": self._ready,
+                "chunks": chunks if self._ready else self._seed_chunks,
+                "documents": len(state.documents),
+                "total_chars": state.total_chars,
+                "total_tokens": state.total_tokens,
+                "chunk_size": {
+                    "mean_chars": round(state.total_chars / chunks, 1) if chunks else 0,
+                    "buckets": buckets,
+                },
+                "by_filename": {name: dict(group) for name, group in state.by_filename.items()},
+                "by_session": {conv_id: dict(group) for conv_id, group in state.by_session.items()},
+            }
+            if include_documents:
+                result["by_document"] = {
+                    doc_id: {key: d[key] for key in ("filename", "chunks", "chars", "tokens")}
+                    for doc_id, d in state.documents.items()
+                }
+            return result
+
+
+knowledge_stats = KnowledgeBaseStats()
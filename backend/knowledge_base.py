@@ -0,0 +1,516 @@
+"""
+Knowledge Base - Lazily initialised vector store and embedding model
+
+Nothing heavy happens at import time. The Chroma client and the embedding
+model are created on first use, or ahead of time by the background warm-up
+started when the API boots, so workers start fast and can serve requests
+that don't need retrieval while the model is still loading.
+
+Collections are versioned by embedding model. kb_versions.json in the
+Chroma directory records which collection is active and which model
+produced its vectors; the active version's model is always the one used
+to embed queries, so vectors from different models are never mixed.
+
+A version can also be sharded (see shards.py). Its sharding is fixed when
+the version is created, from KB_SHARD_KEY at the time, and its shards and
+their directories are recorded in the registry; re-indexing is how an
+existing store moves to another layout.
+
+Writes embed their chunks before taking _client_lock and store them under
+it (write_token / write_lock), so a cutover either happens before a write
+lands or after it, never in between with vectors from the old model.
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from config import (
+    CHROMA_PATH, COLLECTION_NAME, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND,
+    KB_SHARD_KEY, KB_SHARD_COUNT, KB_SHARD_PERIOD_DAYS, KB_SHARD_PATHS
+)
+from embeddings import EmbeddingBackend, create_backend
+from shards import SHARD_KEYS, ShardedCollection, matching_count, shard_name
+from structured_logging import get_logger
+
+log = get_logger("knowledge_base")
+
+_client_lock = threading.RLock()
+_model_lock = threading.Lock()
+_warmup_lock = threading.Lock()
+
+_chroma_client = None
+_shard_clients: Dict[str, object] = {}  # Store directory -> Chroma client for shards outside CHROMA_PATH
+_collection = None
+_embedding_model = None
+_registry: Optional[dict] = None
+
+# Target of an in-progress re-index; writes are mirrored into it (see reindex.py)
+_shadow = None  # (collection, embedding backend)
+_write_generation = 0  # Bumped under _client_lock whenever the active version or the shadow changes
+_cutover_callbacks: List[Callable[[], None]] = []
+
+VERSIONS_FILE = os.path.join(CHROMA_PATH, "kb_versions.json")
+
+_ready = threading.Event()
+_warmup_thread: Optional[threading.Thread] = None
+_warmup_error: Optional[str] = None
+_warmup_started_at: Optional[float] = None
+_warmup_finished_at: Optional[float] = None
+
+
+# ========================
+# VERSION REGISTRY
+# ========================
+
+def _load_registry() -> dict:
+    global _registry
+    if _registry is None:
+        if os.path.exists(VERSIONS_FILE):
+            with open(VERSIONS_FILE, encoding="utf-8") as f:
+                _registry = json.load(f)
+        else:
+            # First run (or a store created before versioning): the original collection is version one
+            _registry = {
+                "active": COLLECTION_NAME,
+                "versions": {COLLECTION_NAME: _new_version_entry(EMBEDDING_MODEL_NAME)},
+            }
+        active = _registry["versions"][_registry["active"]]
+        if active["model"] != EMBEDDING_MODEL_NAME:
+            # Keeping the active version's model; a re-index switches models
+            log.warning("embedding_model_mismatch", configured=EMBEDDING_MODEL_NAME, active=active["model"])
+        active_key = active.get("sharding", {}).get("key", "none")
+        if active_key != KB_SHARD_KEY:
+            # Keeping the active version's layout; a re-index changes it
+            log.warning("shard_key_mismatch", configured=KB_SHARD_KEY, active=active_key)
+    return _registry
+
+
+def _sharding_config() -> Optional[dict]:
+    """Sharding for versions created now, from KB_SHARD_KEY and friends"""
+    if KB_SHARD_KEY == "none":
+        return None
+    if KB_SHARD_KEY not in SHARD_KEYS:
+        raise ValueError(f"KB_SHARD_KEY must be none or one of {SHARD_KEYS}, not {KB_SHARD_KEY!r}")
+    if KB_SHARD_KEY == "hash":
+        return {"key": "hash", "count": max(1, KB_SHARD_COUNT)}
+    if KB_SHARD_KEY == "time":
+        return {"key": "time", "period_days": KB_SHARD_PERIOD_DAYS}
+    return {"key": "tenant"}
+
+
+def _new_version_entry(model_name: str) -> dict:
+    entry = {"model": model_name, "created_at": int(time.time())}
+    sharding = _sharding_config()
+    if sharding:
+        entry["sharding"] = sharding
+        entry["shards"] = {}  # Shard collection name -> store directory
+    return entry
+
+
+def _save_registry():
+    os.makedirs(CHROMA_PATH, exist_ok=True)
+    tmp_path = VERSIONS_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(_registry, f, indent=2)
+    os.replace(tmp_path, VERSIONS_FILE)
+
+
+def active_version() -> dict:
+    """{'name', 'model'} of the collection currently serving queries"""
+    registry = _load_registry()
+    return {"name": registry["active"], **registry["versions"][registry["active"]]}
+
+
+def list_versions() -> dict:
+    registry = _load_registry()
+    return {"active": registry["active"], "versions": registry["versions"]}
+
+
+def version_name_for(model_name: str) -> str:
+    """Collection name for a new version (Chroma allows 3-63 chars of [A-Za-z0-9_-])"""
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", model_name).strip("-").lower()[:40] or "model"
+    return f"kb_{slug}_{int(time.time())}"
+
+
+# ========================
+# SHARD STORES
+# ========================
+
+def _client_for(path: str):
+    """Chroma client for a store directory (CHROMA_PATH shares the main client)"""
+    if os.path.abspath(path) == os.path.abspath(CHROMA_PATH):
+        return _chroma_client
+    client = _shard_clients.get(path)
+    if client is None:
+        import chromadb
+        os.makedirs(path, exist_ok=True)
+        client = chromadb.PersistentClient(path=path)
+        _shard_clients[path] = client
+    return client
+
+
+def _least_used_path() -> str:
+    """Shard directory holding the fewest shards, so shards spread evenly across disks"""
+    used = {path: 0 for path in KB_SHARD_PATHS}
+    for entry in _load_registry()["versions"].values():
+        for path in entry.get("shards", {}).values():
+            if path in used:
+                used[path] += 1
+    return min(KB_SHARD_PATHS, key=lambda path: used[path])
+
+
+def _create_shard(version_name: str, name: str):
+    """Open (or create and record) one shard of a version"""
+    with _client_lock:
+        entry = _load_registry()["versions"][version_name]
+        path = entry["shards"].get(name)
+        if path is None:
+            path = _least_used_path()
+            entry["shards"][name] = path
+            _save_registry()
+        return _client_for(path).get_or_create_collection(name=name, metadata={"embedding_model": entry["model"]})
+
+
+def _open_version(name: str):
+    """The Chroma collection of a version, or a ShardedCollection over its shards"""
+    entry = _load_registry()["versions"][name]
+    metadata = {"embedding_model": entry["model"]}
+    if "sharding" not in entry:
+        return _chroma_client.get_or_create_collection(name=name, metadata=metadata)
+    names = set(entry["shards"])
+    if entry["sharding"]["key"] == "hash":
+        # Fixed shard count: create them all up front so every query sees the full set
+        names |= {shard_name(name, f"s{i:02d}") for i in range(entry["sharding"]["count"])}
+    shards = {shard: _create_shard(name, shard) for shard in sorted(names)}
+    return ShardedCollection(name, metadata, entry["sharding"], shards,
+                             create_shard=lambda shard: _create_shard(name, shard))
+
+
+def storage_paths() -> List[str]:
+    """Every directory holding knowledge base data"""
+    paths = [CHROMA_PATH]
+    for entry in _load_registry()["versions"].values():
+        for path in entry.get("shards", {}).values():
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def shard_status() -> dict:
+    """Layout of the active version: shard key and per-shard directory and chunk count"""
+    collection = get_collection()
+    entry = _load_registry()["versions"][collection.name]
+    shards = collection.shards() if isinstance(collection, ShardedCollection) else [(collection.name, collection)]
+    return {
+        "version": collection.name,
+        "sharding": entry.get("sharding"),
+        "shards": [
+            {"name": name, "path": entry.get("shards", {}).get(name, CHROMA_PATH), "count": shard.count()}
+            for name, shard in shards
+        ],
+    }
+
+
+# ========================
+# ACTIVE COLLECTION AND MODEL
+# ========================
+
+def get_collection():
+    """Return the active knowledge base collection, creating the Chroma client on first use"""
+    global _chroma_client, _collection
+    if _collection is None:
+        with _client_lock:
+            if _collection is None:
+                import chromadb
+                registry = _load_registry()
+                _chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+                first_run = not os.path.exists(VERSIONS_FILE)
+                active = registry["versions"][registry["active"]]
+                if first_run and "sharding" in active and \
+                        registry["active"] in [c.name for c in _chroma_client.list_collections()]:
+                    # A store from before versioning: keep serving its single collection
+                    active.pop("sharding")
+                    active.pop("shards")
+                    log.warning("collection_not_sharded", collection=registry["active"], shard_key=KB_SHARD_KEY)
+                _collection = _open_version(registry["active"])
+                if first_run:
+                    _save_registry()
+    return _collection
+
+
+def get_chroma_client():
+    """Return the shared Chroma client"""
+    get_collection()
+    return _chroma_client
+
+
+def get_embedding_model() -> EmbeddingBackend:
+    """Return the embedding backend for the active version, loading the model on first use"""
+    global _embedding_model
+    if _embedding_model is None:
+        with _model_lock:
+            if _embedding_model is None:
+                _embedding_model = create_backend(EMBEDDING_BACKEND, active_version()["model"])
+    return _embedding_model
+
+
+def open_version(name: str):
+    """The collection of any registered version; raises KeyError if there is none by that name"""
+    if name not in _load_registry()["versions"]:
+        raise KeyError(name)
+    get_collection()
+    with _client_lock:
+        return _open_version(name)
+
+
+def create_version(model_name: str):
+    """Create an empty collection for a new embedding model version (not yet active), sharded per KB_SHARD_KEY"""
+    name = version_name_for(model_name)
+    get_collection()
+    with _client_lock:
+        registry = _load_registry()
+        registry["versions"][name] = {**_new_version_entry(model_name), "state": "building"}
+        _save_registry()
+        collection = _open_version(name)
+    return name, collection
+
+
+def activate_version(name: str, collection=None, backend: Optional[EmbeddingBackend] = None):
+    """
+    Atomically switch queries and writes to another version
+
+    The collection and backend are prepared before the switch, so requests
+    see either the old pair or the new pair. The version is switched to
+    as it is: one that stopped receiving writes (built without cutover, or
+    rolled back from) is brought up to date first by reindex.start_activation.
+    """
+    global _collection, _embedding_model, _shadow, _write_generation
+    registry = _load_registry()
+    if name not in registry["versions"]:
+        raise KeyError(name)
+    model_name = registry["versions"][name]["model"]
+    if collection is None:
+        get_collection()
+        collection = _open_version(name)
+    backend = backend or create_backend(EMBEDDING_BACKEND, model_name)
+
+    with _client_lock, _model_lock:
+        registry["versions"][name].pop("state", None)
+        registry["versions"][name]["activated_at"] = int(time.time())
+        registry["active"] = name
+        _save_registry()
+        _collection = collection
+        _embedding_model = backend
+        _shadow = None
+        _write_generation += 1
+
+    for callback in list(_cutover_callbacks):
+        try:
+            callback()
+        except Exception as e:
+            log.error("cutover_callback_failed", error=str(e), exc_info=True)
+    log.info("knowledge_base_switched", version=name, model=model_name)
+
+
+def drop_version(name: str):
+    """Delete an inactive version's collection"""
+    registry = _load_registry()
+    if name == registry["active"]:
+        raise ValueError("Cannot drop the active version")
+    if name not in registry["versions"]:
+        raise KeyError(name)
+    get_collection()
+    for collection_name, path in (registry["versions"][name].get("shards") or {name: CHROMA_PATH}).items():
+        try:
+            _client_for(path).delete_collection(name=collection_name)
+        except ValueError:
+            pass  # Collection already gone
+    with _client_lock:
+        del registry["versions"][name]
+        _save_registry()
+
+
+def on_cutover(callback: Callable[[], None]):
+    """Register a callback run after the active version changes (e.g. to clear embedding caches)"""
+    _cutover_callbacks.append(callback)
+
+
+# ========================
+# SHADOW WRITES DURING RE-INDEX
+# ========================
+
+def set_shadow(collection, backend: EmbeddingBackend):
+    global _shadow, _write_generation
+    with _client_lock:
+        _shadow = (collection, backend)
+        _write_generation += 1
+
+
+def clear_shadow():
+    global _shadow, _write_generation
+    with _client_lock:
+        if _shadow is not None:
+            _shadow = None
+            _write_generation += 1
+
+
+def write_token() -> int:
+    """Take before encoding a write; write_lock(token) then tells whether the vectors are still usable"""
+    return _write_generation
+
+
+@contextmanager
+def write_lock(token: Optional[int] = None) -> Iterator[bool]:
+    """
+    Hold off cutovers and re-index copies while a write lands
+
+    Yields False when the active version or the shadow changed since
+    write_token() returned token: the vectors were made for the old model
+    and have to be encoded again. Without a token it always yields True
+    (deletes need no vectors).
+    """
+    with _client_lock:
+        yield token is None or token == _write_generation
+
+
+def encode_for_shadow(documents: List[str]):
+    """Vectors for the version being built, or None when no re-index is running"""
+    shadow = _shadow
+    return None if shadow is None or not documents else shadow[1].encode(documents)
+
+
+def mirror_upsert(ids: List[str], documents: List[str], metadatas: List[dict], embeddings=None):
+    """Write new chunks into the version being built, embedded with its own model (call under write_lock)"""
+    if _shadow is None or not ids:
+        return
+    collection, backend = _shadow
+    embeddings = backend.encode(documents) if embeddings is None else embeddings
+    collection.upsert(ids=ids, embeddings=embeddings.tolist(), documents=documents, metadatas=metadatas)
+
+
+def mirror_delete(ids: List[str]):
+    """Remove chunks from the version being built (call under write_lock)"""
+    if _shadow is None or not ids:
+        return
+    _shadow[0].delete(ids=ids)
+
+
+def build_where(doc_id: Optional[str] = None, filename: Optional[str] = None) -> Optional[dict]:
+    """Chroma metadata filter for the optional doc_id / filename selectors"""
+    conditions = []
+    if doc_id:
+        conditions.append({"doc_id": doc_id})
+    if filename:
+        conditions.append({"filename": filename})
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def iter_batches(batch_size: int, where: Optional[dict] = None,
+                 include: Optional[List[str]] = None, start: int = 0, collection=None) -> Iterator[dict]:
+    """
+    Page through the collection with bounded get() calls
+
+    Memory use depends on batch_size, not on collection size. Offsets are
+    positional, so rows written or deleted while iterating may be skipped
+    or repeated. collection defaults to the active one.
+    """
+    include = ["documents", "metadatas"] if include is None else include
+    collection = collection if collection is not None else get_collection()
+    # Shards are paged one after another, so each get() reads a single shard
+    parts = [shard for _, shard in collection.shards()] if isinstance(collection, ShardedCollection) else [collection]
+    skip = start
+    for part in parts:
+        if skip:
+            size = matching_count(part, where)
+            if skip >= size:
+                skip -= size
+                continue
+        offset, skip = skip, 0
+        while True:
+            batch = part.get(where=where, limit=batch_size, offset=offset, include=include)
+            ids = batch.get("ids") or []
+            if not ids:
+                break
+            yield batch
+            if len(ids) < batch_size:
+                break
+            offset += len(ids)
+
+
+def _warmup():
+    global _warmup_error, _warmup_finished_at
+    try:
+        get_collection()
+        model = get_embedding_model()
+        # First encode pays for lazy kernel/tokenizer setup; do it here instead of on a user request
+        model.encode(["warm-up"])
+        _ready.set()
+        log.info("knowledge_base_ready", seconds=round(time.time() - _warmup_started_at, 1))
+    except Exception as e:
+        _warmup_error = str(e)
+        log.error("knowledge_base_warmup_failed", error=str(e))
+    finally:
+        _warmup_finished_at = time.time()
+
+
+def start_warmup():
+    """Load the vector store and embedding model on a background thread (idempotent)"""
+    global _warmup_thread, _warmup_started_at, _warmup_error
+    with _warmup_lock:
+        if _ready.is_set() or (_warmup_thread is not None and _warmup_thread.is_alive()):
+            return
+        _warmup_error = None
+        _warmup_started_at = time.time()
+        _warmup_thread = threading.Thread(target=_warmup, name="knowledge-base-warmup", daemon=True)
+        _warmup_thread.start()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def wait_until_ready(timeout: Optional[float] = None) -> bool:
+    """Block until warm-up finishes; starts it if nobody has yet. Returns readiness."""
+    if _ready.is_set():
+        return True
+    start_warmup()
+    thread = _warmup_thread
+    if thread is not None:
+        thread.join(timeout)
+    return _ready.is_set()
+
+
+def status() -> dict:
+    """Component-level readiness for /health"""
+    if _warmup_error:
+        state = "error"
+    elif _ready.is_set():
+        state = "ready"
+    elif _warmup_thread is not None and _warmup_thread.is_alive():
+        state = "loading"
+    else:
+        state = "not_loaded"
+
+    info = {
+        "state": state,
+        "vector_store": "loaded" if _collection is not None else "not_loaded",
+        "embedding_model": "loaded" if _embedding_model is not None else "not_loaded",
+        "embedding_backend": EMBEDDING_BACKEND,
+    }
+    if isinstance(_collection, ShardedCollection):
+        info["shards"] = {"key": _collection.key, "count": len(_collection.shards())}
+    if _registry is not None:
+        info["active_version"] = _registry["active"]
+    if _warmup_error:
+        info["error"] = _warmup_error
+    if _warmup_started_at and _warmup_finished_at:
+        info["warmup_seconds"] = round(_warmup_finished_at - _warmup_started_at, 2)
+    return info
@@ -0,0 +1,238 @@
+"""
+Mail Cache - Local SQLite store of synced mailbox messages
+
+Holds message headers (and bodies once fetched) keyed by (mailbox, uid),
+plus the per-mailbox UIDVALIDITY and highest synced UID that make IMAP
+sync incremental (see mail_sync.py). Indexed by date, sender and read flag
+so inbox pages are served locally without an IMAP round trip. embedded_at
+records which messages the semantic mail index (mail_index.py) has covered.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import MAIL_CACHE_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mailbox_state (
+    mailbox TEXT PRIMARY KEY,
+    uidvalidity INTEGER NOT NULL,
+    last_uid INTEGER NOT NULL DEFAULT 0,
+    last_sync REAL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    mailbox TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    message_id TEXT,
+    subject TEXT,
+    sender TEXT,
+    sender_address TEXT,
+    recipients TEXT,
+    date_ts REAL,
+    flags TEXT,
+    seen INTEGER NOT NULL DEFAULT 0,
+    size INTEGER,
+    body TEXT,
+    body_fetched_at REAL,
+    embedded_at REAL,
+    PRIMARY KEY (mailbox, uid)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages (mailbox, date_ts DESC, uid DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages (mailbox, sender_address, date_ts DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_seen ON messages (mailbox, seen, date_ts DESC);
+"""
+
+# Columns added after the first release, applied to existing cache files on open
+_MIGRATIONS = {
+    "embedded_at": "ALTER TABLE messages ADD COLUMN embedded_at REAL",
+}
+_INDEXES = "CREATE INDEX IF NOT EXISTS idx_messages_embedded ON messages (mailbox, embedded_at, uid DESC);"
+
+
+_SUMMARY_COLUMNS = "uid, message_id, subject, sender, sender_address, recipients, date_ts, flags, seen, size, body IS NOT NULL"
+
+
+def _summary(row: tuple) -> dict:
+    uid, message_id, subject, sender, sender_address, recipients, date_ts, flags, seen, size, has_body = row
+    return {
+        "uid": uid,
+        "message_id": message_id,
+        "subject": subject,
+        "from": sender,
+        "from_address": sender_address,
+        "to": recipients,
+        "date": date_ts,
+        "flags": json.loads(flags or "[]"),
+        "unread": not seen,
+        "size": size,
+        "body_cached": bool(has_body),
+    }
+
+
+class MailCache:
+    """Thread-safe SQLite mail cache (one connection, serialized)"""
+
+    def __init__(self, path: str = MAIL_CACHE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+
+    def _migrate(self):
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(messages)")}
+        with self._conn:
+            for column, statement in _MIGRATIONS.items():
+                if column not in columns:
+                    self._conn.execute(statement)
+        self._conn.executescript(_INDEXES)
+
+    # Sync state
+
+    def get_state(self, mailbox: str) -> Optional[Tuple[int, int]]:
+        """(uidvalidity, last_uid) for a mailbox, or None if never synced"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uidvalidity, last_uid FROM mailbox_state WHERE mailbox = ?", (mailbox,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def reset_mailbox(self, mailbox: str, uidvalidity: int):
+        """Forget every cached message (UIDVALIDITY changed, so old UIDs mean nothing)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE mailbox = ?", (mailbox,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO mailbox_state (mailbox, uidvalidity, last_uid, last_sync) VALUES (?, ?, 0, NULL)",
+                (mailbox, uidvalidity),
+            )
+
+    def set_watermark(self, mailbox: str, last_uid: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE mailbox_state SET last_uid = MAX(last_uid, ?), last_sync = ? WHERE mailbox = ?",
+                (last_uid, time.time(), mailbox),
+            )
+
+    # Messages
+
+    def upsert_headers(self, mailbox: str, messages: Iterable[dict]) -> int:
+        rows = [(
+            mailbox, m["uid"], m.get("message_id"), m.get("subject"), m.get("from"), m.get("from_address"),
+            m.get("to"), m.get("date"), json.dumps(m.get("flags", [])), int("\\Seen" in m.get("flags", [])),
+            m.get("size"),
+        ) for m in messages]
+        with self._lock, self._conn:
+            # Keep a cached body if the message was already stored
+            self._conn.executemany(
+                """INSERT INTO messages (mailbox, uid, message_id, subject, sender, sender_address, recipients,
+                                         date_ts, flags, seen, size)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (mailbox, uid) DO UPDATE SET
+                       message_id = excluded.message_id, subject = excluded.subject, sender = excluded.sender,
+                       sender_address = excluded.sender_address, recipients = excluded.recipients,
+                       date_ts = excluded.date_ts, flags = excluded.flags, seen = excluded.seen,
+                       size = excluded.size""",
+                rows,
+            )
+        return len(rows)
+
+    def update_flags(self, mailbox: str, flags_by_uid: Dict[int, List[str]]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE messages SET flags = ?, seen = ? WHERE mailbox = ? AND uid = ?",
+                [(json.dumps(flags), int("\\Seen" in flags), mailbox, uid) for uid, flags in flags_by_uid.items()],
+            )
+
+    def cached_uids(self, mailbox: str) -> List[int]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT uid FROM messages WHERE mailbox = ?", (mailbox,))]
+
+    def delete_uids(self, mailbox: str, uids: Iterable[int]) -> int:
+        uids = list(uids)
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM messages WHERE mailbox = ? AND uid = ?", [(mailbox, u) for u in uids])
+        return len(uids)
+
+    def set_body(self, mailbox: str, uid: int, body: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE messages SET body = ?, body_fetched_at = ? WHERE mailbox = ? AND uid = ?",
+                (body, time.time(), mailbox, uid),
+            )
+
+    # Semantic index bookkeeping
+
+    def mark_embedded(self, mailbox: str, uids: Iterable[int]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE messages SET embedded_at = ? WHERE mailbox = ? AND uid = ?",
+                [(now, mailbox, uid) for uid in uids],
+            )
+
+    def pending_embedding(self, mailbox: str, limit: Optional[int] = None) -> List[int]:
+        """UIDs not yet in the semantic index, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT uid FROM messages WHERE mailbox = ? AND embedded_at IS NULL ORDER BY uid DESC LIMIT ?",
+                (mailbox, -1 if limit is None else limit),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def clear_embedded(self, mailbox: str):
+        """Mark every message as not indexed (the index is being rebuilt)"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE messages SET embedded_at = NULL WHERE mailbox = ?", (mailbox,))
+
+    def get_message(self, mailbox: str, uid: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_SUMMARY_COLUMNS}, body FROM messages WHERE mailbox = ? AND uid = ?", (mailbox, uid)
+            ).fetchone()
+        if row is None:
+            return None
+        message = _summary(row[:-1])
+        message["body"] = row[-1]
+        return message
+
+    def list_messages(self, mailbox: str, limit: int, cursor: Optional[Tuple[float, int]] = None,
+                      unread_only: bool = False, sender: Optional[str] = None) -> List[dict]:
+        """Newest first, keyset-paginated on (date, uid)"""
+        clauses, params = ["mailbox = ?"], [mailbox]
+        if unread_only:
+            clauses.append("seen = 0")
+        if sender:
+            clauses.append("sender_address = ?")
+            params.append(sender.lower())
+        if cursor is not None:
+            clauses.append("(date_ts < ? OR (date_ts = ? AND uid < ?))")
+            params.extend([cursor[0], cursor[0], cursor[1]])
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_SUMMARY_COLUMNS} FROM messages WHERE {' AND '.join(clauses)} "
+                f"ORDER BY date_ts DESC, uid DESC LIMIT ?",
+                params,
+            ).fetchall()
+        return [_summary(row) for row in rows]
+
+    def counts(self, mailbox: str) -> dict:
+        with self._lock:
+            total, unread, embedded = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(seen = 0), 0), COALESCE(SUM(embedded_at IS NOT NULL), 0) "
+                "FROM messages WHERE mailbox = ?", (mailbox,)
+            ).fetchone()
+            state = self._conn.execute(
+                "SELECT uidvalidity, last_uid, last_sync FROM mailbox_state WHERE mailbox = ?", (mailbox,)
+            ).fetchone()
+        return {
+            "total": total,
+            "unread": unread,
+            "embedded": embedded,
+            "uidvalidity": state[0] if state else None,
+            "last_uid": state[1] if state else 0,
+            "last_sync": state[2] if state else None,
+        }
@@ -0,0 +1,301 @@
+"""
+Mail Index - Semantic search over synced mail
+
+Message bodies are chunked by paragraph (each chunk prefixed with the
+subject and sender), embedded with the knowledge base's active embedding
+model and stored in their own Chroma collection, so mail never mixes with
+documents. New UIDs reported by InboxSync are queued and embedded by one
+background thread in bounded batches; bodies are downloaded on demand
+through the sync's IMAP client and cached. A batch that fails (e.g. the
+IMAP server is unreachable) goes back on the queue and the thread backs
+off before trying again. The collection records which model built it and
+is rebuilt after a knowledge base model switch.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import knowledge_base
+from config import (
+    MAIL_COLLECTION_NAME, MAIL_INDEX_BATCH_SIZE, MAIL_INDEX_BATCH_DELAY_SECONDS, MAIL_MAX_CHUNKS_PER_MESSAGE,
+    MAIL_INDEX_RETRY_BASE_SECONDS, MAIL_INDEX_RETRY_MAX_SECONDS
+)
+from documents import chunk_text, DocumentError
+from mail_sync import InboxSync
+from metrics import counter, gauge, stage_timer
+from structured_logging import get_logger
+
+log = get_logger("mail_index")
+
+MAIL_INDEXED_MESSAGES = counter("jarvis_mail_indexed_messages_total", "Messages embedded into the mail index")
+MAIL_INDEXED_CHUNKS = counter("jarvis_mail_indexed_chunks_total", "Chunks embedded into the mail index")
+MAIL_INDEX_BACKLOG = gauge("jarvis_mail_index_backlog", "Synced messages waiting to be embedded")
+
+
+def message_chunks(message: dict, body: Optional[str]) -> List[str]:
+    """Paragraph chunks of a message body, each carrying the subject and sender for context"""
+    header = f"Subject: {message.get('subject') or '(no subject)'}\nFrom: {message.get('from') or ''}"
+    try:
+        paragraphs = chunk_text(body or "")[:MAIL_MAX_CHUNKS_PER_MESSAGE]
+    except DocumentError:
+        paragraphs = []
+    if not paragraphs:
+        return [header]
+    return [f"{header}\n\n{paragraph}" for paragraph in paragraphs]
+
+
+class MailIndexer:
+    """Background embedder and query interface for one synced mailbox"""
+
+    def __init__(self, sync: InboxSync, batch_size: int = MAIL_INDEX_BATCH_SIZE,
+                 delay_seconds: float = MAIL_INDEX_BATCH_DELAY_SECONDS,
+                 collection_name: str = MAIL_COLLECTION_NAME):
+        self.sync = sync
+        self.cache = sync.cache
+        self.mailbox = sync.mailbox
+        self.batch_size = batch_size
+        self.delay_seconds = delay_seconds
+        self.collection_name = collection_name
+        self._collection = None
+        self._has_chunks = False
+        self._pending: "OrderedDict[int, None]" = OrderedDict()  # Deduplicated, newest first
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # One batch or delete against the collection at a time
+        self._generation = 0  # Bumped by reset(); batches embedded before it are discarded
+        self._failures = 0  # Failed batches in a row, for the retry backoff
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.messages_indexed = 0
+        self.chunks_indexed = 0
+        self.busy_seconds = 0.0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_batch: Optional[dict] = None
+
+    # Collection
+
+    def get_collection(self):
+        """The mail collection for the active embedding model, recreated if another model built it"""
+        if self._collection is None:
+            client = knowledge_base.get_chroma_client()
+            model = knowledge_base.active_version()["model"]
+            collection = client.get_or_create_collection(
+                name=self.collection_name, metadata={"embedding_model": model}
+            )
+            if (collection.metadata or {}).get("embedding_model") != model:
+                log.info("mail_index_rebuild", model=model)
+                client.delete_collection(self.collection_name)
+                collection = client.create_collection(name=self.collection_name, metadata={"embedding_model": model})
+                self.cache.clear_embedded(self.mailbox)
+            self._collection = collection
+        return self._collection
+
+    # Queue
+
+    def enqueue(self, mailbox: str, uids: List[int]):
+        """InboxSync listener: queue newly synced messages for embedding"""
+        if mailbox != self.mailbox:
+            return
+        with self._cond:
+            for uid in sorted(uids, reverse=True):
+                self._pending[uid] = None
+            MAIL_INDEX_BACKLOG.set(len(self._pending))
+            self._cond.notify()
+
+    def remove(self, mailbox: str, uids: List[int]):
+        """InboxSync listener: drop chunks of expunged messages"""
+        if mailbox != self.mailbox or not uids:
+            return
+        with self._cond:
+            for uid in uids:
+                self._pending.pop(uid, None)
+            MAIL_INDEX_BACKLOG.set(len(self._pending))
+        if not knowledge_base.is_ready():
+            return
+        with self._write_lock:
+            self.get_collection().delete(where={"$and": [{"mailbox": mailbox}, {"uid": {"$in": list(uids)}}]})
+
+    def start(self):
+        """Start the background thread and queue every cached message not yet indexed"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="mail-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+    def reset(self):
+        """Drop the index and re-embed everything (after the knowledge base switched models)"""
+        with self._write_lock:
+            try:
+                knowledge_base.get_chroma_client().delete_collection(self.collection_name)
+            except ValueError:
+                pass  # Never created
+            self._collection = None
+            self._has_chunks = False
+            self._generation += 1
+            self.cache.clear_embedded(self.mailbox)
+        self.enqueue(self.mailbox, self.cache.pending_embedding(self.mailbox))
+
+    def _take_batch(self) -> Optional[List[int]]:
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            if self._stopping:
+                return None
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                uid, _ = self._pending.popitem(last=False)
+                batch.append(uid)
+            MAIL_INDEX_BACKLOG.set(len(self._pending))
+            return batch
+
+    def _retry_later(self, uids: List[int]) -> bool:
+        """Put a failed batch back at the front of the queue and back off. False when stopping."""
+        self._failures += 1
+        delay = min(MAIL_INDEX_RETRY_BASE_SECONDS * 2 ** (self._failures - 1), MAIL_INDEX_RETRY_MAX_SECONDS)
+        with self._cond:
+            for uid in reversed(uids):
+                self._pending[uid] = None
+                self._pending.move_to_end(uid, last=False)
+            MAIL_INDEX_BACKLOG.set(len(self._pending))
+            # New mail notifies the condition too; keep waiting out the delay
+            deadline = time.monotonic() + delay
+            while not self._stopping and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            return not self._stopping
+
+    def _run(self):
+        knowledge_base.wait_until_ready()
+        self.enqueue(self.mailbox, self.cache.pending_embedding(self.mailbox))
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                self.index_batch(batch)
+                self._failures = 0
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                log.warning("mail_index_batch_failed", messages=len(batch), error=str(e))
+                if not self._retry_later(batch):
+                    return
+                continue
+            # Yield to the API between batches
+            time.sleep(self.delay_seconds)
+
+    # Indexing
+
+    def index_batch(self, uids: List[int]) -> Optional[dict]:
+        """Embed one batch of messages (downloading bodies as needed) and mark them indexed"""
+        start = time.perf_counter()
+        generation = self._generation
+        with stage_timer("mail_index", "fetch_bodies"):
+            bodies = self.sync.fetch_bodies(uids)
+        documents, metadatas, ids, indexed = [], [], [], []
+        for uid in uids:
+            message = self.cache.get_message(self.mailbox, uid)
+            if message is None:
+                continue  # Expunged since it was queued
+            chunks = message_chunks(message, bodies.get(uid))
+            for i, chunk in enumerate(chunks):
+                documents.append(chunk)
+                ids.append(f"mail_{self.mailbox}_{uid}_chunk_{i}")
+                metadatas.append({
+                    "source": "email",
+                    "mailbox": self.mailbox,
+                    "uid": uid,
+                    "chunk_id": i,
+                    "subject": message["subject"] or "",
+                    "from": message["from"] or "",
+                    "date": message["date"] or 0.0,
+                })
+            indexed.append(uid)
+
+        if documents:
+            with stage_timer("mail_index", "embedding"):
+                embeddings = knowledge_base.get_embedding_model().encode(documents)
+            with self._write_lock:
+                if self._generation != generation:
+                    return None  # reset() ran while embedding; it re-queued these messages for the new model
+                with stage_timer("mail_index", "upsert"):
+                    self.get_collection().upsert(
+                        documents=documents, embeddings=embeddings.tolist(), metadatas=metadatas, ids=ids
+                    )
+                self.cache.mark_embedded(self.mailbox, indexed)
+                self._has_chunks = True
+
+        elapsed = time.perf_counter() - start
+        self.messages_indexed += len(indexed)
+        self.chunks_indexed += len(documents)
+        self.busy_seconds += elapsed
+        MAIL_INDEXED_MESSAGES.inc(len(indexed))
+        MAIL_INDEXED_CHUNKS.inc(len(documents))
+        self.last_batch = {
+            "messages": len(indexed),
+            "chunks": len(documents),
+            "seconds": round(elapsed, 3),
+            "finished_at": time.time(),
+        }
+        return self.last_batch
+
+    # Queries
+
+    def query(self, query_embedding: List[List[float]], top_k: int) -> Optional[dict]:
+        """Chroma query results over mail chunks, or None while the index is empty"""
+        collection = self.get_collection()
+        if not self._has_chunks:
+            # Chroma rejects queries against an empty collection; count once per process
+            if collection.count() == 0:
+                return None
+            self._has_chunks = True
+        return collection.query(query_embeddings=query_embedding, n_results=top_k)
+
+    def search(self, query: str, top_k: int) -> List[dict]:
+        """Best-matching messages for a natural language query, one entry per message"""
+        query_embedding = knowledge_base.get_embedding_model().encode([query]).tolist()
+        # Over-fetch chunks so several hits in one message still leave top_k messages
+        results = self.query(query_embedding, top_k * 3)
+        if not results or not results["ids"][0]:
+            return []
+        hits: "OrderedDict[int, dict]" = OrderedDict()
+        for document, metadata, distance in zip(results["documents"][0], results["metadatas"][0],
+                                                results["distances"][0]):
+            uid = metadata["uid"]
+            if uid in hits:
+                continue
+            hits[uid] = {
+                "uid": uid,
+                "subject": metadata.get("subject"),
+                "from": metadata.get("from"),
+                "date": metadata.get("date"),
+                "snippet": document.split("\n\n", 1)[-1][:300],
+                "distance": round(distance, 4),
+            }
+            if len(hits) == top_k:
+                break
+        return list(hits.values())
+
+    def status(self) -> dict:
+        with self._cond:
+            backlog = len(self._pending)
+        busy = self.busy_seconds
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "mailbox": self.mailbox,
+            "backlog": backlog,
+            "messages_indexed": self.messages_indexed,
+            "chunks_indexed": self.chunks_indexed,
+            "messages_per_second": round(self.messages_indexed / busy, 2) if busy else None,
+            "chunks_per_second": round(self.chunks_indexed / busy, 2) if busy else None,
+            "batch_size": self.batch_size,
+            "last_batch": self.last_batch,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
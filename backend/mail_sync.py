@@ -0,0 +1,289 @@
+"""
+Mail Sync - Incremental IMAP sync into the local mail cache
+
+Each sync selects the mailbox read-only and compares UIDVALIDITY with the
+cached value (a change means UIDs were reassigned, so the cache is reset).
+Only UIDs above the stored watermark are fetched, and only their headers,
+flags and size; bodies are downloaded on first read. Flags of cached
+messages are refreshed in one FLAGS-only fetch, which also reveals
+messages expunged on the server.
+"""
+import email
+import email.policy
+import imaplib
+import os
+import re
+import threading
+import time
+from email.header import decode_header, make_header
+from email.utils import parseaddr, parsedate_to_datetime
+from typing import Callable, Dict, List, Optional
+
+from config import IMAP_FETCH_BATCH_SIZE, MAIL_INITIAL_SYNC_LIMIT, IMAP_TIMEOUT_SECONDS
+from mail_cache import MailCache
+from metrics import counter, stage_timer
+from structured_logging import get_logger
+
+log = get_logger("mail_sync")
+
+MAIL_SYNCED_MESSAGES = counter("jarvis_mail_synced_messages_total", "Message headers fetched by IMAP sync")
+
+HEADER_FIELDS = "FROM TO CC SUBJECT DATE MESSAGE-ID"
+_UID_RE = re.compile(rb"UID (\d+)")
+_FLAGS_RE = re.compile(rb"FLAGS \(([^)]*)\)")
+_SIZE_RE = re.compile(rb"RFC822\.SIZE (\d+)")
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def _decode(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return value
+
+
+def _parse_headers(uid: int, meta: bytes, header_bytes: bytes) -> dict:
+    headers = email.message_from_bytes(header_bytes)
+    flags_match = _FLAGS_RE.search(meta)
+    size_match = _SIZE_RE.search(meta)
+    internal = imaplib.Internaldate2tuple(meta)
+    date_ts = time.mktime(internal) if internal else None
+    if date_ts is None and headers.get("Date"):
+        try:
+            date_ts = parsedate_to_datetime(headers["Date"]).timestamp()
+        except (TypeError, ValueError):
+            date_ts = None
+    sender = _decode(headers.get("From"))
+    return {
+        "uid": uid,
+        "message_id": headers.get("Message-ID"),
+        "subject": _decode(headers.get("Subject")),
+        "from": sender,
+        "from_address": parseaddr(sender)[1].lower() or None,
+        "to": _decode(headers.get("To")),
+        "date": date_ts or 0.0,
+        "flags": flags_match.group(1).decode().split() if flags_match else [],
+        "size": int(size_match.group(1)) if size_match else None,
+    }
+
+
+def extract_text_body(raw: bytes) -> str:
+    """Plain-text body of a message (HTML-only mail is reduced to text)"""
+    message = email.message_from_bytes(raw, policy=email.policy.default)
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    try:
+        content = part.get_content()
+    except (LookupError, UnicodeDecodeError):
+        content = part.get_payload(decode=True).decode("latin-1", errors="replace")
+    if part.get_content_type() == "text/html":
+        content = re.sub(r"\s+\n", "\n", _TAG_RE.sub(" ", content))
+    return content.strip()
+
+
+def _uid_set(uids: List[int]) -> str:
+    return ",".join(str(u) for u in uids)
+
+
+class InboxSync:
+    """Incremental sync of one IMAP mailbox into a MailCache"""
+
+    def __init__(self, username: Optional[str], password: Optional[str], cache: MailCache,
+                 mailbox: str = "INBOX", host: Optional[str] = None, port: Optional[int] = None,
+                 security: Optional[str] = None, batch_size: int = IMAP_FETCH_BATCH_SIZE,
+                 initial_limit: int = MAIL_INITIAL_SYNC_LIMIT):
+        self.username = username
+        self.password = password
+        self.cache = cache
+        self.mailbox = mailbox
+        self.host = host or os.getenv("IMAP_HOST", "imap.gmail.com")
+        self.port = int(port or os.getenv("IMAP_PORT", "993"))
+        self.security = security or os.getenv("IMAP_SECURITY", "ssl")  # ssl, starttls or none
+        self.batch_size = batch_size
+        self.initial_limit = initial_limit
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str, List[int]], None]] = []
+        self._expunge_listeners: List[Callable[[str, List[int]], None]] = []
+        self.last_result: Optional[dict] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.username and self.password)
+
+    def on_new_messages(self, callback: Callable[[str, List[int]], None]):
+        """Register callback(mailbox, uids) run after new messages are cached"""
+        self._listeners.append(callback)
+
+    def on_expunged(self, callback: Callable[[str, List[int]], None]):
+        """Register callback(mailbox, uids) run after messages are dropped from the cache"""
+        self._expunge_listeners.append(callback)
+
+    def _notify(self, listeners: List[Callable[[str, List[int]], None]], uids: List[int]):
+        for callback in list(listeners):
+            try:
+                callback(self.mailbox, uids)
+            except Exception as e:
+                log.error("mail_sync_listener_failed", error=str(e), exc_info=True)
+
+    def _connect(self) -> imaplib.IMAP4:
+        if self.security == "ssl":
+            imap = imaplib.IMAP4_SSL(self.host, self.port, timeout=IMAP_TIMEOUT_SECONDS)
+        else:
+            imap = imaplib.IMAP4(self.host, self.port, timeout=IMAP_TIMEOUT_SECONDS)
+            if self.security == "starttls":
+                imap.starttls()
+        imap.login(self.username, self.password)
+        return imap
+
+    def _select(self, imap: imaplib.IMAP4) -> int:
+        status, _ = imap.select(self.mailbox, readonly=True)
+        if status != "OK":
+            raise RuntimeError(f"Cannot open mailbox {self.mailbox}")
+        _, values = imap.response("UIDVALIDITY")
+        return int(values[0])
+
+    def sync(self) -> dict:
+        """Fetch new message headers and refresh flags; skipped if a sync is already running"""
+        if not self._lock.acquire(blocking=False):
+            return {"skipped": True, "reason": "sync already running"}
+        start = time.perf_counter()
+        try:
+            with stage_timer("mail_sync", "total"):
+                result = self._sync()
+            result["seconds"] = round(time.perf_counter() - start, 3)
+            self.last_result = {**result, "finished_at": time.time()}
+            return result
+        finally:
+            self._lock.release()
+
+    def _sync(self) -> dict:
+        imap = self._connect()
+        try:
+            uidvalidity = self._select(imap)
+            state = self.cache.get_state(self.mailbox)
+            reset = state is None or state[0] != uidvalidity
+            dropped: List[int] = []
+            if reset:
+                dropped = self.cache.cached_uids(self.mailbox)
+                self.cache.reset_mailbox(self.mailbox, uidvalidity)
+                last_uid = 0
+            else:
+                last_uid = state[1]
+
+            # Flags first, over what's cached (cheap: no headers); UIDs gone from the server were expunged
+            updated_flags, expunged = 0, 0
+            cached = self.cache.cached_uids(self.mailbox)
+            if cached:
+                with stage_timer("mail_sync", "flags"):
+                    flags = self._fetch_flags(imap, f"{min(cached)}:{max(cached)}")
+                self.cache.update_flags(self.mailbox, flags)
+                updated_flags = len(flags)
+                dropped = sorted(set(cached) - set(flags))
+                expunged = self.cache.delete_uids(self.mailbox, dropped)
+
+            # "n:*" always matches the highest UID, even when it is below n
+            _, data = imap.uid("SEARCH", None, f"UID {last_uid + 1}:*")
+            new_uids = sorted(int(u) for u in (data[0] or b"").split() if int(u) > last_uid)
+            if last_uid == 0 and self.initial_limit and len(new_uids) > self.initial_limit:
+                new_uids = new_uids[-self.initial_limit:]
+
+            fetched = 0
+            with stage_timer("mail_sync", "headers"):
+                for i in range(0, len(new_uids), self.batch_size):
+                    batch = new_uids[i:i + self.batch_size]
+                    headers = self._fetch_headers(imap, batch)
+                    fetched += self.cache.upsert_headers(self.mailbox, headers)
+                    # Advance the watermark per batch so an interrupted sync resumes where it stopped
+                    self.cache.set_watermark(self.mailbox, batch[-1])
+            if not new_uids:
+                self.cache.set_watermark(self.mailbox, last_uid)
+            MAIL_SYNCED_MESSAGES.inc(fetched)
+        finally:
+            try:
+                imap.logout()
+            except Exception:
+                pass
+
+        if dropped:
+            self._notify(self._expunge_listeners, dropped)
+        if new_uids:
+            self._notify(self._listeners, new_uids)
+        return {
+            "mailbox": self.mailbox,
+            "uidvalidity": uidvalidity,
+            "reset": reset,
+            "new": fetched,
+            "updated_flags": updated_flags,
+            "expunged": expunged,
+        }
+
+    def _fetch_flags(self, imap: imaplib.IMAP4, uid_range: str) -> Dict[int, List[str]]:
+        _, data = imap.uid("FETCH", uid_range, "(UID FLAGS)")
+        flags: Dict[int, List[str]] = {}
+        for item in data:
+            line = item[0] if isinstance(item, tuple) else item
+            if not line:
+                continue
+            uid_match, flags_match = _UID_RE.search(line), _FLAGS_RE.search(line)
+            if uid_match:
+                flags[int(uid_match.group(1))] = flags_match.group(1).decode().split() if flags_match else []
+        return flags
+
+    def _fetch_headers(self, imap: imaplib.IMAP4, uids: List[int]) -> List[dict]:
+        _, data = imap.uid(
+            "FETCH", _uid_set(uids),
+            f"(UID FLAGS RFC822.SIZE INTERNALDATE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])"
+        )
+        messages = []
+        for item in data:
+            if not isinstance(item, tuple):
+                continue
+            meta, header_bytes = item
+            uid_match = _UID_RE.search(meta)
+            if uid_match:
+                messages.append(_parse_headers(int(uid_match.group(1)), meta, header_bytes))
+        return messages
+
+    def fetch_bodies(self, uids: List[int]) -> Dict[int, str]:
+        """Download and cache the text bodies of messages that don't have one cached yet"""
+        bodies: Dict[int, str] = {}
+        missing = []
+        for uid in uids:
+            cached = self.cache.get_message(self.mailbox, uid)
+            if cached is not None and cached["body"] is not None:
+                bodies[uid] = cached["body"]
+            elif cached is not None:
+                missing.append(uid)
+        if not missing:
+            return bodies
+
+        imap = self._connect()
+        try:
+            self._select(imap)
+            for i in range(0, len(missing), self.batch_size):
+                _, data = imap.uid("FETCH", _uid_set(missing[i:i + self.batch_size]), "(UID BODY.PEEK[])")
+                for item in data:
+                    if not isinstance(item, tuple):
+                        continue
+                    uid_match = _UID_RE.search(item[0])
+                    if uid_match:
+                        uid = int(uid_match.group(1))
+                        bodies[uid] = extract_text_body(item[1])
+                        self.cache.set_body(self.mailbox, uid, bodies[uid])
+        finally:
+            try:
+                imap.logout()
+            except Exception:
+                pass
+        return bodies
+
+    def get_message(self, uid: int) -> Optional[dict]:
+        """Cached message with its body, downloading the body on first access"""
+        message = self.cache.get_message(self.mailbox, uid)
+        if message is not None and message["body"] is None:
+            message["body"] = self.fetch_bodies([uid]).get(uid)
+            message["body_cached"] = message["body"] is not None
+        return message
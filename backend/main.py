@@ -1,9 +1,8 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import chromadb
-from sentence_transformers import SentenceTransformer
 import requests
 import json
 from typing import List, Optional, Dict
@@ -12,17 +11,47 @@ import os
 from pathlib import Path
 from functools import lru_cache
 import hashlib
-from config import MODELS, CURRENT_MODEL, MAX_CONTEXT_LENGTH, TOP_K_RESULTS
-import PyPDF2
-from io import BytesIO
-from personal_assistant_routes import router as personal_assistant_router
+import time
+import asyncio
+from config import (
+    MODELS, CURRENT_MODEL, MAX_CONTEXT_LENGTH, TOP_K_RESULTS, OLLAMA_URL, OLLAMA_BASE_URL,
+    KNOWLEDGE_BASE_READY_TIMEOUT, INSPECT_MAX_LIMIT, EXPORT_BATCH_SIZE,
+    SESSION_DOCUMENT_TTL_SECONDS, DOCUMENT_EXPIRY_INTERVAL_SECONDS, SNAPSHOT_DIR,
+    REINDEX_BATCH_SIZE, REINDEX_BATCH_DELAY_SECONDS, MAIL_CONTEXT_RESULTS
+)
+from structured_logging import setup_logging, shutdown_logging, get_logger, bind_conversation, RequestContextMiddleware
+
+# Before the imports below: some of them log while they initialise (e.g. the email service)
+setup_logging()
+
+import knowledge_base
+from knowledge_base import get_collection, get_embedding_model, build_where, iter_batches
+from session_index import session_indexes
+from kb_stats import knowledge_stats
+from summaries import summary_index, is_summary_query
+from documents import (
+    DocumentError, extract_text, chunk_text, new_doc_id, store_chunks,
+    delete_document, replace_document, expire_documents, compact_store, delete_conversation_documents
+)
+import snapshot
+import reindex
+from metrics import (
+    stage_timer, record_cache, format_duration, render_metrics, PROMETHEUS_CONTENT_TYPE,
+    STAGE_DURATION, REQUESTS_TOTAL, LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS_PER_SECOND, LLM_TOKENS
+)
+from personal_assistant_routes import router as personal_assistant_router, mail_indexer
 from email_agent_routes import router as email_agent_router
+from admin_routes import router as admin_router
+from diagnostics import SlowRequestMiddleware, slow_requests
+
+log = get_logger("api")
 
 app = FastAPI(title="Jarvis Assistant API")
 
 # Register routers
 app.include_router(personal_assistant_router)
 app.include_router(email_agent_router)
+app.include_router(admin_router)
 
 # CORS middleware for frontend
 app.add_middleware(
@@ -33,10 +62,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize components
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
-collection = chroma_client.get_or_create_collection(name="knowledge_base")
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Keep requests over SLOW_REQUEST_THRESHOLD_MS with their stage timings (see /admin/slow-requests)
+app.add_middleware(SlowRequestMiddleware, log=slow_requests)
+# Outermost: request ids for log records and slow request entries
+app.add_middleware(RequestContextMiddleware)
+
+@app.on_event("shutdown")
+async def flush_logs():
+    shutdown_logging()
+
+# Vector store and embedding model load lazily (see knowledge_base.py)
+@app.on_event("startup")
+async def warm_up_knowledge_base():
+    """Start loading the embedding model and Chroma in the background"""
+    knowledge_base.start_warmup()
+    asyncio.create_task(_load_knowledge_stats())
+
+async def _load_knowledge_stats():
+    """Count the stored chunks once the collection is loaded; later writes update the stats incrementally"""
+    if await run_in_threadpool(knowledge_base.wait_until_ready):
+        try:
+            await run_in_threadpool(knowledge_stats.rebuild)
+        except Exception as e:
+            log.error("kb_stats_load_failed", error=str(e), exc_info=True)
+
+async def require_knowledge_base():
+    """Wait (off the event loop) for the knowledge base, or fail with 503 if it isn't ready in time"""
+    if knowledge_base.is_ready():
+        return
+    ready = await run_in_threadpool(knowledge_base.wait_until_ready, KNOWLEDGE_BASE_READY_TIMEOUT)
+    if not ready:
+        raise HTTPException(status_code=503, detail="Knowledge base is still loading. Try again shortly or use general_only mode.")
 
 # Response cache for identical queries
 response_cache = {}
@@ -54,6 +110,8 @@ class ChatMessage(BaseModel):
     mode: Optional[str] = "mixed"  # "context_only", "general_only", "mixed"
     model: Optional[str] = None
     session_doc_ids: Optional[List[str]] = []  # Documents uploaded in this session
+    include_mail: bool = False  # Also retrieve from the synced mail index
+    tenant: Optional[str] = None  # Only retrieve this tenant's documents
 
 class ChatResponse(BaseModel):
     response: str
@@ -62,29 +120,64 @@ class ChatResponse(BaseModel):
     mode_used: str
     model_used: str
     processing_steps: List[str] = []
+    stage_timings_ms: Dict[str, float] = {}
 
 class ProcessingUpdate(BaseModel):
     step: str
     status: str  # "started", "completed", "error"
     details: Optional[str] = None
 
+class SnapshotRequest(BaseModel):
+    name: Optional[str] = None  # Directory under SNAPSHOT_DIR (default: timestamped)
+    dtype: str = "float32"      # "float32" or "int8"
+
+class RestoreRequest(BaseModel):
+    name: str
+    force: bool = False  # Restore even if the embedding model differs
+
+class ReindexRequest(BaseModel):
+    model: str                            # sentence-transformers model to re-embed with
+    batch_size: Optional[int] = None      # Default REINDEX_BATCH_SIZE
+    delay_seconds: Optional[float] = None  # Default REINDEX_BATCH_DELAY_SECONDS
+    cutover: bool = True                  # Activate the new version when the copy finishes
+
 class DocumentUpload(BaseModel):
     content: str
     filename: str
     metadata: Optional[dict] = {}
 
 # Ollama LLM integration
-OLLAMA_URL = "http://localhost:11434/api/generate"
 MOCK_MODE = os.getenv("MOCK_MODE", "false").lower() == "true"
 
-def query_llama(prompt: str, context: str = "", mode: str = "mixed", model_name: str = None, processing_steps: List[str] = None) -> str:
+def _annotate_step(processing_steps: Optional[List[str]], index: int, seconds: float):
+    """Append the measured duration to a processing step that has just finished"""
+    if processing_steps is not None and 0 <= index < len(processing_steps):
+        processing_steps[index] = f"{processing_steps[index]} ({format_duration(seconds)})"
+
+def _record_ollama_stats(model: str, result: dict):
+    """Record Ollama's own timing fields (nanoseconds) for TTFT and tokens/sec"""
+    prompt_eval_ns = result.get("prompt_eval_duration", 0) or 0
+    load_ns = result.get("load_duration", 0) or 0
+    eval_count = result.get("eval_count", 0) or 0
+    eval_ns = result.get("eval_duration", 0) or 0
+    
+    if prompt_eval_ns or load_ns:
+        LLM_TIME_TO_FIRST_TOKEN.observe((prompt_eval_ns + load_ns) / 1e9, model=model)
+    if eval_count and eval_ns:
+        LLM_TOKENS_PER_SECOND.observe(eval_count / (eval_ns / 1e9), model=model)
+    LLM_TOKENS.inc(result.get("prompt_eval_count", 0) or 0, model=model, kind="prompt")
+    LLM_TOKENS.inc(eval_count, model=model, kind="generated")
+
+def query_llama(prompt: str, context: str = "", mode: str = "mixed", model_name: str = None, processing_steps: List[str] = None, timings: Dict[str, float] = None) -> str:
     """Query LLaMA 3 via Ollama with fallback"""
     
     # Check cache first for speed
     cache_key = hashlib.md5(f"{prompt}:{context}".encode()).hexdigest()
     if cache_key in response_cache:
-        print("Using cached response")
+        record_cache("llm_response", hit=True)
+        log.debug("llm_cache_hit")
         return response_cache[cache_key]
+    record_cache("llm_response", hit=False)
     
     # Mock mode for testing without Ollama
     if MOCK_MODE:
@@ -149,7 +242,10 @@ Please provide a comprehensive answer combining the document information with re
     
     try:
         # First check if Ollama is running
-        health_response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        with stage_timer("query_llama", "ollama_health", timings) as health_timer:
+            health_response = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=5)
+        if processing_steps is not None:
+            _annotate_step(processing_steps, len(processing_steps) - 1, health_timer.elapsed)
         if health_response.status_code != 200:
             return "Ollama service is not running. Please start Ollama first. Or set MOCK_MODE=true for testing."
         
@@ -161,11 +257,21 @@ Please provide a comprehensive answer combining the document information with re
             return "LLaMA 3 model not found. Please run: ollama pull llama3"
         
         # Query the model with longer timeout for first requests
-        print(f"Sending request to LLaMA with prompt length: {len(full_prompt)}")
-        response = requests.post(OLLAMA_URL, json=payload, timeout=180)
-        response.raise_for_status()
-        result = response.json()["response"]
-        print(f"LLaMA response received: {len(result)} characters")
+        log.debug("llm_request", model=selected_model, prompt_chars=len(full_prompt))
+        with stage_timer("query_llama", "ollama_generate", timings) as generate_timer:
+            response = requests.post(OLLAMA_URL, json=payload, timeout=180)
+            response.raise_for_status()
+            response_json = response.json()
+        result = response_json["response"]
+        _record_ollama_stats(selected_model, response_json)
+        log.info("llm_response", model=selected_model, response_chars=len(result),
+                 generate_ms=generate_timer.elapsed_ms, generated_tokens=response_json.get("eval_count"))
+        
+        if processing_steps is not None:
+            eval_count = response_json.get("eval_count") or 0
+            eval_seconds = (response_json.get("eval_duration") or 0) / 1e9
+            throughput = f", {eval_count / eval_seconds:.1f} tokens/s" if eval_count and eval_seconds else ""
+            processing_steps.append(f"⏱️ Model generation took {format_duration(generate_timer.elapsed)}{throughput}")
         
         # Cache the response for future use
         response_cache[cache_key] = result
@@ -178,7 +284,7 @@ Please provide a comprehensive answer combining the document information with re
         return result
         
     except requests.exceptions.ConnectionError:
-        return "Cannot connect to Ollama. Please ensure Ollama is running on localhost:11434. Or set MOCK_MODE=true for testing."
+        return f"Cannot connect to Ollama. Please ensure Ollama is running on {OLLAMA_BASE_URL}. Or set MOCK_MODE=true for testing."
     except requests.exceptions.Timeout:
         return "LLaMA response timed out. The model might be loading or the query is too complex."
     except Exception as e:
@@ -187,32 +293,87 @@ Please provide a comprehensive answer combining the document information with re
 @lru_cache(maxsize=100)
 def get_cached_embedding(query: str):
     """Cache embeddings for repeated queries"""
-    return embedding_model.encode([query]).tolist()
+    return get_embedding_model().encode([query]).tolist()
 
-def retrieve_context(query: str, top_k: int = TOP_K_RESULTS, processing_steps: List[str] = None, session_doc_ids: List[str] = None) -> tuple[str, List[str]]:
-    """Retrieve relevant context from vector database"""
+def retrieve_context(query: str, top_k: int = TOP_K_RESULTS, processing_steps: List[str] = None, session_doc_ids: List[str] = None, timings: Dict[str, float] = None, conversation_id: str = None, include_mail: bool = False, tenant: str = None) -> tuple[str, List[str]]:
+    """Retrieve relevant context from vector database (or the in-memory session index)"""
     try:
         if processing_steps is not None:
             processing_steps.append("🔤 Generating query embedding")
         
         # Use cached embedding for speed
-        query_embedding = get_cached_embedding(query)
+        hits_before = get_cached_embedding.cache_info().hits
+        with stage_timer("retrieve_context", "embedding", timings) as embedding_timer:
+            query_embedding = get_cached_embedding(query)
+        record_cache("query_embedding", hit=get_cached_embedding.cache_info().hits > hits_before)
+        if processing_steps is not None:
+            _annotate_step(processing_steps, len(processing_steps) - 1, embedding_timer.elapsed)
         
         # Processing steps are now handled in the main chat function
         
-        # Filter by session documents if provided
-        where_filter = None
-        if session_doc_ids and len(session_doc_ids) > 0:
-            where_filter = {"doc_id": {"$in": session_doc_ids}}
+        if is_summary_query(query):
+            # Whole-document coverage from ingestion-time summaries instead of the top chunks
+            try:
+                with stage_timer("retrieve_context", "summary_lookup", timings):
+                    summary = summary_index.context_for(query, query_embedding, MAX_CONTEXT_LENGTH, session_doc_ids,
+                                                        tenant=tenant)
+            except Exception as e:
+                log.warning("summary_lookup_failed", error=str(e))
+                summary = None
+            if summary is not None:
+                context, sources, covered = summary
+                if processing_steps is not None:
+                    processing_steps.append(f"🧾 Using precomputed summaries of {covered} document(s)")
+                log.debug("summary_context", documents=covered, context_chars=len(context))
+                return context, sources
         
-        results = collection.query(
-            query_embeddings=query_embedding,
-            n_results=top_k,
-            where=where_filter if where_filter else None
-        )
+        results = None
+        if session_doc_ids and conversation_id:
+            # Session-scoped: one matrix-vector product over this conversation's chunks
+            with stage_timer("retrieve_context", "session_index_query", timings) as query_timer:
+                results = session_indexes.query(conversation_id, session_doc_ids, query_embedding[0], top_k,
+                                                tenant=tenant)
+        
+        if results is None:
+            # Filter by session documents and tenant if provided (a sharded store only queries the shards they map to)
+            conditions = []
+            if session_doc_ids and len(session_doc_ids) > 0:
+                conditions.append({"doc_id": {"$in": session_doc_ids}})
+            if tenant:
+                conditions.append({"tenant": tenant})
+            where_filter = conditions[0] if len(conditions) == 1 else ({"$and": conditions} if conditions else None)
+            
+            with stage_timer("retrieve_context", "vector_query", timings) as query_timer:
+                results = get_collection().query(
+                    query_embeddings=query_embedding,
+                    n_results=top_k,
+                    where=where_filter if where_filter else None
+                )
+        
+        log.debug("vector_results", hits=len(results['documents'][0]) if results.get('documents') else 0)
         
-        # Debug info (can be removed later)
-        print(f"Documents found: {len(results.get('documents', []))}")
+        if include_mail:
+            # Mail chunks share the embedding model, so their distances rank against document chunks
+            try:
+                with stage_timer("retrieve_context", "mail_query", timings):
+                    mail_results = mail_indexer.query(query_embedding, MAIL_CONTEXT_RESULTS)
+            except Exception as e:
+                log.warning("mail_query_failed", error=str(e))
+                mail_results = None
+            if mail_results and mail_results['documents'][0]:
+                hits = sorted(
+                    zip(results['distances'][0] + mail_results['distances'][0],
+                        results['documents'][0] + mail_results['documents'][0],
+                        results['metadatas'][0] + mail_results['metadatas'][0]),
+                    key=lambda hit: hit[0]
+                )
+                results = {
+                    'distances': [[hit[0] for hit in hits]],
+                    'documents': [[hit[1] for hit in hits]],
+                    'metadatas': [[hit[2] for hit in hits]]
+                }
+                if processing_steps is not None:
+                    processing_steps.append(f"📧 Found {len(mail_results['documents'][0])} relevant email chunks")
         
         if results['documents'] and results['documents'][0]:
             # Limit context length for faster processing
@@ -229,16 +390,20 @@ def retrieve_context(query: str, top_k: int = TOP_K_RESULTS, processing_steps: L
                     break
             
             context = "\n\n".join(limited_context)
-            sources = [meta.get('filename', 'Unknown') for meta in results['metadatas'][0]]
+            sources = [
+                f"Email: {meta.get('subject') or '(no subject)'}" if meta.get('source') == 'email'
+                else meta.get('filename', 'Unknown')
+                for meta in results['metadatas'][0]
+            ]
             
             if processing_steps is not None:
-                processing_steps.append(f"📄 Found {len(context_parts)} relevant chunks, using {len(limited_context)} for context")
+                processing_steps.append(f"📄 Found {len(context_parts)} relevant chunks, using {len(limited_context)} for context (search took {format_duration(query_timer.elapsed)})")
             
-            print(f"Retrieved {len(context_parts)} context parts, using {len(limited_context)}")
+            log.debug("context_selected", chunks=len(context_parts), used=len(limited_context), context_chars=len(context))
             return context, sources
         return "", []
     except Exception as e:
-        print(f"Error retrieving context: {e}")
+        log.error("retrieve_context_failed", error=str(e), exc_info=True)
         return "", []
 
 @app.get("/")
@@ -247,74 +412,95 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    try:
-        # Test ChromaDB connection
-        count = collection.count()
-        
-        # Test embedding model
-        test_embedding = embedding_model.encode(["test"])
-        
-        return {
-            "status": "healthy",
-            "chroma_documents": count,
-            "embedding_model": "loaded"
-        }
-    except Exception as e:
-        return {
-            "status": "unhealthy",
-            "error": str(e)
-        }
+    """Health check endpoint (liveness and readiness reported separately)"""
+    kb_status = knowledge_base.status()
+    ready = knowledge_base.is_ready()
+    result = {
+        "status": "healthy" if ready else ("unhealthy" if kb_status["state"] == "error" else "starting"),
+        "live": True,
+        "ready": ready,
+        "knowledge_base": kb_status,
+        "embedding_model": kb_status["embedding_model"]
+    }
+    if ready:
+        result["chroma_documents"] = knowledge_stats.total_chunks()
+    return result
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the embedding model and vector store are loaded"""
+    if knowledge_base.is_ready():
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content={"status": "starting", "knowledge_base": knowledge_base.status()})
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat(message: ChatMessage):
     """Main chat endpoint"""
+    request_start = time.perf_counter()
+    timings: Dict[str, float] = {}
     try:
         # Generate conversation ID if not provided
         conv_id = message.conversation_id or str(uuid.uuid4())
+        bind_conversation(conv_id)
         
         # Initialize processing steps
         processing_steps = []
         processing_steps.append(f"🚀 Starting query processing (Mode: {message.mode.replace('_', ' ').title()})")
         
-        print(f"Processing chat message: {message.message}")
-        print(f"Mode: {message.mode}, Model: {message.model}")
-        
-        # Get knowledge base stats for dynamic messaging
-        total_docs = collection.count()
+        log.info("chat_request", mode=message.mode, model=message.model, query=message.message,
+                 session_docs=len(message.session_doc_ids or []), include_mail=message.include_mail)
         
         # Retrieve relevant context based on mode
         context = ""
         sources = []
         
         if message.mode in ["mixed", "context_only"]:
+            await require_knowledge_base()
+            
+            # Get knowledge base stats for dynamic messaging (in-memory, see kb_stats.py)
+            total_docs = knowledge_stats.total_chunks()
+            if total_docs is None:
+                total_docs = "an unknown number of"  # Stats still loading
+            
             if message.session_doc_ids and len(message.session_doc_ids) > 0:
                 processing_steps.append(f"🔍 Searching {len(message.session_doc_ids)} session documents")
             else:
                 processing_steps.append(f"🔍 Searching {total_docs} documents in knowledge base")
             
-            context, sources = retrieve_context(
-                message.message, 
-                processing_steps=processing_steps,
-                session_doc_ids=message.session_doc_ids
-            )
-            print(f"Retrieved context from {len(sources)} sources")
-            print(f"Context preview: {context[:200]}..." if context else "No context")
-            print(f"Full context length: {len(context)}")
+            with stage_timer("chat", "retrieval", timings):
+                context, sources = retrieve_context(
+                    message.message, 
+                    processing_steps=processing_steps,
+                    session_doc_ids=message.session_doc_ids,
+                    timings=timings,
+                    conversation_id=message.conversation_id,
+                    include_mail=message.include_mail,
+                    tenant=message.tenant
+                )
+            log.debug("chat_context", sources=sources, context_chars=len(context), context_preview=context[:200])
         else:
             processing_steps.append("🧠 Using general knowledge only (skipping document search)")
         
         # Query LLaMA
         processing_steps.append(f"🤖 Generating response with {message.model.replace('_', ' ').title()} model")
-        response = query_llama(
-            message.message, 
-            context, 
-            mode=message.mode or "mixed",
-            model_name=message.model,
-            processing_steps=processing_steps
-        )
+        with stage_timer("chat", "llm", timings) as llm_timer:
+            response = query_llama(
+                message.message, 
+                context, 
+                mode=message.mode or "mixed",
+                model_name=message.model,
+                processing_steps=processing_steps,
+                timings=timings
+            )
         
-        processing_steps.append("✅ Response generated successfully")
+        total_seconds = time.perf_counter() - request_start
+        timings["total"] = round(total_seconds * 1000, 1)
+        processing_steps.append(f"✅ Response generated successfully (LLM {format_duration(llm_timer.elapsed)}, total {format_duration(total_seconds)})")
         
         # Store conversation history
         if conv_id not in conversation_history:
@@ -338,90 +524,73 @@ async def chat(message: ChatMessage):
             sources=sources,
             mode_used=message.mode or "mixed",
             model_used=message.model or CURRENT_MODEL,
-            processing_steps=processing_steps
+            processing_steps=processing_steps,
+            stage_timings_ms=timings
         )
-        print(f"Returning chat response with {len(processing_steps)} processing steps")
+        log.info("chat_response", sources=len(sources), response_chars=len(response), stage_timings_ms=dict(timings))
+        REQUESTS_TOTAL.inc(operation="chat", status="ok")
         return chat_response
+    except HTTPException:
+        REQUESTS_TOTAL.inc(operation="chat", status="rejected")
+        raise
     except Exception as e:
-        print(f"Error in chat endpoint: {str(e)}")
+        log.error("chat_failed", error=str(e), exc_info=True)
+        REQUESTS_TOTAL.inc(operation="chat", status="error")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - request_start, operation="chat", stage="total")
 
 @app.post("/upload-document")
-async def upload_document(file: UploadFile = File(...), conversation_id: str = None):
-    """Upload and process documents for knowledge base"""
+async def upload_document(file: UploadFile = File(...), conversation_id: str = None, conversation_id_form: Optional[str] = Form(None, alias="conversation_id"), session_only: bool = False, tenant: str = None, tenant_form: Optional[str] = Form(None, alias="tenant")):
+    """
+    Upload and process documents for knowledge base
+    
+    With session_only=true the document is tied to the conversation and
+    expires after SESSION_DOCUMENT_TTL_SECONDS. A tenant tags the document
+    for tenant-scoped retrieval (and picks its shard when KB_SHARD_KEY=tenant).
+    """
+    # The frontend sends conversation_id as a form field; API clients may pass it as a query parameter
+    conversation_id = conversation_id or conversation_id_form
+    tenant = tenant or tenant_form
+    bind_conversation(conversation_id)
+    if session_only and not conversation_id:
+        raise HTTPException(status_code=400, detail="session_only uploads require a conversation_id")
+    request_start = time.perf_counter()
+    timings: Dict[str, float] = {}
     try:
         # Read file content
-        content = await file.read()
-        
-        # Handle different file types
-        if file.filename.endswith('.pdf'):
-            # PDF processing with PyPDF2
-            try:
-                pdf_file = BytesIO(content)
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                text_content = ""
-                
-                # Extract text from all pages
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text_content += page.extract_text() + "\n\n"
-                
-                if not text_content.strip():
-                    raise HTTPException(status_code=400, detail="No text found in PDF. It might be scanned or image-based.")
-                
-                print(f"Extracted {len(text_content)} characters from PDF")
-            except Exception as e:
-                print(f"PDF parsing error: {str(e)}")
-                raise HTTPException(status_code=400, detail=f"Error parsing PDF: {str(e)}")
-        else:
-            # Handle text files
-            try:
-                text_content = content.decode('utf-8')
-            except UnicodeDecodeError:
-                try:
-                    text_content = content.decode('latin-1')
-                except UnicodeDecodeError:
-                    raise HTTPException(status_code=400, detail="Unable to decode file. Please ensure it's a valid text file.")
-        
-        # Simple text chunking (split by paragraphs)
-        chunks = [chunk.strip() for chunk in text_content.split('\n\n') if chunk.strip()]
-        
-        if not chunks:
-            # If no paragraphs, split by sentences or lines
-            chunks = [chunk.strip() for chunk in text_content.split('\n') if chunk.strip()]
+        with stage_timer("upload_document", "read", timings):
+            content = await file.read()
         
-        if not chunks:
-            raise HTTPException(status_code=400, detail="No content found in the file")
-        
-        # Limit chunk size to avoid memory issues
-        max_chunks = 100
-        if len(chunks) > max_chunks:
-            chunks = chunks[:max_chunks]
+        # Extract text and split into chunks
+        try:
+            with stage_timer("upload_document", "extract", timings):
+                text_content = extract_text(file.filename, content)
+            with stage_timer("upload_document", "chunk", timings):
+                chunks = chunk_text(text_content)
+        except DocumentError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Generate embeddings and store
-        print(f"Processing {len(chunks)} chunks from {file.filename}")
-        embeddings = embedding_model.encode(chunks)
+        log.info("upload_document", filename=file.filename, bytes=len(content), chunks=len(chunks),
+                 session_only=session_only)
+        await require_knowledge_base()
         
         # Create unique document ID for this upload
-        import time
         timestamp = int(time.time())
-        doc_id = f"doc_{timestamp}_{uuid.uuid4().hex[:8]}"
-        
-        # Create unique IDs for chunks
-        ids = [f"{doc_id}_chunk_{i}" for i in range(len(chunks))]
-        metadatas = [{
-            "filename": file.filename, 
-            "chunk_id": i, 
-            "timestamp": timestamp,
-            "doc_id": doc_id
-        } for i in range(len(chunks))]
+        doc_id = new_doc_id(timestamp)
+        extra_metadata = {}
+        if tenant:
+            extra_metadata["tenant"] = tenant
+        if conversation_id:
+            extra_metadata["conversation_id"] = conversation_id
+        if session_only:
+            extra_metadata["session_only"] = True
+            extra_metadata["expires_at"] = timestamp + SESSION_DOCUMENT_TTL_SECONDS
         
-        # Add to collection
-        collection.add(
-            embeddings=embeddings.tolist(),
-            documents=chunks,
-            metadatas=metadatas,
-            ids=ids
+        embeddings, metadatas = await run_in_threadpool(
+            store_chunks, doc_id, file.filename, chunks, timestamp,
+            extra_metadata=extra_metadata, timings=timings
         )
         
         # Track document for session if conversation_id provided
@@ -429,43 +598,308 @@ async def upload_document(file: UploadFile = File(...), conversation_id: str = N
             if conversation_id not in session_documents:
                 session_documents[conversation_id] = []
             session_documents[conversation_id].append(doc_id)
+            session_indexes.add_document(conversation_id, doc_id, embeddings, chunks, metadatas)
         
+        timings["total"] = round((time.perf_counter() - request_start) * 1000, 1)
+        REQUESTS_TOTAL.inc(operation="upload_document", status="ok")
         return {
             "message": f"Successfully uploaded {file.filename} with {len(chunks)} chunks",
             "doc_id": doc_id,
-            "chunks": len(chunks)
+            "chunks": len(chunks),
+            "stage_timings_ms": timings
         }
     
     except HTTPException:
+        REQUESTS_TOTAL.inc(operation="upload_document", status="rejected")
         raise
     except Exception as e:
-        print(f"Error processing file {file.filename}: {str(e)}")
+        log.error("upload_document_failed", filename=file.filename, error=str(e), exc_info=True)
+        REQUESTS_TOTAL.inc(operation="upload_document", status="error")
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - request_start, operation="upload_document", stage="total")
 
-@app.get("/knowledge-base/stats")
-async def get_knowledge_stats():
-    """Get statistics about the knowledge base"""
+@app.get("/documents/{doc_id}/summary")
+async def get_document_summary(doc_id: str):
+    """Precomputed summary of a document and of each of its sections"""
+    await require_knowledge_base()
+    summary = await run_in_threadpool(summary_index.get, doc_id)
+    if summary is not None:
+        return summary
+    if summary_index.is_pending(doc_id):
+        return JSONResponse(status_code=202, content={"doc_id": doc_id, "status": "pending"})
+    raise HTTPException(status_code=404, detail="No summary for this document")
+
+@app.get("/knowledge-base/summaries")
+async def get_summary_status():
+    """Background summarizer progress"""
+    return summary_index.status()
+
+@app.delete("/documents/{doc_id}")
+async def delete_document_endpoint(doc_id: str):
+    """Delete every chunk of a document from the knowledge base"""
+    await require_knowledge_base()
+    removed = await run_in_threadpool(delete_document, doc_id)
+    if removed == 0:
+        raise HTTPException(status_code=404, detail="Document not found")
+    _forget_session_document(doc_id)
+    return {"message": f"Deleted document {doc_id}", "doc_id": doc_id, "chunks_removed": removed}
+
+@app.put("/documents/{doc_id}")
+async def replace_document_endpoint(doc_id: str, file: UploadFile = File(...)):
+    """Replace a document with a new version of the file, keeping its doc_id"""
+    timings: Dict[str, float] = {}
+    content = await file.read()
     try:
-        count = collection.count()
-        return {"total_documents": count}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        chunks = chunk_text(extract_text(file.filename, content))
+    except DocumentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    await require_knowledge_base()
+    try:
+        result = await run_in_threadpool(replace_document, doc_id, file.filename, chunks, timings)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {
+        "message": f"Replaced {doc_id} with {file.filename} ({len(chunks)} chunks)",
+        **result,
+        "stage_timings_ms": timings
+    }
+
+@app.post("/knowledge-base/compact")
+async def compact_knowledge_base():
+    """Purge expired session documents and reclaim storage left by deleted chunks"""
+    await require_knowledge_base()
+    expired = await run_in_threadpool(expire_documents)
+    for doc_id, _ in expired:
+        _forget_session_document(doc_id)
+    result = await run_in_threadpool(compact_store)
+    return {"expired_documents": len(expired), **result}
+
+@app.post("/knowledge-base/snapshot")
+async def create_knowledge_base_snapshot(request: SnapshotRequest):
+    """Write a binary snapshot (embeddings .npy + columnar sidecar) of the vector store"""
+    await require_knowledge_base()
+    try:
+        path = snapshot.resolve_snapshot_path(SNAPSHOT_DIR, request.name)
+        manifest = await run_in_threadpool(snapshot.create_snapshot, path, request.dtype)
+    except (ValueError, FileExistsError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"name": os.path.basename(path), **manifest}
+
+@app.get("/knowledge-base/snapshots")
+async def list_knowledge_base_snapshots():
+    """List snapshots available for restore"""
+    snapshots = []
+    if os.path.isdir(SNAPSHOT_DIR):
+        for name in sorted(os.listdir(SNAPSHOT_DIR)):
+            try:
+                snapshots.append({"name": name, **snapshot.read_manifest(os.path.join(SNAPSHOT_DIR, name))})
+            except (OSError, ValueError):
+                continue
+    return {"snapshots": snapshots}
+
+@app.post("/knowledge-base/restore")
+async def restore_knowledge_base_snapshot(request: RestoreRequest):
+    """Bulk-load a snapshot into the collection without re-embedding"""
+    await require_knowledge_base()
+    try:
+        path = snapshot.resolve_snapshot_path(SNAPSHOT_DIR, request.name)
+        if not os.path.exists(os.path.join(path, "manifest.json")):
+            raise HTTPException(status_code=404, detail="Snapshot not found")
+        result = await run_in_threadpool(snapshot.restore_snapshot, path, force=request.force)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Restored documents bypass ingestion; summarize the ones without summaries
+    summary_index.request_backfill()
+    return {"name": request.name, **result}
+
+@app.get("/knowledge-base/shards")
+async def get_knowledge_base_shards():
+    """Shard key of the active version and each shard's directory and chunk count"""
+    await require_knowledge_base()
+    return await run_in_threadpool(knowledge_base.shard_status)
+
+@app.get("/knowledge-base/versions")
+async def list_knowledge_base_versions():
+    """Collection versions by embedding model, and which one serves queries"""
+    return await run_in_threadpool(knowledge_base.list_versions)
+
+@app.post("/knowledge-base/reindex")
+async def start_knowledge_base_reindex(request: ReindexRequest):
+    """Re-embed the knowledge base with another model in the background, then switch over"""
+    await require_knowledge_base()
+    try:
+        job = reindex.start_reindex(
+            request.model,
+            batch_size=request.batch_size or REINDEX_BATCH_SIZE,
+            delay_seconds=REINDEX_BATCH_DELAY_SECONDS if request.delay_seconds is None else request.delay_seconds,
+            cutover=request.cutover,
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.status()
+
+@app.get("/knowledge-base/reindex")
+async def get_knowledge_base_reindex_status():
+    """Progress of the current or last re-index job"""
+    job = reindex.current_job()
+    if job is None:
+        return {"state": "idle"}
+    return job.status()
+
+@app.post("/knowledge-base/reindex/cancel")
+async def cancel_knowledge_base_reindex():
+    job = reindex.current_job()
+    if job is None or not job.running:
+        raise HTTPException(status_code=409, detail="No re-index is running")
+    job.cancel()
+    return job.status()
+
+@app.post("/knowledge-base/versions/{name}/activate")
+async def activate_knowledge_base_version(name: str):
+    """
+    Switch queries to another version (e.g. roll back after a re-index)
+
+    The version is first caught up with writes made since it was last
+    active or built, re-embedding only the chunks that differ; the request
+    returns once the switch is done.
+    """
+    await require_knowledge_base()
+    if name == knowledge_base.active_version()["name"]:
+        return knowledge_base.list_versions()
+    try:
+        job = reindex.start_activation(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Version not found")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    await run_in_threadpool(job.wait)
+    if job.state != "completed":
+        raise HTTPException(status_code=500, detail=job.error or f"Activation {job.state}")
+    return knowledge_base.list_versions()
+
+@app.delete("/knowledge-base/versions/{name}")
+async def drop_knowledge_base_version(name: str):
+    """Delete an inactive version's collection"""
+    job = reindex.current_job()
+    if job is not None and job.running and job.target == name:
+        raise HTTPException(status_code=409, detail="Version is being built by the running re-index")
+    try:
+        await run_in_threadpool(knowledge_base.drop_version, name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Version not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"dropped": name}
+
+def _forget_session_document(doc_id: str):
+    """Drop a deleted document from every conversation's session list"""
+    for conv_id, doc_ids in list(session_documents.items()):
+        if doc_id in doc_ids:
+            doc_ids.remove(doc_id)
+
+async def _expire_documents_periodically():
+    """Background job: delete session-only documents whose TTL has passed"""
+    while True:
+        await asyncio.sleep(DOCUMENT_EXPIRY_INTERVAL_SECONDS)
+        if not knowledge_base.is_ready():
+            continue
+        try:
+            for doc_id, _ in await run_in_threadpool(expire_documents):
+                _forget_session_document(doc_id)
+        except Exception as e:
+            log.error("document_expiry_failed", error=str(e), exc_info=True)
+
+@app.on_event("startup")
+async def start_document_expiry():
+    asyncio.create_task(_expire_documents_periodically())
+
+@app.on_event("startup")
+async def start_document_summaries():
+    """Summarize new uploads in the background (waits for the knowledge base, then backfills)"""
+    summary_index.start()
+
+@app.on_event("shutdown")
+async def stop_document_summaries():
+    summary_index.stop()
+
+@app.get("/knowledge-base/stats")
+async def get_knowledge_stats(include_documents: bool = False):
+    """Get statistics about the knowledge base (served from memory)"""
+    await require_knowledge_base()
+    stats = knowledge_stats.summary(include_documents=include_documents)
+    # total_documents has always been the chunk count; kept for the frontend
+    return {"total_documents": stats["chunks"], **stats}
 
 @app.get("/knowledge-base/inspect")
-async def inspect_knowledge_base():
-    """Inspect the contents of the knowledge base"""
+async def inspect_knowledge_base(limit: int = 5, cursor: Optional[str] = None, doc_id: Optional[str] = None, filename: Optional[str] = None):
+    """
+    Inspect the contents of the knowledge base one page at a time
+    
+    Pass the returned next_cursor back as cursor to fetch the following page.
+    Optionally filter by doc_id and/or filename.
+    """
+    if limit < 1 or limit > INSPECT_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {INSPECT_MAX_LIMIT}")
+    try:
+        offset = int(cursor) if cursor else 0
+        if offset < 0:
+            raise ValueError
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    await require_knowledge_base()
     try:
-        # Get all documents
-        results = collection.get()
+        where = build_where(doc_id, filename)
+        collection = get_collection()
+        results = await run_in_threadpool(
+            collection.get, where=where, limit=limit, offset=offset, include=["documents", "metadatas"]
+        )
+        ids = results.get('ids') or []
         return {
-            "total_count": len(results.get('documents', [])),
-            "documents": results.get('documents', [])[:5],  # First 5 documents
-            "metadatas": results.get('metadatas', [])[:5],   # First 5 metadata entries
-            "ids": results.get('ids', [])[:5]                # First 5 IDs
+            # Counting a filtered selection would mean scanning it, so only the unfiltered total is reported
+            "total_count": knowledge_stats.total_chunks() if where is None else None,
+            "documents": results.get('documents') or [],
+            "metadatas": results.get('metadatas') or [],
+            "ids": ids,
+            "next_cursor": str(offset + len(ids)) if len(ids) == limit else None
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/knowledge-base/export")
+async def export_knowledge_base(doc_id: Optional[str] = None, filename: Optional[str] = None, include_embeddings: bool = False, batch_size: int = EXPORT_BATCH_SIZE):
+    """Stream the knowledge base as NDJSON (one chunk per line), paging through Chroma in bounded batches"""
+    if batch_size < 1 or batch_size > 10 * EXPORT_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"batch_size must be between 1 and {10 * EXPORT_BATCH_SIZE}")
+    await require_knowledge_base()
+    
+    include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+    where = build_where(doc_id, filename)
+    
+    def generate_lines():
+        # Sync generator: Starlette iterates it in a worker thread, keeping Chroma calls off the event loop
+        for batch in iter_batches(batch_size, where=where, include=include):
+            embeddings = batch.get("embeddings") if include_embeddings else None
+            lines = []
+            for i, chunk_id in enumerate(batch["ids"]):
+                record = {
+                    "id": chunk_id,
+                    "document": batch["documents"][i],
+                    "metadata": batch["metadatas"][i]
+                }
+                if embeddings is not None:
+                    record["embedding"] = [float(x) for x in embeddings[i]]
+                lines.append(json.dumps(record))
+            yield "\n".join(lines) + "\n"
+    
+    return StreamingResponse(
+        generate_lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=knowledge_base.ndjson"}
+    )
+
 @app.get("/models")
 async def get_available_models():
     """Get available model configurations"""
@@ -490,13 +924,16 @@ async def switch_model(model_name: str):
 @app.post("/chat/stream")
 async def chat_stream(message: ChatMessage):
     """Streaming chat endpoint with real-time processing updates"""
-    import asyncio
-    import json
     
     async def generate_response():
+        request_start = time.perf_counter()
+        timings: Dict[str, float] = {}
         try:
             # Generate conversation ID if not provided
             conv_id = message.conversation_id or str(uuid.uuid4())
+            bind_conversation(conv_id)
+            log.info("chat_stream_request", mode=message.mode, model=message.model, query=message.message,
+                     session_docs=len(message.session_doc_ids or []), include_mail=message.include_mail)
             
             # Send initial status
             yield f"data: {json.dumps({'type': 'status', 'step': 'Starting query processing', 'conversation_id': conv_id})}\n\n"
@@ -506,10 +943,16 @@ async def chat_stream(message: ChatMessage):
             context = ""
             sources = []
             
-            # Get knowledge base stats for dynamic messaging
-            total_docs = collection.count()
-            
             if message.mode in ["mixed", "context_only"]:
+                if not knowledge_base.is_ready():
+                    yield f"data: {json.dumps({'type': 'status', 'step': '⏳ Waiting for the embedding model to finish loading'})}\n\n"
+                await require_knowledge_base()
+                
+                # Get knowledge base stats for dynamic messaging (in-memory, see kb_stats.py)
+                total_docs = knowledge_stats.total_chunks()
+                if total_docs is None:
+                    total_docs = "an unknown number of"  # Stats still loading
+                
                 if message.session_doc_ids and len(message.session_doc_ids) > 0:
                     yield f"data: {json.dumps({'type': 'status', 'step': f'🔍 Searching {len(message.session_doc_ids)} session documents'})}\n\n"
                 else:
@@ -519,16 +962,22 @@ async def chat_stream(message: ChatMessage):
                 yield f"data: {json.dumps({'type': 'status', 'step': '🔤 Generating query embedding'})}\n\n"
                 await asyncio.sleep(0.2)
                 
-                context, sources = retrieve_context(
-                    message.message,
-                    session_doc_ids=message.session_doc_ids
-                )
+                with stage_timer("chat_stream", "retrieval", timings) as retrieval_timer:
+                    context, sources = retrieve_context(
+                        message.message,
+                        session_doc_ids=message.session_doc_ids,
+                        timings=timings,
+                        conversation_id=message.conversation_id,
+                        include_mail=message.include_mail,
+                        tenant=message.tenant
+                    )
+                retrieval_ms = retrieval_timer.elapsed_ms
                 
                 if sources:
-                    yield f"data: {json.dumps({'type': 'status', 'step': f'📄 Found {len(sources)} relevant documents'})}\n\n"
+                    yield f"data: {json.dumps({'type': 'status', 'step': f'📄 Found {len(sources)} relevant documents ({format_duration(retrieval_timer.elapsed)})', 'stage': 'retrieval', 'duration_ms': retrieval_ms})}\n\n"
                     await asyncio.sleep(0.2)
                 else:
-                    yield f"data: {json.dumps({'type': 'status', 'step': '❌ No relevant documents found in knowledge base'})}\n\n"
+                    yield f"data: {json.dumps({'type': 'status', 'step': '❌ No relevant documents found in knowledge base', 'stage': 'retrieval', 'duration_ms': retrieval_ms})}\n\n"
                     await asyncio.sleep(0.2)
             else:
                 yield f"data: {json.dumps({'type': 'status', 'step': '🧠 Using general knowledge only (skipping document search)'})}\n\n"
@@ -553,14 +1002,16 @@ async def chat_stream(message: ChatMessage):
             yield f"data: {json.dumps({'type': 'status', 'step': '🤖 Generating AI response (this may take a moment)'})}\n\n"
             await asyncio.sleep(0.2)
             
-            response = query_llama(
-                message.message, 
-                context, 
-                mode=message.mode or "mixed",
-                model_name=message.model
-            )
+            with stage_timer("chat_stream", "llm", timings) as llm_timer:
+                response = query_llama(
+                    message.message, 
+                    context, 
+                    mode=message.mode or "mixed",
+                    model_name=message.model,
+                    timings=timings
+                )
             
-            yield f"data: {json.dumps({'type': 'status', 'step': '✅ Response generated successfully'})}\n\n"
+            yield f"data: {json.dumps({'type': 'status', 'step': f'✅ Response generated successfully ({format_duration(llm_timer.elapsed)})', 'stage': 'llm', 'duration_ms': llm_timer.elapsed_ms})}\n\n"
             await asyncio.sleep(0.2)
             
             yield f"data: {json.dumps({'type': 'status', 'step': '📋 Finalizing response and metadata'})}\n\n"
@@ -583,24 +1034,31 @@ async def chat_stream(message: ChatMessage):
             })
             
             # Send final response
+            timings["total"] = round((time.perf_counter() - request_start) * 1000, 1)
             chat_response = {
                 'type': 'response',
                 'response': response,
                 'conversation_id': conv_id,
                 'sources': sources,
                 'mode_used': message.mode or "mixed",
-                'model_used': message.model or CURRENT_MODEL
+                'model_used': message.model or CURRENT_MODEL,
+                'stage_timings_ms': timings
             }
             
             yield f"data: {json.dumps(chat_response)}\n\n"
             yield "data: [DONE]\n\n"
+            REQUESTS_TOTAL.inc(operation="chat_stream", status="ok")
             
         except Exception as e:
+            log.error("chat_stream_failed", error=str(e), exc_info=True)
+            REQUESTS_TOTAL.inc(operation="chat_stream", status="error")
             error_response = {
                 'type': 'error',
                 'error': str(e)
             }
             yield f"data: {json.dumps(error_response)}\n\n"
+        finally:
+            STAGE_DURATION.observe(time.perf_counter() - request_start, operation="chat_stream", stage="total")
     
     return StreamingResponse(
         generate_response(),
@@ -614,6 +1072,11 @@ async def chat_stream(message: ChatMessage):
         }
     )
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint with per-stage latency histograms and counters"""
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.post("/cache/clear")
 async def clear_cache():
     """Clear response cache"""
@@ -623,6 +1086,16 @@ async def clear_cache():
     get_cached_embedding.cache_clear()
     return {"message": f"Cleared {cache_size} cached responses and embeddings"}
 
+def _clear_caches_on_cutover():
+    """Cached query embeddings and session indexes hold vectors from the previous model; stats follow the new collection"""
+    response_cache.clear()
+    get_cached_embedding.cache_clear()
+    session_indexes.clear()
+    knowledge_stats.rebuild_in_background()
+
+knowledge_base.on_cutover(_clear_caches_on_cutover)
+knowledge_base.on_cutover(summary_index.reset_collection)
+
 @app.get("/conversation/{conversation_id}/history")
 async def get_conversation_history(conversation_id: str):
     """Get conversation history for a specific conversation"""
@@ -633,25 +1106,40 @@ async def get_conversation_history(conversation_id: str):
 @app.get("/conversation/{conversation_id}/documents")
 async def get_session_documents(conversation_id: str):
     """Get documents uploaded in this session"""
-    if conversation_id not in session_documents:
-        return {"doc_ids": []}
-    return {"doc_ids": session_documents[conversation_id]}
+    return {
+        "doc_ids": session_documents.get(conversation_id, []),
+        "stats": knowledge_stats.session_summary(conversation_id)
+    }
 
 @app.delete("/conversation/{conversation_id}")
-async def delete_conversation(conversation_id: str):
-    """Delete a conversation and its history"""
+async def delete_conversation(conversation_id: str, purge_documents: bool = True, purge_shared: bool = False):
+    """
+    Delete a conversation and its history
+    
+    By default the session_only documents uploaded in the conversation are
+    removed from the knowledge base too; pass purge_documents=false to keep
+    them. Documents uploaded to the shared knowledge base from the
+    conversation stay unless purge_shared=true.
+    """
     deleted = False
+    purged_chunks = 0
     if conversation_id in conversation_history:
         del conversation_history[conversation_id]
         deleted = True
     if conversation_id in session_documents:
         del session_documents[conversation_id]
         deleted = True
+    if purge_documents:
+        # Found by their conversation_id metadata, so documents from before a restart go too
+        await require_knowledge_base()
+        purged_chunks = await run_in_threadpool(delete_conversation_documents, conversation_id, purge_shared)
+        deleted = deleted or purged_chunks > 0
+    session_indexes.drop(conversation_id)
     
     if not deleted:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    return {"message": f"Conversation {conversation_id} deleted"}
+    return {"message": f"Conversation {conversation_id} deleted", "purged_chunks": purged_chunks}
 
 if __name__ == "__main__":
     import uvicorn
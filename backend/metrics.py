@@ -0,0 +1,305 @@
+"""
+Metrics - Lightweight in-process instrumentation
+Counters and histograms rendered in the Prometheus text exposition format
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds (embedding calls are ms, Ollama calls can take minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    """Render a Prometheus label set, e.g. {stage="embedding",le="0.1"}"""
+    parts = []
+    for name, value in zip(labelnames, labelvalues):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed buckets"""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self, **labels) -> Optional[Dict[str, float]]:
+        """Return {'count', 'sum'} for one label set, or None if never observed"""
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return None
+        return {"count": state[-1], "sum": state[-2]}
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+        return lines
+
+
+class Registry:
+    """Holds every metric exposed at /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.metric_type}")
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.get_or_create(Counter, name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.get_or_create(Gauge, name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def render_metrics() -> str:
+    """Render all registered metrics in Prometheus text format"""
+    return REGISTRY.render()
+
+
+# ========================
+# CORE METRICS
+# ========================
+
+STAGE_DURATION = histogram(
+    "jarvis_stage_duration_seconds",
+    "Wall-clock time spent in each stage of a request",
+    ("operation", "stage"),
+)
+REQUESTS_TOTAL = counter(
+    "jarvis_requests_total",
+    "Requests handled by instrumented endpoints",
+    ("operation", "status"),
+)
+CACHE_REQUESTS = counter(
+    "jarvis_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss)",
+    ("cache", "result"),
+)
+LLM_TIME_TO_FIRST_TOKEN = histogram(
+    "jarvis_llm_time_to_first_token_seconds",
+    "Ollama model load plus prompt evaluation time before the first generated token",
+    ("model",),
+)
+LLM_TOKENS_PER_SECOND = histogram(
+    "jarvis_llm_tokens_per_second",
+    "Ollama generation throughput per request",
+    ("model",),
+    buckets=(1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 200, 400),
+)
+LLM_TOKENS = counter(
+    "jarvis_llm_tokens_total",
+    "Tokens processed by Ollama by kind (prompt/generated)",
+    ("model", "kind"),
+)
+INGESTED_CHUNKS = counter(
+    "jarvis_ingested_chunks_total",
+    "Document chunks embedded and stored in the knowledge base",
+)
+
+
+# Stage records of the request being handled, when something (diagnostics.py) is capturing them.
+# Context variables follow the request into run_in_threadpool calls.
+_captured_stages: ContextVar[Optional[List[dict]]] = ContextVar("captured_stages", default=None)
+
+
+def capture_stages() -> List[dict]:
+    """Start collecting stage_timer records for the current request context; returns the live list"""
+    stages: List[dict] = []
+    _captured_stages.set(stages)
+    return stages
+
+
+class StageTimer:
+    """Result handle for stage_timer; elapsed is filled in when the block exits"""
+
+    def __init__(self, operation: str, stage: str):
+        self.operation = operation
+        self.stage = stage
+        self.elapsed = 0.0
+
+    @property
+    def elapsed_ms(self) -> float:
+        return round(self.elapsed * 1000, 1)
+
+
+@contextmanager
+def stage_timer(operation: str, stage: str, timings: Optional[Dict[str, float]] = None):
+    """
+    Time a block and record it in jarvis_stage_duration_seconds
+
+    Args:
+        operation: Request-level operation (chat, chat_stream, upload_document, ...)
+        stage: Stage inside the operation (embedding, vector_query, llm, ...)
+        timings: Optional dict that receives {stage: elapsed_ms} for the caller
+    """
+    timer = StageTimer(operation, stage)
+    start = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        timer.elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(timer.elapsed, operation=operation, stage=stage)
+        if timings is not None:
+            timings[stage] = timer.elapsed_ms
+        captured = _captured_stages.get()
+        if captured is not None:
+            captured.append({"operation": operation, "stage": stage, "started": start, "ms": timer.elapsed_ms})
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def format_duration(seconds: float) -> str:
+    """Human-friendly duration for processing steps"""
+    if seconds < 1:
+        return f"{seconds * 1000:.0f} ms"
+    return f"{seconds:.2f} s"
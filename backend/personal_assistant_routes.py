@@ -3,14 +3,75 @@ Personal Assistant Routes - Email, Calendar, Tasks, Messages
 """
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, List
-from simple_email_manager import SimpleEmailManager, EmailRequest, EmailResponse
+from simple_email_manager import get_email_manager, EmailRequest, EmailResponse
+from email_queue import OutboundQueue, OutboundMessage
+from mail_cache import MailCache
+from mail_sync import InboxSync
+from mail_index import MailIndexer
+from draft_store import DraftStore
+from email_interpreter import EmailTaskInterpreter
+from structured_logging import get_logger
+from config import (
+    EMAIL_BULK_MAX_ITEMS, MAIL_SYNC_INTERVAL_SECONDS, INBOX_PAGE_MAX, MAIL_SEARCH_MAX_RESULTS, DRAFTS_PAGE_MAX
+)
+import knowledge_base
+import asyncio
 import json
 
+log = get_logger("personal_assistant")
+
 router = APIRouter(prefix="/personal-assistant", tags=["personal-assistant"])
 
-# Initialize email manager
-email_manager = SimpleEmailManager()
+# Shared email manager (one SMTP connection pool per process)
+email_manager = get_email_manager()
+
+# Outbound mail is queued and sent by background workers (see email_queue.py)
+outbound_queue = OutboundQueue(email_manager)
+
+@router.on_event("startup")
+async def start_outbound_queue():
+    outbound_queue.start()
+
+# Inbox is synced incrementally over IMAP into a local SQLite cache (see mail_sync.py)
+mail_cache = MailCache()
+inbox_sync = InboxSync(email_manager.email, email_manager.app_password, mail_cache)
+
+# Synced mail is embedded in the background for semantic search (see mail_index.py)
+mail_indexer = MailIndexer(inbox_sync)
+inbox_sync.on_new_messages(mail_indexer.enqueue)
+inbox_sync.on_expunged(mail_indexer.remove)
+knowledge_base.on_cutover(mail_indexer.reset)
+
+async def _sync_inbox_periodically():
+    """Background job: pull new message headers and flag changes"""
+    while True:
+        try:
+            await run_in_threadpool(inbox_sync.sync)
+        except Exception as e:
+            log.warning("inbox_sync_failed", error=str(e))
+        await asyncio.sleep(MAIL_SYNC_INTERVAL_SECONDS)
+
+@router.on_event("startup")
+async def start_inbox_sync():
+    if inbox_sync.configured:
+        mail_indexer.start()
+    if inbox_sync.configured and MAIL_SYNC_INTERVAL_SECONDS > 0:
+        asyncio.create_task(_sync_inbox_periodically())
+
+@router.on_event("shutdown")
+async def close_email_connections():
+    mail_indexer.stop()
+    await outbound_queue.stop()
+    email_manager.close()
+
+# Natural language email tasks: rules first, the fast LLM profile for unclear ones (see email_interpreter.py)
+task_interpreter = EmailTaskInterpreter()
+
+def require_email_service():
+    if not email_manager.service:
+        raise HTTPException(status_code=400, detail="Email service not configured. Set GMAIL_EMAIL and GMAIL_APP_PASSWORD in .env")
 
 # ========================
 # EMAIL ENDPOINTS
@@ -27,6 +88,11 @@ class EmailTaskRequest(BaseModel):
     task_description: str
     """Natural language description of the email task"""
 
+class BulkSendRequest(BaseModel):
+    messages: List[SendEmailRequest] = []
+    draft_ids: List[str] = []
+    wait_seconds: float = 0  # Wait up to this long for delivery results before answering
+
 @router.post("/email/send")
 async def send_email(request: SendEmailRequest):
     """
@@ -40,48 +106,195 @@ async def send_email(request: SendEmailRequest):
         "cc": "cc@example.com"
     }
     """
-    email_req = EmailRequest(**request.dict())
-    result = email_manager.send_email(email_req)
+    require_email_service()
+    message = outbound_queue.enqueue(EmailRequest(**request.dict()))
+    return {
+        "success": True,
+        "message": f"Email queued for delivery to {request.to}",
+        "tracking_id": message.id,
+        "status": message.status
+    }
+
+@router.post("/email/send/bulk")
+async def send_email_bulk(request: BulkSendRequest):
+    """
+    Queue many messages and/or drafts in one call
     
-    if result.success:
-        return {
-            "success": True,
-            "message": f"Email sent successfully to {request.to}",
-            "message_id": result.message_id
-        }
-    else:
-        raise HTTPException(status_code=400, detail=result.error)
+    Returns a per-item result with a tracking id (or the reason the item was
+    rejected). With wait_seconds > 0, waits for delivery results first.
+    """
+    require_email_service()
+    if len(request.messages) + len(request.draft_ids) > EMAIL_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {EMAIL_BULK_MAX_ITEMS} items per request")
+    
+    queued = []
+    for index, item in enumerate(request.messages):
+        queued.append(({"index": index, "to": item.to}, outbound_queue.enqueue(EmailRequest(**item.dict()))))
+    rejected = []
+    for draft_id in request.draft_ids:
+        try:
+            queued.append(({"draft_id": draft_id}, _queue_draft(draft_id)))
+        except HTTPException as e:
+            rejected.append({"draft_id": draft_id, "status": "rejected", "error": e.detail})
+    
+    if request.wait_seconds > 0:
+        await outbound_queue.wait([message.id for _, message in queued], request.wait_seconds)
+    
+    results = [
+        {**item, "tracking_id": message.id, "status": message.status, "error": message.error}
+        for item, message in queued
+    ] + rejected
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return {"success": not rejected, "summary": summary, "results": results}
+
+@router.get("/email/outbox")
+async def get_outbox(status: Optional[str] = None, limit: int = 50):
+    """Queue statistics and the most recent outbound messages"""
+    messages = [m for m in reversed(outbound_queue.messages.values()) if status is None or m.status == status]
+    return {
+        "success": True,
+        **outbound_queue.stats(),
+        "messages": [m.to_dict() for m in messages[:max(1, min(limit, 500))]]
+    }
+
+@router.get("/email/outbox/{tracking_id}")
+async def get_outbox_message(tracking_id: str):
+    """Delivery status of one queued message"""
+    message = outbound_queue.get(tracking_id)
+    if message is None:
+        raise HTTPException(status_code=404, detail="Unknown tracking id")
+    return {"success": True, **message.to_dict()}
 
 @router.get("/email/inbox")
-async def get_inbox(max_results: int = 10):
-    """Get unread emails from inbox"""
-    emails = email_manager.get_emails(max_results=max_results, query="is:unread")
+async def get_inbox(max_results: int = 10, cursor: Optional[str] = None, unread_only: bool = True,
+                    sender: Optional[str] = None, refresh: bool = False):
+    """
+    Get emails from the local inbox cache, newest first
+    
+    Pass next_cursor back as cursor for the next page. refresh=true syncs
+    with the server first; otherwise the background sync keeps the cache fresh.
+    """
+    if refresh:
+        await sync_inbox()
+    
+    position = None
+    if cursor:
+        try:
+            date_ts, uid = cursor.split(":")
+            position = (float(date_ts), int(uid))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    limit = max(1, min(max_results, INBOX_PAGE_MAX))
+    
+    emails = await run_in_threadpool(
+        mail_cache.list_messages, inbox_sync.mailbox, limit, position, unread_only, sender
+    )
     return {
         "success": True,
         "count": len(emails),
-        "emails": emails
+        "emails": emails,
+        "next_cursor": f"{emails[-1]['date']!r}:{emails[-1]['uid']}" if len(emails) == limit else None,
+        "mailbox": mail_cache.counts(inbox_sync.mailbox)
     }
 
+@router.post("/email/sync")
+async def sync_inbox():
+    """Pull new messages (headers only) and flag changes from the IMAP server"""
+    if not inbox_sync.configured:
+        raise HTTPException(status_code=400, detail="Email service not configured. Set GMAIL_EMAIL and GMAIL_APP_PASSWORD in .env")
+    try:
+        result = await run_in_threadpool(inbox_sync.sync)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"IMAP sync failed: {e}")
+    return {"success": True, **result}
+
+@router.get("/email/messages/{uid}")
+async def get_message(uid: int):
+    """One cached message with its body (downloaded from the server on first read)"""
+    try:
+        message = await run_in_threadpool(inbox_sync.get_message, uid)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Could not fetch message body: {e}")
+    if message is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return {"success": True, "email": message}
+
+@router.get("/email/search")
+async def search_email(q: str, top_k: int = 5):
+    """Semantic search over synced mail, best match first (one result per message)"""
+    if not knowledge_base.is_ready():
+        raise HTTPException(status_code=503, detail="Knowledge base is still loading")
+    top_k = max(1, min(top_k, MAIL_SEARCH_MAX_RESULTS))
+    results = await run_in_threadpool(mail_indexer.search, q, top_k)
+    return {
+        "success": True,
+        "query": q,
+        "count": len(results),
+        "results": results,
+        "index": mail_indexer.status()
+    }
+
+@router.get("/email/index/status")
+async def get_mail_index_status():
+    """Mail embedding backlog and throughput"""
+    return {"success": True, **mail_indexer.status(), "mailbox_counts": mail_cache.counts(inbox_sync.mailbox)}
+
+@router.post("/email/interpret")
+async def interpret_email_task(request: EmailTaskRequest):
+    """
+    Interpret a natural language email task without acting on it
+    
+    Reports which tier answered (cache, rules, llm, or a rule fallback after
+    an LLM timeout/error) and the rule parser's confidence.
+    """
+    if not request.task_description or len(request.task_description.strip()) < 10:
+        raise HTTPException(status_code=400, detail="Task description is too short. Please provide more details.")
+    return {"success": True, **await task_interpreter.interpret(request.task_description)}
+
 @router.post("/email/parse-and-send")
 async def parse_and_send_email(request: EmailTaskRequest):
     """
     Parse natural language description and send email
     
+    Tasks that ask to send are queued for delivery; everything else (the
+    safe default) becomes a draft for review.
+    
     Example:
     {
         "task_description": "Send an email to john@example.com about the project deadline extension"
     }
     """
-    try:
-        # This would integrate with your LLM to parse natural language
-        # For now, return a response showing the capability
+    if not request.task_description or len(request.task_description.strip()) < 10:
+        raise HTTPException(status_code=400, detail="Task description is too short. Please provide more details.")
+    result = await task_interpreter.interpret(request.task_description)
+    if not result["recipient_found"]:
+        raise HTTPException(status_code=400, detail="Could not find a valid email address in your task. Please include the recipient's email address.")
+    
+    email_data = result["email_data"]
+    interpretation = {k: result[k] for k in ("interpretation", "tier", "confidence", "latency_ms")}
+    if result["action"] == "send":
+        require_email_service()
+        message = outbound_queue.enqueue(EmailRequest(**email_data))
         return {
-            "success": False,
-            "message": "Natural language parsing requires LLM integration",
-            "hint": "Use the structured email/send endpoint for direct sending"
+            "success": True,
+            "action": "send",
+            "message": f"Email queued for delivery to {email_data['to']}",
+            "tracking_id": message.id,
+            "status": message.status,
+            "email_data": email_data,
+            **interpretation
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    draft = draft_store.create(email_data)
+    return {
+        "success": True,
+        "action": "draft",
+        "message": "Email draft created. Review and send when ready.",
+        "draft_id": draft["id"],
+        "email_data": email_data,
+        **interpretation
+    }
 
 @router.get("/email/settings")
 async def get_email_settings():
@@ -90,7 +303,9 @@ async def get_email_settings():
         has_credentials = email_manager.service is not None
         return {
             "configured": has_credentials,
-            "message": "Gmail integration is" + (" " if has_credentials else " NOT ") + "configured"
+            "message": "Gmail integration is" + (" " if has_credentials else " NOT ") + "configured",
+            "smtp": email_manager.pool.stats() if email_manager.pool else None,
+            "interpreter": task_interpreter.stats()
         }
     except:
         return {
@@ -109,43 +324,93 @@ class DraftEmail(BaseModel):
     cc: Optional[str] = None
     bcc: Optional[str] = None
 
-# In-memory storage for drafts (in production, use database)
-email_drafts = {}
+class BulkDraftRequest(BaseModel):
+    drafts: List[DraftEmail]
+
+class DraftIdsRequest(BaseModel):
+    draft_ids: List[str]
+
+class SendDraftsRequest(DraftIdsRequest):
+    wait_seconds: float = 0
+
+# Drafts persist in SQLite (see draft_store.py)
+draft_store = DraftStore()
+
+@router.on_event("startup")
+async def recover_drafts():
+    recovered = draft_store.recover_interrupted()
+    if recovered:
+        log.info("drafts_recovered", drafts=recovered)
 
 @router.post("/email/draft")
 async def create_draft(draft: DraftEmail):
     """Create an email draft for review"""
-    draft_id = str(len(email_drafts) + 1)
-    email_drafts[draft_id] = {
-        "id": draft_id,
-        "to": draft.to,
-        "subject": draft.subject,
-        "body": draft.body,
-        "cc": draft.cc,
-        "bcc": draft.bcc,
-        "status": "draft"
-    }
+    created = draft_store.create(draft.dict())
     return {
         "success": True,
-        "draft_id": draft_id,
+        "draft_id": created["id"],
         "message": "Email draft created. Review and send when ready."
     }
 
+@router.post("/email/drafts/bulk")
+async def create_drafts_bulk(request: BulkDraftRequest):
+    """Create many drafts in one transaction"""
+    if len(request.drafts) > EMAIL_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {EMAIL_BULK_MAX_ITEMS} items per request")
+    created = await run_in_threadpool(draft_store.create_many, [d.dict() for d in request.drafts])
+    return {
+        "success": True,
+        "draft_ids": [d["id"] for d in created],
+        "message": f"Created {len(created)} drafts"
+    }
+
 @router.get("/email/drafts")
-async def get_drafts():
-    """Get all email drafts"""
+async def get_drafts(limit: int = 50, cursor: Optional[str] = None, status: Optional[str] = None):
+    """
+    Get email drafts, newest first
+    
+    Pass next_cursor back as cursor for the next page; status filters
+    (draft, queued, sent, failed).
+    """
+    position = None
+    if cursor:
+        try:
+            created_at, draft_id = cursor.split(":")
+            position = (float(created_at), draft_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    limit = max(1, min(limit, DRAFTS_PAGE_MAX))
+    
+    drafts = await run_in_threadpool(draft_store.list_drafts, limit, position, status)
     return {
         "success": True,
-        "drafts": list(email_drafts.values())
+        "count": len(drafts),
+        "drafts": drafts,
+        "next_cursor": f"{drafts[-1]['created_at']!r}:{drafts[-1]['id']}" if len(drafts) == limit else None,
+        "counts": draft_store.counts()
     }
 
-@router.post("/email/draft/{draft_id}/send")
-async def send_draft(draft_id: str):
-    """Send a draft email"""
-    if draft_id not in email_drafts:
+@router.get("/email/draft/{draft_id}")
+async def get_draft(draft_id: str):
+    draft = draft_store.get(draft_id)
+    if draft is None:
+        raise HTTPException(status_code=404, detail="Draft not found")
+    return {"success": True, "draft": draft}
+
+def _draft_delivered(message: OutboundMessage):
+    """Queue callback: record the delivery outcome on the draft"""
+    draft_store.set_status(message.draft_id, message.status, error=message.error, expected_tracking_id=message.id)
+
+def _queue_draft(draft_id: str) -> OutboundMessage:
+    draft = draft_store.get(draft_id)
+    if draft is None:
         raise HTTPException(status_code=404, detail="Draft not found")
+    if not draft_store.claim_for_sending(draft_id):
+        current = draft_store.get(draft_id)
+        if current is not None and current["status"] == "sent":
+            raise HTTPException(status_code=409, detail="Draft was already sent")
+        raise HTTPException(status_code=409, detail="Draft is already queued for sending")
     
-    draft = email_drafts[draft_id]
     email_req = EmailRequest(
         to=draft["to"],
         subject=draft["subject"],
@@ -153,24 +418,43 @@ async def send_draft(draft_id: str):
         cc=draft["cc"],
         bcc=draft["bcc"]
     )
-    
-    result = email_manager.send_email(email_req)
-    
-    if result.success:
-        email_drafts[draft_id]["status"] = "sent"
-        return {
-            "success": True,
-            "message": f"Draft email sent to {draft['to']}",
-            "message_id": result.message_id
-        }
-    else:
-        raise HTTPException(status_code=400, detail=result.error)
+    message = outbound_queue.enqueue(email_req, draft_id=draft_id, on_complete=_draft_delivered)
+    draft_store.set_status(draft_id, "queued", tracking_id=message.id)
+    return message
+
+@router.post("/email/draft/{draft_id}/send")
+async def send_draft(draft_id: str):
+    """Queue a draft email for sending"""
+    require_email_service()
+    message = _queue_draft(draft_id)
+    return {
+        "success": True,
+        "message": f"Draft email queued for delivery to {message.request.to}",
+        "tracking_id": message.id,
+        "status": message.status
+    }
+
+@router.post("/email/drafts/send")
+async def send_drafts_bulk(request: SendDraftsRequest):
+    """Queue many drafts for sending (same as /email/send/bulk with only draft_ids)"""
+    return await send_email_bulk(BulkSendRequest(draft_ids=request.draft_ids, wait_seconds=request.wait_seconds))
 
 @router.delete("/email/draft/{draft_id}")
 async def delete_draft(draft_id: str):
     """Delete an email draft"""
-    if draft_id not in email_drafts:
+    if not draft_store.delete(draft_id):
         raise HTTPException(status_code=404, detail="Draft not found")
-    
-    del email_drafts[draft_id]
     return {"success": True, "message": "Draft deleted"}
+
+@router.post("/email/drafts/delete")
+async def delete_drafts_bulk(request: DraftIdsRequest):
+    """Delete many drafts; ids that don't exist are reported, not treated as errors"""
+    if len(request.draft_ids) > EMAIL_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {EMAIL_BULK_MAX_ITEMS} items per request")
+    deleted = await run_in_threadpool(draft_store.delete_many, request.draft_ids)
+    deleted_set = set(deleted)
+    return {
+        "success": True,
+        "deleted": deleted,
+        "not_found": [i for i in dict.fromkeys(request.draft_ids) if i not in deleted_set]
+    }
@@ -0,0 +1,234 @@
+"""
+Re-index - Online migration of the knowledge base to a new embedding model
+
+The job builds a new collection version from the stored chunk texts of the
+active one, in throttled batches on a background thread. Queries keep using
+the active version the whole time; uploads and deletes made while the job
+runs are mirrored into the new version. When the copy finishes the active
+version is switched atomically (knowledge_base.activate_version).
+
+Each copied batch is checked against the source under the write lock
+before it is stored, so a chunk deleted or rewritten after the batch was
+read is not brought back with stale content. A cancelled or failed job
+drops the half-built version.
+
+A version that is not active receives no writes, so switching to one
+later (a build with cutover=False, or a rollback) runs a catch-up job
+first: the same mirroring and reconcile pass against the active version,
+re-embedding only the chunks that differ, then the cutover.
+"""
+import threading
+import time
+from typing import Optional
+
+from config import REINDEX_BATCH_SIZE, REINDEX_BATCH_DELAY_SECONDS, EMBEDDING_BACKEND
+import knowledge_base
+from embeddings import create_backend
+from metrics import counter
+from structured_logging import get_logger
+
+log = get_logger("reindex")
+
+REINDEXED_CHUNKS = counter("jarvis_reindexed_chunks_total", "Chunks re-embedded into a new collection version")
+
+
+class ReindexJob:
+    """One background re-embed of the active collection into a new model version"""
+
+    def __init__(self, model_name: str, batch_size: int = REINDEX_BATCH_SIZE,
+                 delay_seconds: float = REINDEX_BATCH_DELAY_SECONDS, cutover: bool = True,
+                 target: Optional[str] = None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.delay_seconds = delay_seconds
+        self.cutover = cutover
+        self.source = knowledge_base.active_version()["name"]
+        self.target = target  # An existing version to catch up, or None to build a new one
+        self._created = target is None
+        self.state = "pending"
+        self.total = 0
+        self.processed = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="knowledge-base-reindex", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def running(self) -> bool:
+        return self.state in ("pending", "loading_model", "copying", "reconciling", "cutover")
+
+    def _run(self):
+        self.started_at = time.time()
+        try:
+            self.state = "loading_model"
+            backend = create_backend(EMBEDDING_BACKEND, self.model_name)
+            if self._created:
+                self.target, target_collection = knowledge_base.create_version(self.model_name)
+            else:
+                target_collection = knowledge_base.open_version(self.target)
+
+            # Mirror live writes before copying, so nothing written during the copy is missed
+            knowledge_base.set_shadow(target_collection, backend)
+            source_collection = knowledge_base.get_collection()
+            self.total = source_collection.count()
+
+            if self._created:
+                self.state = "copying"
+                for batch in knowledge_base.iter_batches(self.batch_size, include=["documents", "metadatas"]):
+                    if self._cancel.is_set():
+                        self._abandon()
+                        self.state = "cancelled"
+                        return
+                    self._copy(source_collection, target_collection, backend, batch)
+                    self._throttle()
+
+            # Offset paging can skip rows when chunks are deleted mid-copy; fill any gaps.
+            # For an existing version this is the whole catch-up.
+            self.state = "reconciling"
+            self._reconcile(source_collection, target_collection, backend)
+            if self._cancel.is_set():
+                self._abandon()
+                self.state = "cancelled"
+                return
+
+            if self.cutover:
+                self.state = "cutover"
+                knowledge_base.activate_version(self.target, collection=target_collection, backend=backend)
+                self.state = "completed"
+            else:
+                # No writes reach the version from here on; activating it later catches it up again
+                knowledge_base.clear_shadow()
+                self.state = "built"
+        except Exception as e:
+            self._abandon()
+            self.error = str(e)
+            self.state = "failed"
+            log.error("reindex_failed", model=self.model_name, target=self.target, error=str(e), exc_info=True)
+        finally:
+            self.finished_at = time.time()
+
+    def _throttle(self):
+        # Throttle so re-embedding doesn't starve query traffic of CPU
+        if self.delay_seconds > 0:
+            time.sleep(self.delay_seconds)
+
+    def _copy(self, source_collection, target_collection, backend, rows: dict):
+        """Embed source rows and store the ones the source still holds unchanged"""
+        embeddings = backend.encode(rows["documents"]).tolist()
+        # Live writes hold this lock across the source write and its mirror, so rows changed since
+        # they were read are already in the target in their new form (or gone) and are skipped
+        with knowledge_base.write_lock():
+            current = source_collection.get(ids=rows["ids"], include=["documents", "metadatas"])
+            now = {chunk_id: (document, metadata) for chunk_id, document, metadata
+                   in zip(current["ids"], current["documents"], current["metadatas"])}
+            keep = [i for i, chunk_id in enumerate(rows["ids"])
+                    if now.get(chunk_id) == (rows["documents"][i], rows["metadatas"][i])]
+            if keep:
+                target_collection.upsert(
+                    ids=[rows["ids"][i] for i in keep],
+                    embeddings=[embeddings[i] for i in keep],
+                    documents=[rows["documents"][i] for i in keep],
+                    metadatas=[rows["metadatas"][i] for i in keep],
+                )
+        self.processed += len(keep)
+        REINDEXED_CHUNKS.inc(len(keep))
+
+    def _reconcile(self, source_collection, target_collection, backend):
+        # Source rows the target lacks or holds in another form (skipped by the copy, or written since)
+        for batch in knowledge_base.iter_batches(self.batch_size, include=["documents", "metadatas"]):
+            if self._cancel.is_set():
+                return
+            held = target_collection.get(ids=batch["ids"], include=["documents", "metadatas"])
+            held = {chunk_id: (document, metadata) for chunk_id, document, metadata
+                    in zip(held["ids"], held["documents"], held["metadatas"])}
+            differ = [i for i, chunk_id in enumerate(batch["ids"])
+                      if held.get(chunk_id) != (batch["documents"][i], batch["metadatas"][i])]
+            if differ:
+                self._copy(source_collection, target_collection, backend, {
+                    key: [batch[key][i] for i in differ] for key in ("ids", "documents", "metadatas")
+                })
+                self._throttle()
+
+        # Target rows the source no longer has
+        stale = []
+        for batch in knowledge_base.iter_batches(self.batch_size, include=[], collection=target_collection):
+            present = set(source_collection.get(ids=batch["ids"], include=[]).get("ids") or [])
+            stale.extend(chunk_id for chunk_id in batch["ids"] if chunk_id not in present)
+        for offset in range(0, len(stale), self.batch_size):
+            chunk_ids = stale[offset:offset + self.batch_size]
+            with knowledge_base.write_lock():
+                present = set(source_collection.get(ids=chunk_ids, include=[]).get("ids") or [])
+                gone = [chunk_id for chunk_id in chunk_ids if chunk_id not in present]
+                if gone:
+                    target_collection.delete(ids=gone)
+
+    def _abandon(self):
+        """Stop mirroring and drop the half-built version, so no orphaned collection is left behind"""
+        knowledge_base.clear_shadow()
+        if self.target and self._created:
+            try:
+                knowledge_base.drop_version(self.target)
+            except Exception as e:
+                log.error("reindex_drop_failed", target=self.target, error=str(e))
+
+    def status(self) -> dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        return {
+            "state": self.state,
+            "model": self.model_name,
+            "source": self.source,
+            "target": self.target,
+            "processed": self.processed,
+            "total": self.total,
+            "chunks_per_second": round(self.processed / elapsed, 2) if elapsed > 0 else None,
+            "error": self.error,
+        }
+
+
+_current_job: Optional[ReindexJob] = None
+_job_lock = threading.Lock()
+
+
+def start_reindex(model_name: str, batch_size: int = REINDEX_BATCH_SIZE,
+                  delay_seconds: float = REINDEX_BATCH_DELAY_SECONDS, cutover: bool = True) -> ReindexJob:
+    """Start a re-index job; raises RuntimeError if one is already running"""
+    global _current_job
+    with _job_lock:
+        if _current_job is not None and _current_job.running:
+            raise RuntimeError("A re-index is already running")
+        _current_job = ReindexJob(model_name, batch_size, delay_seconds, cutover)
+        _current_job.start()
+        return _current_job
+
+
+def start_activation(name: str, batch_size: int = REINDEX_BATCH_SIZE) -> ReindexJob:
+    """
+    Catch an inactive version up with the active one, then switch to it
+
+    Raises KeyError for an unknown version and RuntimeError if a re-index
+    is already running.
+    """
+    global _current_job
+    with _job_lock:
+        if _current_job is not None and _current_job.running:
+            raise RuntimeError("A re-index is running")
+        model_name = knowledge_base.list_versions()["versions"][name]["model"]
+        _current_job = ReindexJob(model_name, batch_size, delay_seconds=0, target=name)
+        _current_job.start()
+        return _current_job
+
+
+def current_job() -> Optional[ReindexJob]:
+    return _current_job
@@ -0,0 +1,225 @@
+"""
+Session Index - In-memory vector index per conversation
+
+Session-scoped retrieval only ever searches the few hundred chunks uploaded
+in one conversation. Instead of a metadata-filtered query over the whole
+shared Chroma collection, each session keeps its chunk embeddings in one
+contiguous float32 matrix, so a query is a single matrix-vector product.
+Idle sessions are evicted least-recently-used first to stay under a memory cap.
+
+Doc ids come from the client, so a tenant-scoped query only loads and
+searches documents tagged with that tenant.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from config import SESSION_INDEX_MAX_BYTES, SESSION_INDEX_IDLE_SECONDS
+from metrics import gauge, record_cache
+
+SESSION_INDEX_BYTES = gauge("jarvis_session_index_bytes", "Memory held by per-session vector indexes")
+SESSION_INDEX_SESSIONS = gauge("jarvis_session_index_sessions", "Conversations with a loaded session index")
+
+
+class SessionIndex:
+    """Embeddings, texts and metadata for the documents of one conversation"""
+
+    def __init__(self):
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.doc_ids = np.zeros((0,), dtype=object)
+        self.documents: List[str] = []
+        self.metadatas: List[dict] = []
+        self.loaded_docs = set()
+        self.doc_tenants: Dict[str, Optional[str]] = {}
+        self.last_used = time.time()
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + sum(len(d) for d in self.documents)
+
+    def add(self, doc_id: str, embeddings, documents: List[str], metadatas: List[dict]):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if len(documents):
+            if self.matrix.size == 0:
+                matrix = vectors
+            else:
+                matrix = np.vstack([self.matrix, vectors])
+            # Rebuild rather than mutate so concurrent queries keep a consistent snapshot
+            self.matrix = np.ascontiguousarray(matrix)
+            self.doc_ids = np.concatenate([self.doc_ids, np.full(len(documents), doc_id, dtype=object)])
+            self.documents = self.documents + list(documents)
+            self.metadatas = self.metadatas + list(metadatas)
+        self.loaded_docs.add(doc_id)
+        self.doc_tenants[doc_id] = metadatas[0].get("tenant") if len(metadatas) else None
+
+    def remove(self, doc_id: str):
+        if doc_id not in self.loaded_docs:
+            return
+        keep = self.doc_ids != doc_id
+        self.matrix = np.ascontiguousarray(self.matrix[keep]) if self.matrix.size else self.matrix
+        self.doc_ids = self.doc_ids[keep]
+        self.documents = [d for d, k in zip(self.documents, keep) if k]
+        self.metadatas = [m for m, k in zip(self.metadatas, keep) if k]
+        self.loaded_docs.discard(doc_id)
+        self.doc_tenants.pop(doc_id, None)
+
+    def covers(self, doc_ids: Iterable[str]) -> bool:
+        return all(doc_id in self.loaded_docs for doc_id in doc_ids)
+
+    def query(self, query_embedding, doc_ids: List[str], top_k: int) -> dict:
+        """Top-k by inner product (equivalent to L2 ranking on unit vectors), in Chroma result shape"""
+        matrix, row_doc_ids, documents, metadatas = self.matrix, self.doc_ids, self.documents, self.metadatas
+        if matrix.size == 0:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+        scores = matrix @ np.asarray(query_embedding, dtype=np.float32)
+        if set(doc_ids) != self.loaded_docs:
+            scores = np.where(np.isin(row_doc_ids, list(doc_ids)), scores, -np.inf)
+
+        k = min(top_k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return {
+            "ids": [[f"{metadatas[i].get('doc_id')}_chunk_{metadatas[i].get('chunk_id')}" for i in top]],
+            "documents": [[documents[i] for i in top]],
+            "metadatas": [[metadatas[i] for i in top]],
+            # Squared L2 distance between unit vectors, as Chroma reports it
+            "distances": [[float(2 - 2 * scores[i]) for i in top]],
+        }
+
+
+class SessionIndexCache:
+    """LRU of SessionIndex objects bounded by total memory"""
+
+    def __init__(self, max_bytes: int = SESSION_INDEX_MAX_BYTES, idle_seconds: float = SESSION_INDEX_IDLE_SECONDS):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, SessionIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _total_bytes(self) -> int:
+        return sum(index.nbytes for index in self._sessions.values())
+
+    def _evict(self, keep: Optional[str] = None):
+        """Drop idle sessions, then least-recently-used ones while over the cap (caller holds the lock)"""
+        now = time.time()
+        for conv_id in list(self._sessions):
+            if conv_id != keep and now - self._sessions[conv_id].last_used > self.idle_seconds:
+                del self._sessions[conv_id]
+        total = self._total_bytes()
+        while total > self.max_bytes and len(self._sessions) > 1:
+            conv_id = next(iter(self._sessions))
+            if conv_id == keep:
+                self._sessions.move_to_end(conv_id)
+                conv_id = next(iter(self._sessions))
+            total -= self._sessions.pop(conv_id).nbytes
+        SESSION_INDEX_BYTES.set(total)
+        SESSION_INDEX_SESSIONS.set(len(self._sessions))
+
+    def add_document(self, conversation_id: str, doc_id: str, embeddings, documents: List[str], metadatas: List[dict]):
+        with self._lock:
+            index = self._sessions.get(conversation_id)
+            if index is None:
+                index = SessionIndex()
+                self._sessions[conversation_id] = index
+            index.add(doc_id, embeddings, documents, metadatas)
+            index.last_used = time.time()
+            self._sessions.move_to_end(conversation_id)
+            self._evict(keep=conversation_id)
+
+    def remove_document(self, doc_id: str):
+        with self._lock:
+            for index in self._sessions.values():
+                index.remove(doc_id)
+            self._evict()
+
+    def drop(self, conversation_id: str):
+        with self._lock:
+            self._sessions.pop(conversation_id, None)
+            self._evict()
+
+    def clear(self):
+        """Drop every session, e.g. after the embedding model changed"""
+        with self._lock:
+            self._sessions.clear()
+            self._evict()
+
+    def query(self, conversation_id: str, doc_ids: List[str], query_embedding, top_k: int,
+              tenant: Optional[str] = None) -> Optional[dict]:
+        """
+        Query a session, loading any documents it doesn't hold yet from the vector store
+
+        With a tenant, documents of other tenants are neither loaded nor searched.
+        Returns None if the session could not be held in memory (caller falls back to Chroma).
+        """
+        with self._lock:
+            index = self._sessions.get(conversation_id)
+            hit = index is not None and index.covers(doc_ids)
+        record_cache("session_index", hit=hit)
+
+        if not hit:
+            missing = [d for d in doc_ids if index is None or d not in index.loaded_docs]
+            for doc_id, chunks in _load_documents(missing, tenant).items():
+                self.add_document(conversation_id, doc_id, chunks["embeddings"], chunks["documents"], chunks["metadatas"])
+            with self._lock:
+                index = self._sessions.get(conversation_id)
+            if index is None:
+                return None
+
+        with self._lock:
+            index.last_used = time.time()
+            if conversation_id in self._sessions:
+                self._sessions.move_to_end(conversation_id)
+            if tenant:
+                doc_ids = [doc_id for doc_id in doc_ids if index.doc_tenants.get(doc_id) == tenant]
+        return index.query(query_embedding, doc_ids, top_k)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._total_bytes(),
+                "max_bytes": self.max_bytes,
+                "chunks": sum(len(index.documents) for index in self._sessions.values()),
+            }
+
+
+def _load_documents(doc_ids: List[str], tenant: Optional[str] = None) -> Dict[str, dict]:
+    """
+    Fetch stored chunks for documents (e.g. after a restart) grouped by doc_id
+
+    Without a tenant every requested doc_id gets an entry, empty if it isn't
+    stored. With one, only the tenant's documents are returned, so another
+    tenant's doc_id is not recorded as loaded for the session.
+    """
+    from knowledge_base import get_collection
+
+    grouped: Dict[str, dict] = {doc_id: {"embeddings": [], "documents": [], "metadatas": []} for doc_id in doc_ids}
+    if not doc_ids:
+        return grouped
+    where = {"doc_id": {"$in": list(doc_ids)}}
+    results = get_collection().get(
+        where={"$and": [where, {"tenant": tenant}]} if tenant else where,
+        include=["embeddings", "documents", "metadatas"],
+    )
+    rows = sorted(
+        zip(results["embeddings"] or [], results["documents"] or [], results["metadatas"] or []),
+        key=lambda row: (row[2].get("doc_id", ""), row[2].get("chunk_id", 0)),
+    )
+    for embedding, document, metadata in rows:
+        group = grouped.get(metadata.get("doc_id"))
+        if group is not None:
+            group["embeddings"].append(embedding)
+            group["documents"].append(document)
+            group["metadatas"].append(metadata)
+    if tenant:
+        return {doc_id: group for doc_id, group in grouped.items() if group["documents"]}
+    return grouped
+
+
+session_indexes = SessionIndexCache()
@@ -0,0 +1,352 @@
+"""
+Shards - Knowledge base split across several Chroma collections
+
+A sharded collection version is a set of Chroma collections (shards),
+which may sit in different directories (KB_SHARD_PATHS, e.g. one per
+disk). ShardedCollection implements the part of the Chroma collection API
+the backend uses (upsert, get, delete, query, count), so callers of
+knowledge_base.get_collection() work the same with or without shards.
+
+Writes go to one shard, chosen by the version's shard key:
+- tenant: one shard per tenant ("tenant" metadata; documents without one
+  share a shard)
+- hash: the doc_id, hashed onto a fixed number of shards
+- time: the period the document was first uploaded in (from its doc_id),
+  one shard per period
+
+Reads go to every shard a filter can match, in parallel on a shared
+thread pool. A doc_id filter selects one shard under hash and time, and a
+tenant filter selects that tenant's shard, which then runs the query
+without the tenant condition (Chroma's metadata filters get slower with
+the number of rows, an unfiltered HNSW search hardly does). Each shard
+returns its own top k and the lists are merged by distance. hnswlib and
+SQLite release the GIL, so with several cores the shard queries overlap.
+"""
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from config import KB_SHARD_QUERY_WORKERS
+from metrics import counter, histogram
+
+SHARD_KEYS = ("tenant", "hash", "time")
+
+SHARD_OPERATIONS = counter(
+    "jarvis_kb_shard_operations_total", "Knowledge base operations on a sharded version", ("operation",)
+)
+SHARD_FANOUT = histogram(
+    "jarvis_kb_shard_fanout",
+    "Shards read per knowledge base operation",
+    ("operation",),
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+_DOC_TIMESTAMP = re.compile(r"^doc_(\d+)_")
+_INCLUDE_KEYS = ("embeddings", "metadatas", "documents")
+MAX_NAME_LENGTH = 63  # Chroma collection names
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=KB_SHARD_QUERY_WORKERS, thread_name_prefix="kb-shard")
+    return _executor
+
+
+def doc_id_of(chunk_id: str) -> str:
+    """doc_id of a chunk id ({doc_id}_chunk_{i})"""
+    return chunk_id.rsplit("_chunk_", 1)[0]
+
+
+def doc_timestamp(doc_id: str) -> Optional[int]:
+    """Upload time encoded in a doc_id (doc_{timestamp}_{suffix}), if any"""
+    match = _DOC_TIMESTAMP.match(doc_id)
+    return int(match.group(1)) if match else None
+
+
+def _digest(value: str, size: int) -> str:
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=size).hexdigest()
+
+
+def shard_name(version: str, suffix: str) -> str:
+    """Collection name of a version's shard (long version names are replaced by a digest)"""
+    name = f"{version}_{suffix}"
+    if len(name) > MAX_NAME_LENGTH:
+        name = f"kb_{_digest(version, 4)}_{suffix}"
+    return name
+
+
+def _values(condition) -> Optional[List]:
+    """Values an equality / $eq / $in condition allows, or None for other operators"""
+    if isinstance(condition, dict):
+        if "$eq" in condition:
+            return [condition["$eq"]]
+        if "$in" in condition:
+            return list(condition["$in"])
+        return None
+    return [condition]
+
+
+def matching_count(collection, where: Optional[dict] = None) -> int:
+    """Rows of one collection matching a filter"""
+    if where is None:
+        return collection.count()
+    return len(collection.get(where=where, include=[]).get("ids") or [])
+
+
+class ShardedCollection:
+    """Chroma collection look-alike over the shards of one collection version"""
+
+    def __init__(self, name: str, metadata: dict, sharding: dict, shards: Dict[str, object],
+                 create_shard: Callable[[str], object]):
+        self.name = name
+        self.metadata = metadata
+        self.key = sharding["key"]
+        if self.key not in SHARD_KEYS:
+            raise ValueError(f"Unknown shard key {self.key!r}; expected one of {SHARD_KEYS}")
+        self.shard_count = int(sharding.get("count", 1))
+        self.period_seconds = int(sharding.get("period_days", 30)) * 86400
+        self._shards = dict(shards)  # shard name -> Chroma collection
+        self._create_shard = create_shard
+        self._lock = threading.Lock()
+
+    # Routing
+
+    def shards(self) -> List[Tuple[str, object]]:
+        """(name, collection) of every shard, in a stable order"""
+        with self._lock:
+            return sorted(self._shards.items(), key=lambda item: item[0])
+
+    def _shard_name(self, suffix: str) -> str:
+        return shard_name(self.name, suffix)
+
+    def _hashed(self, value: str) -> str:
+        # blake2b rather than crc32: CRC is linear, so ids differing in a few characters cluster modulo small counts
+        return self._shard_name(f"s{int(_digest(value, 8), 16) % self.shard_count:02d}")
+
+    def _tenant_shard(self, tenant) -> str:
+        # 48-bit digest: tenant names may use any characters, and two tenants sharing a shard is vanishingly rare
+        return self._shard_name(f"u{_digest(str(tenant or ''), 6)}")
+
+    def shard_for_document(self, doc_id: str) -> Optional[str]:
+        """Shard holding a document, when the doc_id alone decides it"""
+        if self.key == "hash":
+            return self._hashed(doc_id)
+        if self.key == "time":
+            timestamp = doc_timestamp(doc_id)
+            return self._shard_name(f"t{timestamp // self.period_seconds}") if timestamp is not None else None
+        return None
+
+    def shard_for_write(self, chunk_id: str, metadata: Optional[dict]) -> str:
+        metadata = metadata or {}
+        doc_id = metadata.get("doc_id") or doc_id_of(chunk_id)
+        if self.key == "tenant":
+            return self._tenant_shard(metadata.get("tenant"))
+        name = self.shard_for_document(doc_id)
+        if name is None:  # time key, doc_id without a timestamp
+            name = self._shard_name(f"t{int(metadata.get('timestamp', 0)) // self.period_seconds}")
+        return name
+
+    def _route_where(self, where: Optional[dict]) -> Optional[Set[str]]:
+        """Shards a filter can match, or None when it could match any"""
+        if not where:
+            return None
+        if "$and" in where:
+            for condition in where["$and"]:
+                names = self._route_where(condition)
+                if names is not None:
+                    return names
+            return None
+        if self.key == "tenant" and "tenant" in where:
+            tenants = _values(where["tenant"])
+            return None if tenants is None else {self._tenant_shard(tenant) for tenant in tenants}
+        if self.key in ("hash", "time") and "doc_id" in where:
+            doc_ids = _values(where["doc_id"])
+            if doc_ids is None:
+                return None
+            names = {self.shard_for_document(doc_id) for doc_id in doc_ids}
+            return None if None in names else names
+        return None
+
+    def _shard_where(self, where: Optional[dict]) -> Optional[dict]:
+        """Filter to run on a routed shard: a tenant shard holds only its tenant, so that condition goes"""
+        if self.key != "tenant" or not where:
+            return where
+        if "tenant" in where:
+            return where if _values(where["tenant"]) is None else None
+        if "$and" in where:
+            rest = [c for c in where["$and"] if not ("tenant" in c and _values(c["tenant"]) is not None)]
+            if len(rest) == len(where["$and"]):
+                return where
+            return {"$and": rest} if len(rest) > 1 else (rest[0] if rest else None)
+        return where
+
+    def _targets(self, where: Optional[dict]) -> List[Tuple[str, object]]:
+        names = self._route_where(where)
+        shards = self.shards()
+        return shards if names is None else [(name, shard) for name, shard in shards if name in names]
+
+    def _shard(self, name: str):
+        with self._lock:
+            shard = self._shards.get(name)
+            if shard is None:
+                shard = self._create_shard(name)  # New time period
+                self._shards[name] = shard
+            return shard
+
+    def _group_ids(self, ids: List[str]) -> Tuple[Dict[str, List[str]], List[str]]:
+        """Chunk ids by the shard their doc_id decides, plus the ids that could be anywhere"""
+        grouped: Dict[str, List[str]] = {}
+        unrouted = []
+        for chunk_id in ids:
+            name = self.shard_for_document(doc_id_of(chunk_id))
+            if name is None:
+                unrouted.append(chunk_id)
+            else:
+                grouped.setdefault(name, []).append(chunk_id)
+        return grouped, unrouted
+
+    @staticmethod
+    def _fan_out(operation: str, fn: Callable, items: List) -> List:
+        """fn applied to one item per shard, in parallel when there are several"""
+        SHARD_OPERATIONS.inc(operation=operation)
+        SHARD_FANOUT.observe(len(items), operation=operation)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        return list(_pool().map(fn, items))
+
+    # Chroma collection API
+
+    def count(self) -> int:
+        return sum(self._fan_out("count", lambda shard: shard.count(), [shard for _, shard in self.shards()]))
+
+    def upsert(self, ids: List[str], embeddings=None, documents=None, metadatas=None):
+        batches: Dict[str, List[int]] = {}
+        for i, chunk_id in enumerate(ids):
+            name = self.shard_for_write(chunk_id, metadatas[i] if metadatas else None)
+            batches.setdefault(name, []).append(i)
+
+        def pick(values, rows):
+            return None if values is None else [values[i] for i in rows]
+
+        writes = [(self._shard(name), rows) for name, rows in batches.items()]
+        self._fan_out("upsert", lambda item: item[0].upsert(
+            ids=pick(ids, item[1]), embeddings=pick(embeddings, item[1]),
+            documents=pick(documents, item[1]), metadatas=pick(metadatas, item[1]),
+        ), writes)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[dict] = None):
+        if ids is not None:
+            grouped, unrouted = self._group_ids(ids)
+            shards = dict(self.shards())
+            targets = [(shards[name], chunk_ids) for name, chunk_ids in grouped.items() if name in shards]
+            if unrouted:
+                targets += [(shard, unrouted) for shard in shards.values()]
+            self._fan_out("delete", lambda item: item[0].delete(ids=item[1], where=where), targets)
+            return
+        shard_where = self._shard_where(where)
+        targets = [shard for _, shard in self._targets(where)]
+        self._fan_out("delete", lambda shard: shard.delete(where=shard_where), targets)
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Optional[List[str]] = None) -> dict:
+        include = ["metadatas", "documents"] if include is None else include
+        if ids is not None:
+            grouped, unrouted = self._group_ids(ids)
+            shards = self.shards()
+            targets = [(name, shard) for name, shard in shards if unrouted or name in grouped]
+            wanted = {name: grouped.get(name, []) + unrouted for name, _ in targets}
+            shard_where = where
+        else:
+            targets = self._targets(where)
+            wanted = None
+            shard_where = self._shard_where(where)
+
+        if not limit and not offset:
+            parts = self._fan_out("get", lambda item: item[1].get(
+                ids=wanted[item[0]] if wanted is not None else None, where=shard_where, include=include
+            ), targets)
+            return self._concat(parts, include)
+
+        # Positional paging: the shards form one sequence, in shard name order
+        SHARD_OPERATIONS.inc(operation="get_page")
+        skip = offset or 0
+        remaining = limit
+        parts = []
+        for name, shard in targets:
+            shard_ids = wanted[name] if wanted is not None else None
+            if skip:
+                size = len(shard.get(ids=shard_ids, where=shard_where, include=[])["ids"]) \
+                    if shard_ids is not None else matching_count(shard, shard_where)
+                if skip >= size:
+                    skip -= size
+                    continue
+            part = shard.get(ids=shard_ids, where=shard_where, limit=remaining, offset=skip or None, include=include)
+            skip = 0
+            parts.append(part)
+            if remaining is not None:
+                remaining -= len(part["ids"])
+                if remaining <= 0:
+                    break
+        return self._concat(parts, include)
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[dict] = None,
+              include: Optional[List[str]] = None) -> dict:
+        """
+        Top n_results over the matching shards
+
+        Shards return ids and distances only; documents and metadata are then
+        read for the merged winners, so a fan-out over N shards loads n_results
+        rows instead of N * n_results.
+        """
+        include = ["metadatas", "documents", "distances"] if include is None else list(include)
+        targets = [shard for _, shard in self._targets(where)]
+        shard_where = self._shard_where(where)
+        parts = self._fan_out("query", lambda shard: shard.query(
+            query_embeddings=query_embeddings, n_results=n_results, where=shard_where, include=["distances"]
+        ), targets)
+
+        rows = []  # Per query embedding: [(distance, chunk_id, shard index)]
+        for row in range(len(query_embeddings)):
+            hits = [(distance, chunk_id, index)
+                    for index, part in enumerate(parts)
+                    for chunk_id, distance in zip(part["ids"][row], part["distances"][row])]
+            rows.append(sorted(hits, key=lambda hit: hit[0])[:n_results])
+
+        fields = [key for key in _INCLUDE_KEYS if key in include]
+        found: Dict[str, tuple] = {}
+        if fields:
+            winners: Dict[int, Set[str]] = {}
+            for hits in rows:
+                for _, chunk_id, index in hits:
+                    winners.setdefault(index, set()).add(chunk_id)
+            fetched = self._fan_out("query_fetch", lambda item: targets[item[0]].get(
+                ids=sorted(item[1]), include=fields
+            ), list(winners.items()))
+            for part in fetched:
+                for i, chunk_id in enumerate(part["ids"]):
+                    found[chunk_id] = tuple(part[key][i] for key in fields)
+
+        merged = {
+            "ids": [[hit[1] for hit in hits] for hits in rows],
+            "distances": [[hit[0] for hit in hits] for hits in rows] if "distances" in include else None,
+        }
+        for key in _INCLUDE_KEYS:
+            merged[key] = None
+        for position, key in enumerate(fields):
+            merged[key] = [[found[hit[1]][position] for hit in hits] for hits in rows]
+        return merged
+
+    @staticmethod
+    def _concat(parts: List[dict], include: List[str]) -> dict:
+        result = {"ids": [chunk_id for part in parts for chunk_id in part["ids"]]}
+        for key in _INCLUDE_KEYS:
+            result[key] = [value for part in parts for value in (part[key] or [])] if key in include else None
+        return result
@@ -1,17 +1,26 @@
 """
 Simple Email Manager - Uses Gmail App Password (No OAuth needed)
 This is faster for testing and development
+
+SMTP sessions are pooled (see smtp_pool.py). Point SMTP_HOST/SMTP_PORT at a
+local stub with SMTP_SECURITY=none to test without Gmail.
 """
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from email.utils import make_msgid
 from pydantic import BaseModel
 from typing import Optional
 import os
 from dotenv import load_dotenv
 
+from config import SMTP_POOL_SIZE, SMTP_IDLE_TIMEOUT_SECONDS, SMTP_HEALTHCHECK_AFTER_SECONDS, SMTP_TIMEOUT_SECONDS
+from smtp_pool import SMTPConnectionPool
+from structured_logging import get_logger
+
 load_dotenv()
 
+log = get_logger("email")
+
 class EmailRequest(BaseModel):
     to: str
     subject: str
@@ -27,26 +36,79 @@ class EmailResponse(BaseModel):
 class SimpleEmailManager:
     """Simple email manager using Gmail App Password"""
     
-    def __init__(self, email: Optional[str] = None, app_password: Optional[str] = None):
+    def __init__(self, email: Optional[str] = None, app_password: Optional[str] = None,
+                 smtp_host: Optional[str] = None, smtp_port: Optional[int] = None,
+                 smtp_security: Optional[str] = None):
         """
         Initialize email manager
         
         Args:
             email: Gmail address (default from .env GMAIL_EMAIL)
             app_password: Gmail app password (default from .env GMAIL_APP_PASSWORD)
+            smtp_host: SMTP server (default from .env SMTP_HOST, else smtp.gmail.com)
+            smtp_port: SMTP port (default from .env SMTP_PORT, else 465)
+            smtp_security: "ssl", "starttls" or "none" (default from .env SMTP_SECURITY, else ssl)
         """
         self.email = email or os.getenv('GMAIL_EMAIL')
         self.app_password = app_password or os.getenv('GMAIL_APP_PASSWORD')
+        self.smtp_host = smtp_host or os.getenv('SMTP_HOST', 'smtp.gmail.com')
+        self.smtp_port = int(smtp_port or os.getenv('SMTP_PORT', '465'))
+        self.smtp_security = smtp_security or os.getenv('SMTP_SECURITY', 'ssl')
         self.service = None
+        self.pool = None
         
         if self.email and self.app_password:
             self.service = 'configured'
-            print(f"✓ Email service configured for {self.email}")
+            self.pool = SMTPConnectionPool(
+                self.smtp_host, self.smtp_port, self.email, self.app_password,
+                security=self.smtp_security,
+                size=SMTP_POOL_SIZE,
+                idle_timeout=SMTP_IDLE_TIMEOUT_SECONDS,
+                healthcheck_after=SMTP_HEALTHCHECK_AFTER_SECONDS,
+                timeout=SMTP_TIMEOUT_SECONDS
+            )
+            log.info("email_service_configured", host=self.smtp_host, port=self.smtp_port)
         else:
-            print("⚠ Email service not configured. Set GMAIL_EMAIL and GMAIL_APP_PASSWORD in .env")
+            log.warning("email_service_not_configured", hint="Set GMAIL_EMAIL and GMAIL_APP_PASSWORD in .env")
+    
+    def deliver(self, email_req: EmailRequest) -> str:
+        """
+        Build and send one message (blocking; call from a threadpool in async code)
+        
+        Returns the message id; raises smtplib/socket errors so callers can tell
+        transient failures from permanent ones (see email_queue.py).
+        """
+        if not self.service:
+            raise RuntimeError("Email service not configured. Set GMAIL_EMAIL and GMAIL_APP_PASSWORD in .env")
+        
+        # Create message
+        msg = MIMEMultipart()
+        msg['From'] = self.email
+        msg['To'] = email_req.to
+        msg['Subject'] = email_req.subject
+        msg['Message-ID'] = make_msgid(domain=self.email.split('@')[-1])
+        
+        if email_req.cc:
+            msg['Cc'] = email_req.cc
+        if email_req.bcc:
+            msg['Bcc'] = email_req.bcc
+        
+        # Attach body
+        msg.attach(MIMEText(email_req.body, 'plain'))
+        
+        # Get all recipients
+        recipients = [email_req.to]
+        if email_req.cc:
+            recipients.extend(email_req.cc.split(','))
+        if email_req.bcc:
+            recipients.extend(email_req.bcc.split(','))
+        
+        # Send over a pooled, already logged-in session
+        self.pool.sendmail(self.email, recipients, msg.as_string())
+        return msg['Message-ID']
     
     def send_email(self, email_req: EmailRequest) -> EmailResponse:
-        """Send an email via Gmail SMTP"""
+        """Send an email via Gmail SMTP (blocking; call from a threadpool in async code)"""
         
         if not self.service:
             return EmailResponse(
@@ -55,37 +117,10 @@ class SimpleEmailManager:
             )
         
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = self.email
-            msg['To'] = email_req.to
-            msg['Subject'] = email_req.subject
-            
-            if email_req.cc:
-                msg['Cc'] = email_req.cc
-            if email_req.bcc:
-                msg['Bcc'] = email_req.bcc
-            
-            # Attach body
-            msg.attach(MIMEText(email_req.body, 'plain'))
-            
-            # Send via Gmail SMTP
-            server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
-            server.login(self.email, self.app_password)
-            
-            # Get all recipients
-            recipients = [email_req.to]
-            if email_req.cc:
-                recipients.extend(email_req.cc.split(','))
-            if email_req.bcc:
-                recipients.extend(email_req.bcc.split(','))
-            
-            server.sendmail(self.email, recipients, msg.as_string())
-            server.quit()
-            
+            message_id = self.deliver(email_req)
             return EmailResponse(
                 success=True,
-                message_id=f"sent_to_{email_req.to}",
+                message_id=message_id,
                 error=None
             )
         
@@ -95,12 +130,10 @@ class SimpleEmailManager:
                 error=str(e)
             )
     
-    def get_emails(self, max_results: int = 10) -> list:
-        """
-        Note: Getting emails requires IMAP or OAuth
-        For now, this is a placeholder
-        """
-        return []
+    def close(self):
+        """Close pooled SMTP sessions"""
+        if self.pool is not None:
+            self.pool.close_all()
 
 # Create global instance
 email_manager = None
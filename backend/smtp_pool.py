@@ -0,0 +1,170 @@
+"""
+SMTP Pool - Reusable logged-in SMTP sessions
+
+Opening an SMTP connection costs a TCP connect, a TLS handshake and an AUTH
+round trip. The pool keeps a few logged-in sessions open and hands them out
+for one send at a time. Sessions idle longer than the idle timeout are
+closed; sessions idle for a shorter while are checked with NOOP before reuse.
+A send that hits a dropped connection reconnects and retries once.
+
+All calls block, so async routes should run them in a threadpool.
+"""
+import smtplib
+import ssl
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Optional
+
+from metrics import counter, gauge, record_cache
+
+SMTP_SECURITY_MODES = ("ssl", "starttls", "none")
+
+SMTP_CONNECTIONS = counter("jarvis_smtp_connections_total", "SMTP connections opened or discarded", ("event",))
+SMTP_IDLE_CONNECTIONS = gauge("jarvis_smtp_idle_connections", "Logged-in SMTP sessions waiting in the pool")
+
+
+def _is_broken(error: Exception) -> bool:
+    """Whether the session can't be trusted after this error (SMTP replies leave it usable)"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    # SMTPException subclasses OSError; only socket-level errors break the session
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPConnectionPool:
+    """Bounded pool of logged-in SMTP sessions for one account"""
+
+    def __init__(self, host: str, port: int, username: Optional[str], password: Optional[str],
+                 security: str = "ssl", size: int = 2, idle_timeout: float = 60.0,
+                 healthcheck_after: float = 5.0, timeout: float = 30.0):
+        if security not in SMTP_SECURITY_MODES:
+            raise ValueError(f"security must be one of {SMTP_SECURITY_MODES}")
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.security = security
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.healthcheck_after = healthcheck_after
+        self.timeout = timeout
+        self._idle = deque()  # (connection, last_used), most recently used on the right
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._created = 0
+        self._reused = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.security == "ssl":
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                          context=ssl.create_default_context())
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                connection.starttls(context=ssl.create_default_context())
+        try:
+            connection.ehlo_or_helo_if_needed()
+            # Local test servers often don't offer AUTH
+            if self.username and self.password and connection.has_extn("auth"):
+                connection.login(self.username, self.password)
+        except Exception:
+            self._close(connection)
+            raise
+        self._created += 1
+        SMTP_CONNECTIONS.inc(event="opened")
+        return connection
+
+    @staticmethod
+    def _close(connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def _discard(self, connection: smtplib.SMTP, reason: str):
+        SMTP_CONNECTIONS.inc(event=reason)
+        self._close(connection)
+
+    def _checkout_idle(self) -> Optional[smtplib.SMTP]:
+        """Most recently used healthy idle session, closing expired ones on the way"""
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    SMTP_IDLE_CONNECTIONS.set(0)
+                    return None
+                connection, last_used = self._idle.pop()
+                SMTP_IDLE_CONNECTIONS.set(len(self._idle))
+            idle_for = now - last_used
+            if idle_for > self.idle_timeout:
+                self._discard(connection, "expired")
+                continue
+            if idle_for > self.healthcheck_after:
+                try:
+                    if connection.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("NOOP failed")
+                except OSError:  # includes SMTPException
+                    self._discard(connection, "unhealthy")
+                    continue
+            return connection
+
+    def _checkin(self, connection: smtplib.SMTP):
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+            SMTP_IDLE_CONNECTIONS.set(len(self._idle))
+
+    @contextmanager
+    def connection(self):
+        """Borrow a logged-in session; it goes back to the pool unless it broke"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("Timed out waiting for a free SMTP connection")
+        connection = None
+        try:
+            connection = self._checkout_idle()
+            record_cache("smtp_pool", hit=connection is not None)
+            if connection is None:
+                connection = self._connect()
+            else:
+                self._reused += 1
+            yield connection
+        except Exception as e:
+            if connection is not None and _is_broken(e):
+                self._discard(connection, "broken")
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                self._checkin(connection)
+            self._slots.release()
+
+    def sendmail(self, from_addr: str, recipients: List[str], message: str) -> dict:
+        """Send one message, reconnecting once if a pooled session turns out to be dead"""
+        for attempt in range(2):
+            try:
+                with self.connection() as connection:
+                    return connection.sendmail(from_addr, recipients, message)
+            except smtplib.SMTPServerDisconnected:
+                if attempt == 1:
+                    raise
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+            SMTP_IDLE_CONNECTIONS.set(0)
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = len(self._idle)
+        return {
+            "host": self.host,
+            "port": self.port,
+            "security": self.security,
+            "size": self.size,
+            "idle": idle,
+            "created": self._created,
+            "reused": self._reused,
+        }
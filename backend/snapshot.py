@@ -0,0 +1,218 @@
+"""
+Snapshot - Binary snapshot and restore of the vector store
+
+A snapshot is a directory:
+    manifest.json     format version, row count, dimension, dtype, embedding model
+    embeddings.npy    (n, dim) float32 or int8 matrix, memory-mappable
+    scales.npy        (n,) float32 per-row scales (int8 snapshots only)
+    ids.jsonl         one chunk id per line        } columnar sidecar,
+    documents.jsonl   one chunk text per line      } row i of each file
+    metadatas.jsonl   one metadata object per line } matches embeddings[i]
+
+Restoring bulk-loads rows into the collection without re-embedding, so a
+new replica can be seeded from a snapshot instead of re-uploading files.
+Each batch lands through the same write path as ingestion, so a re-index
+running at the time also receives the rows (embedded with its own model).
+
+Usage:
+    python snapshot.py create ./snapshots/nightly --dtype int8
+    python snapshot.py restore ./snapshots/nightly
+"""
+import argparse
+import json
+import os
+import time
+from typing import Optional
+
+import numpy as np
+
+from config import EXPORT_BATCH_SIZE
+from knowledge_base import (
+    get_collection, iter_batches, active_version, write_token, write_lock, encode_for_shadow, mirror_upsert
+)
+from metrics import stage_timer
+from kb_stats import knowledge_stats
+from structured_logging import get_logger
+
+log = get_logger("snapshot")
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_DTYPES = ("float32", "int8")
+
+
+def _quantize_int8(vectors: np.ndarray):
+    """Symmetric per-row int8 quantization"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def create_snapshot(path: str, dtype: str = "float32", batch_size: int = EXPORT_BATCH_SIZE) -> dict:
+    """Write every chunk of the collection to a snapshot directory"""
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"dtype must be one of {SNAPSHOT_DTYPES}")
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        raise FileExistsError(f"Snapshot already exists at {path}")
+    os.makedirs(path, exist_ok=True)
+
+    collection = get_collection()
+    capacity = collection.count()
+    start = time.perf_counter()
+    embeddings = None
+    scales = None
+    written = 0
+    dimension = 0
+
+    with stage_timer("snapshot", "create"), \
+            open(os.path.join(path, "ids.jsonl"), "w", encoding="utf-8") as ids_file, \
+            open(os.path.join(path, "documents.jsonl"), "w", encoding="utf-8") as documents_file, \
+            open(os.path.join(path, "metadatas.jsonl"), "w", encoding="utf-8") as metadatas_file:
+        for batch in iter_batches(batch_size, include=["embeddings", "documents", "metadatas"]):
+            vectors = np.asarray(batch["embeddings"], dtype=np.float32)
+            if embeddings is None:
+                dimension = vectors.shape[1]
+                # Preallocate on disk; rows added after count() was taken are left for the next snapshot
+                embeddings = np.lib.format.open_memmap(
+                    os.path.join(path, "embeddings.npy"), mode="w+", dtype=dtype, shape=(capacity, dimension)
+                )
+                if dtype == "int8":
+                    scales = np.lib.format.open_memmap(
+                        os.path.join(path, "scales.npy"), mode="w+", dtype=np.float32, shape=(capacity,)
+                    )
+            take = min(len(vectors), capacity - written)
+            if take <= 0:
+                break
+            rows = slice(written, written + take)
+            if dtype == "int8":
+                embeddings[rows], scales[rows] = _quantize_int8(vectors[:take])
+            else:
+                embeddings[rows] = vectors[:take]
+            for i in range(take):
+                ids_file.write(json.dumps(batch["ids"][i]) + "\n")
+                documents_file.write(json.dumps(batch["documents"][i]) + "\n")
+                metadatas_file.write(json.dumps(batch["metadatas"][i]) + "\n")
+            written += take
+
+    if embeddings is not None:
+        embeddings.flush()
+        if scales is not None:
+            scales.flush()
+    else:
+        # Empty collection: keep the format valid
+        np.save(os.path.join(path, "embeddings.npy"), np.zeros((0, 0), dtype=dtype))
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": int(time.time()),
+        "count": written,
+        "dimension": dimension,
+        "dtype": dtype,
+        "embedding_model": active_version()["model"],
+        "collection": collection.name,
+    }
+    with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    manifest["seconds"] = round(time.perf_counter() - start, 2)
+    log.info("snapshot_created", path=path, chunks=written, seconds=manifest["seconds"])
+    return manifest
+
+
+def read_manifest(path: str) -> dict:
+    with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format_version')}")
+    return manifest
+
+
+def _check_model(manifest: dict, force: bool):
+    model_name = active_version()["model"]
+    if manifest["embedding_model"] != model_name and not force:
+        raise ValueError(
+            f"Snapshot embeddings come from {manifest['embedding_model']}, "
+            f"but the active collection uses {model_name}"
+        )
+
+
+def _write_batch(manifest: dict, force: bool, ids: list, vectors: np.ndarray, documents: list, metadatas: list):
+    """Upsert one batch into the active collection and mirror it into a re-index in progress"""
+    while True:
+        token = write_token()
+        shadow_embeddings = encode_for_shadow(documents)
+        with write_lock(token) as current:
+            if current:
+                get_collection().upsert(ids=ids, embeddings=vectors.tolist(), documents=documents, metadatas=metadatas)
+                mirror_upsert(ids, documents, metadatas, shadow_embeddings)
+                return
+        # A re-index started or cut over meanwhile; the snapshot vectors may no longer fit the active model
+        _check_model(manifest, force)
+
+
+def restore_snapshot(path: str, batch_size: int = EXPORT_BATCH_SIZE, force: bool = False) -> dict:
+    """
+    Bulk-load a snapshot into the collection (upsert, so restoring twice is safe)
+
+    Args:
+        force: restore even if the snapshot was produced by a different embedding model
+    """
+    manifest = read_manifest(path)
+    _check_model(manifest, force)
+
+    count = manifest["count"]
+    start = time.perf_counter()
+    restored = 0
+    if count:
+        embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r") if manifest["dtype"] == "int8" else None
+
+        with stage_timer("snapshot", "restore"), \
+                open(os.path.join(path, "ids.jsonl"), encoding="utf-8") as ids_file, \
+                open(os.path.join(path, "documents.jsonl"), encoding="utf-8") as documents_file, \
+                open(os.path.join(path, "metadatas.jsonl"), encoding="utf-8") as metadatas_file:
+            while restored < count:
+                take = min(batch_size, count - restored)
+                ids = [json.loads(ids_file.readline()) for _ in range(take)]
+                documents = [json.loads(documents_file.readline()) for _ in range(take)]
+                metadatas = [json.loads(metadatas_file.readline()) for _ in range(take)]
+                vectors = np.asarray(embeddings[restored:restored + take], dtype=np.float32)
+                if scales is not None:
+                    vectors = vectors * np.asarray(scales[restored:restored + take])[:, None]
+                _write_batch(manifest, force, ids, vectors, documents, metadatas)
+                restored += take
+        # Restored chunks may add to or overwrite existing documents; recount rather than track them
+        knowledge_stats.rebuild()
+
+    seconds = round(time.perf_counter() - start, 2)
+    log.info("snapshot_restored", path=path, chunks=restored, seconds=seconds)
+    return {"restored": restored, "dtype": manifest["dtype"], "seconds": seconds}
+
+
+def resolve_snapshot_path(snapshot_dir: str, name: Optional[str]) -> str:
+    """Map an API-supplied snapshot name to a directory under snapshot_dir"""
+    name = name or time.strftime("snapshot_%Y%m%d_%H%M%S")
+    if not name.replace("-", "").replace("_", "").replace(".", "").isalnum() or name.startswith("."):
+        raise ValueError("Snapshot name may only contain letters, digits, '-', '_' and '.'")
+    return os.path.join(snapshot_dir, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot or restore the knowledge base")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    create_parser = subparsers.add_parser("create")
+    create_parser.add_argument("path")
+    create_parser.add_argument("--dtype", choices=SNAPSHOT_DTYPES, default="float32")
+    restore_parser = subparsers.add_parser("restore")
+    restore_parser.add_argument("path")
+    restore_parser.add_argument("--force", action="store_true", help="Ignore embedding model mismatch")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        print(json.dumps(create_snapshot(args.path, dtype=args.dtype), indent=2))
+    else:
+        print(json.dumps(restore_snapshot(args.path, force=args.force), indent=2))
+
+
+if __name__ == "__main__":
+    main()
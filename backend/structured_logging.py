@@ -0,0 +1,239 @@
+"""
+Structured Logging - JSON log records written off the request path
+
+Records go through a bounded in-memory queue to one writer thread, so a
+slow stdout never blocks a request. Each record carries the request id
+(from X-Request-ID or generated) and the conversation id bound by the
+handler. Verbose payload records (DEBUG) are kept for a sampled share of
+requests, decided once per request so a sampled request logs completely.
+As the queue fills, DEBUG and then INFO records are shed, so log volume
+drops under load while warnings and errors still get through. Fields that
+hold user or document text are replaced by their length unless
+LOG_REDACT_CONTENT is off.
+
+    log = get_logger("chat")
+    log.info("chat_request", mode="mixed", query=text)  # query is redacted
+"""
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from config import (
+    LOG_LEVEL, LOG_SAMPLE_RATE, LOG_REDACT_CONTENT, LOG_QUEUE_SIZE, LOG_SHED_DEBUG_AT, LOG_SHED_INFO_AT
+)
+from metrics import counter
+
+LOG_RECORDS = counter("jarvis_log_records_total", "Log records queued for writing", ("level",))
+LOG_DROPPED = counter("jarvis_log_records_dropped_total", "Log records not written", ("reason",))
+
+ROOT_LOGGER = "jarvis"
+
+# Field names whose values are user or document text
+REDACTED_FIELDS = frozenset({
+    "query", "message", "context", "context_preview", "prompt", "response", "text", "content", "chunk", "body"
+})
+
+_request_id: ContextVar[Optional[str]] = ContextVar("log_request_id", default=None)
+_conversation_id: ContextVar[Optional[str]] = ContextVar("log_conversation_id", default=None)
+_sampled: ContextVar[Optional[bool]] = ContextVar("log_sampled", default=None)
+
+_LOGGING_KWARGS = ("exc_info", "stack_info", "stacklevel", "extra")
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def bind_conversation(conversation_id: Optional[str]):
+    """Tag the rest of this request's records with its conversation id"""
+    _conversation_id.set(conversation_id)
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger taking the event name as message and keyword arguments as fields"""
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOGGING_KWARGS}
+        if fields:
+            kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+        return msg, kwargs
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line (runs on the writer thread)"""
+
+    def __init__(self, redact: bool = LOG_REDACT_CONTENT):
+        super().__init__()
+        self.redact = redact
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "conversation_id", None):
+            entry["conversation_id"] = record.conversation_id
+        for key, value in getattr(record, "fields", {}).items():
+            if self.redact and key in REDACTED_FIELDS and isinstance(value, str):
+                value = f"<redacted {len(value)} chars>"
+            entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class AsyncJsonHandler(QueueHandler):
+    """Queue handler that samples, sheds under load and never blocks the caller"""
+
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE, sample_rate: float = LOG_SAMPLE_RATE):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.maxsize = maxsize
+        self.sample_rate = sample_rate
+        self.queued = 0
+        self.dropped = {"sampled": 0, "shed": 0, "queue_full": 0}
+
+    def _drop(self, reason: str):
+        self.dropped[reason] += 1
+        LOG_DROPPED.inc(reason=reason)
+
+    def emit(self, record: logging.LogRecord):
+        if record.levelno <= logging.DEBUG:
+            sampled = _sampled.get()
+            if sampled is None:  # Outside a request: sample each record
+                sampled = random.random() < self.sample_rate
+            if not sampled:
+                self._drop("sampled")
+                return
+        fill = self.queue.qsize() / self.maxsize
+        if (record.levelno <= logging.DEBUG and fill >= LOG_SHED_DEBUG_AT) or \
+                (record.levelno <= logging.INFO and fill >= LOG_SHED_INFO_AT):
+            self._drop("shed")
+            return
+        record.request_id = _request_id.get()
+        record.conversation_id = _conversation_id.get()
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self._drop("queue_full")
+            return
+        self.queued += 1
+        LOG_RECORDS.inc(level=record.levelname)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Resolve the message and traceback now (they may not outlive the call); JSON encoding waits for the writer"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RequestContextMiddleware:
+    """ASGI middleware giving each request an id (echoed as X-Request-ID) and a sampling decision"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                # Accept a caller's id if it is short and printable
+                value = value.decode("latin-1")
+                if 0 < len(value) <= 64 and value.isprintable():
+                    request_id = value
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        _request_id.set(request_id)
+        _conversation_id.set(None)
+        _sampled.set(_handler is not None and random.random() < _handler.sample_rate)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
+
+
+_handler: Optional[AsyncJsonHandler] = None
+_listener: Optional[QueueListener] = None
+_formatter: Optional[JsonFormatter] = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(level: str = LOG_LEVEL, stream=None):
+    """Route the jarvis.* loggers through the queue to a JSON writer thread (idempotent)"""
+    global _handler, _listener, _formatter
+    with _setup_lock:
+        if _handler is not None:
+            return
+        _formatter = JsonFormatter()
+        writer = logging.StreamHandler(stream or sys.stdout)
+        writer.setFormatter(_formatter)
+        _handler = AsyncJsonHandler()
+        _listener = QueueListener(_handler.queue, writer)
+        _listener.start()
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(level.upper())
+        root.addHandler(_handler)
+        root.propagate = False
+
+
+def shutdown_logging():
+    """Flush queued records (the writer thread writes everything queued before it stops)"""
+    global _handler, _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            logging.getLogger(ROOT_LOGGER).removeHandler(_handler)
+        _handler, _listener = None, None
+
+
+def configure(level: Optional[str] = None, sample_rate: Optional[float] = None, redact: Optional[bool] = None):
+    """Change logging controls at runtime"""
+    if level is not None:
+        logging.getLogger(ROOT_LOGGER).setLevel(level.upper())
+    if sample_rate is not None and _handler is not None:
+        _handler.sample_rate = sample_rate
+    if redact is not None and _formatter is not None:
+        _formatter.redact = redact
+
+
+def stats() -> dict:
+    root = logging.getLogger(ROOT_LOGGER)
+    if _handler is None:
+        return {"enabled": False, "level": logging.getLevelName(root.getEffectiveLevel())}
+    return {
+        "enabled": True,
+        "level": logging.getLevelName(root.getEffectiveLevel()),
+        "sample_rate": _handler.sample_rate,
+        "redact_content": _formatter.redact,
+        "queue_depth": _handler.queue.qsize(),
+        "queue_size": _handler.maxsize,
+        "queued": _handler.queued,
+        "dropped": dict(_handler.dropped),
+    }
@@ -0,0 +1,524 @@
+"""
+Summaries - Ingestion-time hierarchical document summaries
+
+After a document's chunks are stored, a background thread summarizes it
+bottom-up: consecutive chunks are grouped into sections of about
+SUMMARY_SECTION_CHARS, each section is summarized, and the section
+summaries are merged SUMMARY_FAN_IN at a time until one document summary
+remains. Summaries are written by the fast Ollama profile; in MOCK_MODE,
+or while Ollama is unreachable, an extractive summary (the most
+representative sentences) is used instead.
+
+Section and document summaries live in their own Chroma collection, keyed
+by doc_id and embedded with the knowledge base's model. A query such as
+"summarize this document" is answered from them: whole-document coverage
+in a prompt no longer than a normal retrieval. Summary words alone ("give
+me an overview of X") don't pick a document: the query has to come with
+session documents, name a file, or match a summary closely; otherwise it
+goes through normal chunk retrieval.
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+import knowledge_base
+from config import (
+    MODELS, OLLAMA_URL, SUMMARY_COLLECTION_NAME, SUMMARY_MODEL, SUMMARY_SECTION_CHARS, SUMMARY_FAN_IN,
+    SUMMARY_NUM_PREDICT, SUMMARY_LLM_TIMEOUT_SECONDS, SUMMARY_COOLDOWN_SECONDS, SUMMARY_EXTRACTIVE_SENTENCES,
+    SUMMARY_MAX_CHARS, SUMMARY_MAX_DOCUMENTS, SUMMARY_MATCH_MAX_DISTANCE, SUMMARY_BATCH_DELAY_SECONDS,
+    EXPORT_BATCH_SIZE
+)
+from metrics import counter, gauge, stage_timer
+from structured_logging import get_logger
+
+log = get_logger("summaries")
+
+SUMMARIES_BUILT = counter("jarvis_document_summaries_total", "Documents summarized at ingestion", ("method",))
+SUMMARY_BACKLOG = gauge("jarvis_document_summary_backlog", "Documents waiting to be summarized")
+
+MOCK_MODE = os.getenv("MOCK_MODE", "false").lower() == "true"
+
+SECTION_PROMPT = """Summarize this part of the document "{filename}" in 3-4 sentences.
+Keep names, figures, dates and decisions. Reply with the summary only.
+
+{text}
+
+Summary:"""
+
+MERGE_PROMPT = """These are summaries of consecutive parts of the document "{filename}".
+Combine them into one summary of 4-6 sentences that covers every part. Reply with the summary only.
+
+{text}
+
+Summary:"""
+
+# "summarize ...", "give me an overview", "tl;dr", "what is this document about", "key points"
+SUMMARY_QUERY_PATTERN = re.compile(
+    r"\b(summar(y|ies|ise|ize|ised|ized|ising|izing|isation|ization)|overview|tl;?dr|gist|recap|synopsis"
+    r"|key (points|takeaways|findings)|main (points|ideas|takeaways)"
+    r"|what('s| is) (this|the|that) (document|doc|file|paper|report|pdf) about)\b",
+    re.IGNORECASE
+)
+
+# "summarize q3_budget.pdf"
+_FILENAME = re.compile(r"[\w\-]+(?:\.[\w\-]+)*\.[a-z0-9]{2,5}\b", re.IGNORECASE)
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can could did do does for from had has have he her his i if in into is it "
+    "its me my no not of on or our she so than that the their them then there these they this those to too up us "
+    "was we were what when where which while who why will with would you your".split()
+)
+# Words of a summary request that say nothing about which document is meant
+_REQUEST_WORDS = frozenset(
+    "summarize summarise summary summaries overview tldr tl dr gist recap synopsis key points takeaways findings "
+    "main ideas document doc file paper report pdf about give please brief short quick provide write".split()
+)
+
+
+def is_summary_query(query: str) -> bool:
+    return SUMMARY_QUERY_PATTERN.search(query) is not None
+
+
+def query_topic(query: str) -> List[str]:
+    """Words of a summary request that could name a document ("summarize the Q3 budget" -> q3, budget)"""
+    return [w for w in _WORD.findall(query.lower()) if w not in _STOPWORDS and w not in _REQUEST_WORDS]
+
+
+def extractive_summary(text: str, sentences: int = SUMMARY_EXTRACTIVE_SENTENCES,
+                       max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """The sentences whose content words are most frequent in the text, in their original order"""
+    candidates = list(OrderedDict.fromkeys(
+        s.strip() for s in _SENTENCE_BREAK.split(" ".join(text.split())) if len(s.strip()) > 20
+    ))
+    if not candidates:
+        return text.strip()[:max_chars]
+    frequencies = Counter(w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS)
+    top = max(frequencies.values(), default=1)
+
+    def score(index: int, sentence: str) -> float:
+        words = [w for w in _WORD.findall(sentence.lower()) if w not in _STOPWORDS]
+        density = sum(frequencies[w] for w in words) / top / max(len(words), 1)
+        return density + (0.2 if index == 0 else 0.0)  # Openings tend to state the topic
+
+    ranked = sorted(range(len(candidates)), key=lambda i: score(i, candidates[i]), reverse=True)
+    chosen, length = [], 0
+    for i in ranked:
+        if len(chosen) == sentences:
+            break
+        if chosen and length + len(candidates[i]) > max_chars:
+            continue
+        chosen.append(i)
+        length += len(candidates[i]) + 1
+    return " ".join(candidates[i] for i in sorted(chosen))[:max_chars]
+
+
+def group_sections(chunks: List[str], section_chars: int = SUMMARY_SECTION_CHARS) -> List[Tuple[int, int, str]]:
+    """Consecutive chunks joined into sections: [(first_chunk, last_chunk, text)]"""
+    sections, start, parts, size = [], 0, [], 0
+    for i, chunk in enumerate(chunks):
+        if parts and size + len(chunk) > section_chars:
+            sections.append((start, i - 1, "\n\n".join(parts)))
+            start, parts, size = i, [], 0
+        parts.append(chunk)
+        size += len(chunk) + 2
+    if parts:
+        sections.append((start, len(chunks) - 1, "\n\n".join(parts)))
+    return sections
+
+
+class SummaryIndex:
+    """Background summarizer and store of per-section and per-document summaries"""
+
+    def __init__(self, collection_name: str = SUMMARY_COLLECTION_NAME, model: str = SUMMARY_MODEL,
+                 url: str = OLLAMA_URL, llm_enabled: bool = not MOCK_MODE,
+                 delay_seconds: float = SUMMARY_BATCH_DELAY_SECONDS):
+        self.collection_name = collection_name
+        self.model = model
+        self.url = url
+        self.llm_enabled = llm_enabled
+        self.delay_seconds = delay_seconds
+        self._collection = None
+        self._has_summaries = False
+        self._pending: "OrderedDict[str, dict]" = OrderedDict()  # doc_id -> job, oldest first
+        self._generation: Dict[str, int] = {}  # Bumped on every enqueue/remove; stale builds are discarded
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._backfill_requested = True  # Summarize documents stored before summaries existed
+        self._llm_unavailable_until = 0.0
+        self.documents_built = 0
+        self.sections_built = 0
+        self.llm_calls = 0
+        self.extractive_calls = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_build: Optional[dict] = None
+
+    # Collection
+
+    def get_collection(self):
+        """The summary collection, re-embedded if another embedding model built it"""
+        if self._collection is None:
+            client = knowledge_base.get_chroma_client()
+            model = knowledge_base.active_version()["model"]
+            collection = client.get_or_create_collection(
+                name=self.collection_name, metadata={"embedding_model": model}
+            )
+            if (collection.metadata or {}).get("embedding_model") != model:
+                collection = self._reembed(client, collection, model)
+            self._collection = collection
+        return self._collection
+
+    def _reembed(self, client, old, model: str):
+        """Copy summaries into a collection embedded with the new model (the text doesn't change)"""
+        log.info("summary_index_reembed", model=model)
+        rows = old.get(include=["documents", "metadatas"])
+        client.delete_collection(self.collection_name)
+        collection = client.create_collection(name=self.collection_name, metadata={"embedding_model": model})
+        encoder = knowledge_base.get_embedding_model()
+        for start in range(0, len(rows["ids"]), EXPORT_BATCH_SIZE):
+            end = start + EXPORT_BATCH_SIZE
+            collection.upsert(
+                ids=rows["ids"][start:end], documents=rows["documents"][start:end],
+                metadatas=rows["metadatas"][start:end],
+                embeddings=encoder.encode(rows["documents"][start:end]).tolist(),
+            )
+        return collection
+
+    def reset_collection(self):
+        """Knowledge base cutover callback: the next access re-embeds with the new model"""
+        with self._write_lock:
+            self._collection = None
+            self._has_summaries = False
+
+    # Queue
+
+    def enqueue(self, doc_id: str, filename: str, chunks: Optional[List[str]] = None,
+                metadata: Optional[dict] = None):
+        """Queue a stored document; chunks=None reads them back from the knowledge base when its turn comes"""
+        with self._cond:
+            generation = self._generation.get(doc_id, 0) + 1
+            self._generation[doc_id] = generation
+            self._pending.pop(doc_id, None)
+            self._pending[doc_id] = {
+                "doc_id": doc_id, "filename": filename, "chunks": chunks,
+                "metadata": dict(metadata or {}), "generation": generation,
+                "ingested_at": time.time() if chunks is not None else 0.0,
+            }
+            SUMMARY_BACKLOG.set(len(self._pending))
+            self._cond.notify()
+
+    def remove(self, doc_id: str):
+        """Drop a deleted document's summaries (and any build in progress)"""
+        with self._cond:
+            self._generation[doc_id] = self._generation.get(doc_id, 0) + 1
+            self._pending.pop(doc_id, None)
+            SUMMARY_BACKLOG.set(len(self._pending))
+        if not knowledge_base.is_ready():
+            return
+        with self._write_lock:
+            self.get_collection().delete(where={"doc_id": doc_id})
+
+    def request_backfill(self):
+        """Summarize stored documents that have no summary yet (startup, snapshot restore)"""
+        with self._cond:
+            self._backfill_requested = True
+            self._cond.notify()
+
+    def is_pending(self, doc_id: str) -> bool:
+        with self._cond:
+            return doc_id in self._pending
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="document-summaries", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+    def _take_job(self) -> Optional[dict]:
+        with self._cond:
+            while not self._pending and not self._backfill_requested and not self._stopping:
+                self._cond.wait()
+            if self._stopping:
+                return None
+            if self._backfill_requested:
+                self._backfill_requested = False
+                return {"backfill": True}
+            _, job = self._pending.popitem(last=False)
+            SUMMARY_BACKLOG.set(len(self._pending))
+            return job
+
+    def _run(self):
+        knowledge_base.wait_until_ready()
+        while True:
+            job = self._take_job()
+            if job is None:
+                return
+            try:
+                if job.get("backfill"):
+                    self._backfill()
+                else:
+                    self.build(job)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                log.error("summary_build_failed", doc_id=job.get("doc_id"), error=str(e), exc_info=True)
+            time.sleep(self.delay_seconds)
+
+    def _backfill(self):
+        documents: "OrderedDict[str, str]" = OrderedDict()
+        for batch in knowledge_base.iter_batches(EXPORT_BATCH_SIZE, include=["metadatas"]):
+            for metadata in batch["metadatas"]:
+                documents.setdefault(metadata["doc_id"], metadata.get("filename", "Unknown"))
+        summarized = set()
+        collection = self.get_collection()
+        if collection.count():
+            rows = collection.get(where={"level": "document"}, include=["metadatas"])
+            summarized = {metadata["doc_id"] for metadata in rows["metadatas"]}
+        missing = [doc_id for doc_id in documents if doc_id not in summarized and not self.is_pending(doc_id)]
+        for doc_id in missing:
+            self.enqueue(doc_id, documents[doc_id])
+        if missing:
+            log.info("summary_backfill_queued", documents=len(missing))
+
+    # Summarizing
+
+    def llm_available(self) -> bool:
+        return self.llm_enabled and time.monotonic() >= self._llm_unavailable_until
+
+    def _llm_summary(self, prompt: str) -> str:
+        profile = MODELS[self.model]
+        payload = {
+            "model": profile["name"],
+            "prompt": prompt,
+            "stream": False,
+            "options": {**profile["options"], "temperature": 0.2, "num_predict": SUMMARY_NUM_PREDICT},
+        }
+        try:
+            response = requests.post(self.url, json=payload, timeout=SUMMARY_LLM_TIMEOUT_SECONDS)
+        except requests.exceptions.ConnectionError:
+            self._llm_unavailable_until = time.monotonic() + SUMMARY_COOLDOWN_SECONDS
+            raise
+        response.raise_for_status()
+        summary = response.json()["response"].strip()
+        if not summary:
+            raise ValueError("Empty summary")
+        return summary[:SUMMARY_MAX_CHARS]
+
+    def summarize(self, text: str, filename: str, merge: bool = False) -> Tuple[str, str]:
+        """(summary, method) for one section or one group of summaries"""
+        if self.llm_available():
+            prompt = (MERGE_PROMPT if merge else SECTION_PROMPT).format(filename=filename, text=text)
+            try:
+                with stage_timer("summarize", "llm"):
+                    summary = self._llm_summary(prompt)
+                self.llm_calls += 1
+                return summary, "llm"
+            except (requests.RequestException, ValueError, KeyError) as e:
+                log.warning("summary_llm_failed", filename=filename, error=type(e).__name__)
+        with stage_timer("summarize", "extractive"):
+            summary = extractive_summary(text)
+        self.extractive_calls += 1
+        return summary, "extractive"
+
+    def _document_chunks(self, doc_id: str) -> Tuple[List[str], dict]:
+        rows = knowledge_base.get_collection().get(where={"doc_id": doc_id}, include=["documents", "metadatas"])
+        ordered = sorted(zip(rows["metadatas"], rows["documents"]), key=lambda row: row[0].get("chunk_id", 0))
+        return [text for _, text in ordered], (ordered[0][0] if ordered else {})
+
+    def build(self, job: dict) -> Optional[dict]:
+        """Summarize one document bottom-up and replace its stored summaries"""
+        start = time.perf_counter()
+        doc_id, filename, chunks, metadata = job["doc_id"], job["filename"], job["chunks"], job["metadata"]
+        if chunks is None:
+            chunks, metadata = self._document_chunks(doc_id)
+        if not chunks:
+            return None  # Deleted before its turn
+
+        sections = group_sections(chunks)
+        section_results = [self.summarize(text, filename) for _, _, text in sections]
+        methods = {method for _, method in section_results}
+        level = [summary for summary, _ in section_results]
+        while len(level) > 1:
+            merged = [self.summarize("\n\n".join(level[i:i + SUMMARY_FAN_IN]), filename, merge=True)
+                      for i in range(0, len(level), SUMMARY_FAN_IN)]
+            methods.update(method for _, method in merged)
+            level = [summary for summary, _ in merged]
+        method = methods.pop() if len(methods) == 1 else "mixed"
+
+        base = {
+            "doc_id": doc_id,
+            "filename": filename,
+            "timestamp": metadata.get("timestamp", int(time.time())),
+            "ingested_at": job["ingested_at"],  # Orders uploads within the same second
+            "method": method,
+            **{k: v for k, v in metadata.items() if k in ("tenant", "conversation_id", "session_only", "expires_at")},
+        }
+        ids = [f"{doc_id}_summary"]
+        documents = [level[0]]
+        metadatas = [{**base, "level": "document", "sections": len(sections)}]
+        if len(sections) > 1:
+            for i, ((first, last, _), (summary, _)) in enumerate(zip(sections, section_results)):
+                ids.append(f"{doc_id}_summary_section_{i}")
+                documents.append(summary)
+                metadatas.append({**base, "level": "section", "section": i, "first_chunk": first, "last_chunk": last})
+
+        with stage_timer("summarize", "embedding"):
+            embeddings = knowledge_base.get_embedding_model().encode(documents).tolist()
+        with self._write_lock:
+            with self._cond:
+                if self._generation.get(doc_id) != job["generation"]:
+                    return None  # Replaced or deleted while summarizing
+            collection = self.get_collection()
+            collection.delete(where={"doc_id": doc_id})
+            collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+            self._has_summaries = True
+
+        self.documents_built += 1
+        self.sections_built += len(sections)
+        SUMMARIES_BUILT.inc(method=method)
+        self.last_build = {
+            "doc_id": doc_id,
+            "sections": len(sections),
+            "method": method,
+            "seconds": round(time.perf_counter() - start, 3),
+            "finished_at": time.time(),
+        }
+        return self.last_build
+
+    # Queries
+
+    def _ready_collection(self):
+        """The collection, or None while it holds no summaries (Chroma rejects queries on empty collections)"""
+        collection = self.get_collection()
+        if not self._has_summaries:
+            if collection.count() == 0:
+                return None
+            self._has_summaries = True
+        return collection
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        """A document's summary and its section summaries in document order"""
+        return self.summaries_for([doc_id]).get(doc_id)
+
+    def summaries_for(self, doc_ids: List[str], tenant: Optional[str] = None) -> Dict[str, dict]:
+        """Summaries by doc_id; with a tenant, other tenants' documents are left out"""
+        collection = self._ready_collection()
+        if collection is None or not doc_ids:
+            return {}
+        where = {"doc_id": {"$in": list(doc_ids)}}
+        rows = collection.get(where={"$and": [where, {"tenant": tenant}]} if tenant else where,
+                              include=["documents", "metadatas"])
+        found: Dict[str, dict] = {}
+        for text, metadata in zip(rows["documents"], rows["metadatas"]):
+            entry = found.setdefault(metadata["doc_id"], {
+                "doc_id": metadata["doc_id"], "filename": metadata.get("filename"), "summary": None,
+                "method": metadata.get("method"), "sections": [],
+            })
+            if metadata["level"] == "document":
+                entry["summary"] = text
+            else:
+                entry["sections"].append({
+                    "section": metadata["section"], "first_chunk": metadata["first_chunk"],
+                    "last_chunk": metadata["last_chunk"], "summary": text,
+                })
+        for entry in found.values():
+            entry["sections"].sort(key=lambda s: s["section"])
+        return {doc_id: entry for doc_id, entry in found.items() if entry["summary"] is not None}
+
+    def target_documents(self, query: str, query_embedding: List[List[float]],
+                         session_doc_ids: Optional[List[str]] = None, tenant: Optional[str] = None) -> List[str]:
+        """
+        Documents a summary request refers to: the session's, the files it
+        names, or the summaries its topic matches within
+        SUMMARY_MATCH_MAX_DISTANCE (of the tenant). Empty when it refers to
+        none, so the caller falls back to chunk retrieval.
+        """
+        if session_doc_ids:
+            return list(session_doc_ids)[-SUMMARY_MAX_DOCUMENTS:]
+        collection = self._ready_collection()
+        if collection is None:
+            return []
+        conditions = [{"level": "document"}] + ([{"tenant": tenant}] if tenant else [])
+        filenames = list(OrderedDict.fromkeys(_FILENAME.findall(query)))
+        if filenames:
+            # "summarize q3_budget.pdf": the documents stored under that name
+            rows = collection.get(where={"$and": conditions + [{"filename": {"$in": filenames}}]},
+                                  include=["metadatas"])
+            if rows["ids"]:
+                return [metadata["doc_id"] for metadata in rows["metadatas"]][:SUMMARY_MAX_DOCUMENTS]
+        if not query_topic(query):
+            # "summarize this document" with nothing to say which one
+            return []
+        # "summarize the hiring plan": match the topic against document summaries
+        where = {"$and": conditions} if len(conditions) > 1 else conditions[0]
+        results = collection.query(query_embeddings=query_embedding, n_results=SUMMARY_MAX_DOCUMENTS,
+                                   where=where, include=["metadatas", "distances"])
+        hits = [(metadata, distance) for metadata, distance in zip(results["metadatas"][0], results["distances"][0])
+                if distance <= SUMMARY_MATCH_MAX_DISTANCE]
+        if not hits:
+            return []
+        best = hits[0][1]
+        # Keep close runners-up only, so one clear match isn't diluted
+        return [metadata["doc_id"] for metadata, distance in hits if distance <= best * 1.15]
+
+    def context_for(self, query: str, query_embedding: List[List[float]], max_chars: int,
+                    session_doc_ids: Optional[List[str]] = None,
+                    tenant: Optional[str] = None) -> Optional[Tuple[str, List[str], int]]:
+        """
+        Prompt context for a summary request: document summaries first, then
+        section summaries in document order while they fit in max_chars
+
+        Returns:
+            (context, sources, documents covered), or None when the query refers to no document
+            with a summary ready
+        """
+        doc_ids = self.target_documents(query, query_embedding, session_doc_ids, tenant)
+        # Session doc ids come from the client; summaries_for drops other tenants' documents
+        found = self.summaries_for(doc_ids, tenant)
+        entries = [found[doc_id] for doc_id in doc_ids if doc_id in found]
+        if not entries:
+            return None
+        parts = [f"Summary of {entry['filename']}:\n{entry['summary']}" for entry in entries]
+        length = sum(len(part) + 2 for part in parts)
+        for entry in entries:
+            for section in entry["sections"]:
+                part = f"{entry['filename']}, part {section['section'] + 1}:\n{section['summary']}"
+                if length + len(part) > max_chars:
+                    break
+                parts.append(part)
+                length += len(part) + 2
+        return "\n\n".join(parts), [f"{entry['filename']} (summary)" for entry in entries], len(entries)
+
+    def status(self) -> dict:
+        with self._cond:
+            backlog = len(self._pending)
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "backlog": backlog,
+            "llm_available": self.llm_available(),
+            "documents_built": self.documents_built,
+            "sections_built": self.sections_built,
+            "llm_calls": self.llm_calls,
+            "extractive_calls": self.extractive_calls,
+            "last_build": self.last_build,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+summary_index = SummaryIndex()
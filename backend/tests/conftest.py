@@ -0,0 +1,7 @@
+"""
+Test setup - Make the backend modules importable however pytest is started
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
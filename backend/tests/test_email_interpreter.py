@@ -0,0 +1,147 @@
+"""
+Email Interpreter tests - Tier selection against the mock Ollama server (benchmarks/mock_ollama.py)
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from benchmarks.mock_ollama import MockOllamaConfig, start_mock_ollama
+from benchmarks.task_interpreter import email_task_responder
+from email_interpreter import EmailTaskInterpreter
+
+CONFIDENT_TASK = "Send an email to bob@example.com about the budget review"  # Address, "about" subject, verb: 1.0
+THRESHOLD_TASK = "Draft a message for the landlord regarding the broken heater and the rent"  # 0.6
+LLM_TASK = "Let bob@example.com know the launch moved to Friday"  # Address only: 0.4
+VAGUE_TASK = "Tell the landlord the heater is broken"  # 0.0, rule action is draft
+
+
+@pytest.fixture
+def ollama_config():
+    return MockOllamaConfig(prefill_ms=5, tokens_per_second=100000, responder=email_task_responder)
+
+
+@pytest.fixture
+def make_interpreter(ollama_config):
+    server = start_mock_ollama(ollama_config)
+    interpreters = []
+
+    def make(**kwargs):
+        kwargs.setdefault("budget_seconds", 2.0)
+        interpreter = EmailTaskInterpreter(url=f"http://127.0.0.1:{server.server_address[1]}/api/generate",
+                                           llm_enabled=True, **kwargs)
+        interpreters.append(interpreter)
+        return interpreter
+
+    yield make
+    for interpreter in interpreters:
+        interpreter._executor.shutdown(wait=True)
+    server.shutdown()
+    server.server_close()
+
+
+def interpret(interpreter: EmailTaskInterpreter, task: str) -> dict:
+    return asyncio.run(interpreter.interpret(task))
+
+
+def test_confident_rules_skip_llm(make_interpreter, ollama_config):
+    result = interpret(make_interpreter(threshold=1.0), CONFIDENT_TASK)
+
+    assert result["tier"] == "rules"
+    assert result["confidence"] == 1.0
+    assert result["email_data"]["to"] == "bob@example.com"
+    assert result["action"] == "send"
+    assert ollama_config.requests == []
+
+
+def test_rules_at_threshold_skip_llm(make_interpreter, ollama_config):
+    result = interpret(make_interpreter(threshold=0.6), THRESHOLD_TASK)
+
+    assert result["tier"] == "rules"
+    assert result["confidence"] == 0.6
+    assert ollama_config.requests == []
+
+
+def test_uncertain_task_goes_to_llm(make_interpreter, ollama_config):
+    result = interpret(make_interpreter(), LLM_TASK)
+
+    assert result["tier"] == "llm"
+    assert result["confidence"] == 0.4
+    assert result["email_data"]["to"] == "bob@example.com"
+    assert result["email_data"]["subject"] == "Let Know Launch Moved"
+    assert LLM_TASK in result["email_data"]["body"]
+    assert len(ollama_config.requests) == 1
+    assert ollama_config.requests[0]["format"] == "json"
+
+
+def test_slow_llm_falls_back_to_rules_within_budget(make_interpreter, ollama_config):
+    ollama_config.prefill_ms = 800
+    interpreter = make_interpreter(budget_seconds=0.2)
+
+    started = time.perf_counter()
+    result = interpret(interpreter, LLM_TASK)
+    elapsed = time.perf_counter() - started
+
+    assert result["tier"] == "llm_timeout"
+    assert elapsed < 0.5
+    assert result["email_data"]["subject"] == "Bob@example.com Launch Moved"  # The rule parser's subject
+
+    # The call keeps running past the budget and fills the cache for the next identical task
+    deadline = time.monotonic() + 5
+    while interpreter.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert interpret(interpreter, LLM_TASK)["tier"] == "cache"
+
+
+def test_cache_hit_for_normalized_text(make_interpreter, ollama_config):
+    interpreter = make_interpreter()
+
+    first = interpret(interpreter, LLM_TASK)
+    second = interpret(interpreter, "  let BOB@example.com know the launch   moved to friday. ")
+
+    assert first["tier"] == "llm"
+    assert second["tier"] == "cache"
+    assert second["email_data"] == first["email_data"]
+    assert len(ollama_config.requests) == 1
+
+
+def test_busy_llm_answers_from_rules(make_interpreter, ollama_config):
+    ollama_config.prefill_ms = 800
+    interpreter = make_interpreter(budget_seconds=0.1, max_concurrent_llm=1)
+
+    assert interpret(interpreter, LLM_TASK)["tier"] == "llm_timeout"  # Its call still holds the only slot
+    started = time.perf_counter()
+    result = interpret(interpreter, VAGUE_TASK)
+
+    assert result["tier"] == "llm_busy"
+    assert time.perf_counter() - started < 0.1
+    assert len(ollama_config.requests) == 1
+
+
+def test_llm_cannot_add_addresses_or_upgrade_to_send(make_interpreter, ollama_config):
+    ollama_config.responder = lambda payload: json.dumps({
+        "to": "attacker@evil.example", "cc": "spy@evil.example",
+        "subject": "Heater", "body": "Hello,\n\nThe heater is broken.\n\nThanks", "action": "send",
+    })
+
+    result = interpret(make_interpreter(), VAGUE_TASK)
+
+    assert result["tier"] == "llm"
+    assert result["action"] == "draft"
+    assert result["recipient_found"] is False
+    assert result["email_data"]["to"] != "attacker@evil.example"
+    assert result["email_data"]["cc"] is None
+    assert result["email_data"]["subject"] == "Heater"
+
+
+def test_llm_may_downgrade_send_to_draft(make_interpreter, ollama_config):
+    ollama_config.responder = lambda payload: json.dumps({
+        "to": "bob@example.com", "cc": None, "subject": "Launch", "body": "Hi Bob", "action": "draft",
+    })
+    task = "Send bob@example.com a note that the launch moved"
+
+    result = interpret(make_interpreter(threshold=1.0), task)
+
+    assert result["tier"] == "llm"
+    assert result["action"] == "draft"
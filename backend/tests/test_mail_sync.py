@@ -0,0 +1,152 @@
+"""
+Mail Sync tests - InboxSync against the mock IMAP server (benchmarks/mock_imap.py)
+"""
+import pytest
+
+from benchmarks.mock_imap import MockMailbox, start_mock_imap
+from mail_cache import MailCache
+from mail_sync import InboxSync
+
+
+@pytest.fixture
+def mailbox():
+    mailbox = MockMailbox(uidvalidity=7)
+    for i in range(1, 6):  # UIDs 1..5
+        mailbox.add(f"Sender {i} <sender{i}@example.com>", f"Subject {i}", f"Body of message {i}.")
+    return mailbox
+
+
+@pytest.fixture
+def server(mailbox):
+    server = start_mock_imap(mailbox)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sync(server, tmp_path):
+    return InboxSync("me@example.com", "password", MailCache(str(tmp_path / "mail_cache.sqlite3")),
+                     host="127.0.0.1", port=server.server_address[1], security="none")
+
+
+@pytest.fixture
+def events(sync):
+    """UIDs passed to the sync's listeners"""
+    seen = {"new": [], "expunged": []}
+    sync.on_new_messages(lambda mailbox, uids: seen["new"].extend(uids))
+    sync.on_expunged(lambda mailbox, uids: seen["expunged"].extend(uids))
+    return seen
+
+
+def _commands_since(mailbox: MockMailbox, start: int, fragment: str):
+    return [command for command in mailbox.commands[start:] if fragment in command]
+
+
+def test_initial_sync_caches_headers_only(sync, mailbox, events):
+    result = sync.sync()
+
+    assert result["reset"] is True
+    assert result["new"] == 5
+    assert events["new"] == [1, 2, 3, 4, 5]
+    message = sync.cache.get_message(sync.mailbox, 3)
+    assert message["subject"] == "Subject 3"
+    assert message["from_address"] == "sender3@example.com"
+    assert message["unread"] is True
+    assert message["body"] is None
+    assert _commands_since(mailbox, 0, "BODY.PEEK[]") == []
+    assert sync.cache.counts(sync.mailbox)["last_uid"] == 5
+
+
+def test_initial_sync_limit_keeps_newest(server, mailbox, tmp_path):
+    inbox_sync = InboxSync("me@example.com", "password", MailCache(str(tmp_path / "limited.sqlite3")),
+                           host="127.0.0.1", port=server.server_address[1], security="none", initial_limit=2)
+
+    assert inbox_sync.sync()["new"] == 2
+    assert inbox_sync.cache.cached_uids(inbox_sync.mailbox) == [4, 5]
+
+
+def test_incremental_sync_without_changes_fetches_no_headers(sync, mailbox, events):
+    sync.sync()
+    events["new"].clear()
+    start = len(mailbox.commands)
+
+    result = sync.sync()
+
+    assert result["reset"] is False
+    assert result["new"] == 0
+    assert result["expunged"] == 0
+    assert events["new"] == []
+    assert _commands_since(mailbox, start, "HEADER.FIELDS") == []
+
+
+def test_incremental_sync_fetches_only_new_messages(sync, mailbox, events):
+    sync.sync()
+    events["new"].clear()
+    mailbox.add("Late <late@example.com>", "Late subject", "Arrived after the first sync.")
+    start = len(mailbox.commands)
+
+    result = sync.sync()
+
+    assert result["new"] == 1
+    assert events["new"] == [6]
+    header_fetches = _commands_since(mailbox, start, "HEADER.FIELDS")
+    assert len(header_fetches) == 1 and header_fetches[0].startswith("UID FETCH 6 ")
+
+
+def test_flag_changes_update_cache(sync, mailbox):
+    sync.sync()
+    mailbox.set_flags(2, ["\\Seen", "\\Flagged"])
+
+    result = sync.sync()
+
+    assert result["updated_flags"] == 5
+    message = sync.cache.get_message(sync.mailbox, 2)
+    assert message["unread"] is False
+    assert message["flags"] == ["\\Seen", "\\Flagged"]
+    assert sync.cache.counts(sync.mailbox)["unread"] == 4
+
+
+def test_expunged_messages_leave_cache(sync, mailbox, events):
+    sync.sync()
+    mailbox.expunge(3)
+
+    result = sync.sync()
+
+    assert result["expunged"] == 1
+    assert events["expunged"] == [3]
+    assert sync.cache.get_message(sync.mailbox, 3) is None
+    assert sync.cache.cached_uids(sync.mailbox) == [1, 2, 4, 5]
+
+
+def test_uidvalidity_change_resets_cache(sync, mailbox, events):
+    sync.sync()
+    events["new"].clear()
+    mailbox.expunge(1)
+    mailbox.renumber()  # UIDVALIDITY 8, the remaining four renumbered 1..4
+
+    result = sync.sync()
+
+    assert result["reset"] is True
+    assert result["uidvalidity"] == 8
+    assert result["new"] == 4
+    assert sorted(events["expunged"]) == [1, 2, 3, 4, 5]
+    assert events["new"] == [1, 2, 3, 4]
+    assert sync.cache.get_message(sync.mailbox, 1)["subject"] == "Subject 2"  # Old UID 2 is now UID 1
+    counts = sync.cache.counts(sync.mailbox)
+    assert (counts["uidvalidity"], counts["last_uid"], counts["total"]) == (8, 4, 4)
+
+
+def test_body_is_fetched_on_first_read_and_cached(sync, mailbox):
+    sync.sync()
+    start = len(mailbox.commands)
+
+    message = sync.get_message(4)
+
+    assert "Body of message 4." in message["body"]
+    assert message["body_cached"] is True
+    assert len(_commands_since(mailbox, start, "BODY.PEEK[]")) == 1
+
+    start = len(mailbox.commands)
+    assert "Body of message 4." in sync.get_message(4)["body"]
+    assert mailbox.commands[start:] == []
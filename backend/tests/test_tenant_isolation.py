@@ -0,0 +1,88 @@
+"""
+Tenant isolation tests - Client-supplied doc ids on the session index and summary paths
+"""
+import uuid
+
+import chromadb
+import pytest
+
+import knowledge_base
+from session_index import SessionIndexCache
+from summaries import SummaryIndex
+
+DIMENSION = 4
+
+
+def _vector(i: int):
+    vector = [0.0] * DIMENSION
+    vector[i % DIMENSION] = 1.0
+    return vector
+
+
+@pytest.fixture
+def client():
+    return chromadb.EphemeralClient()
+
+
+@pytest.fixture
+def chunks(client, monkeypatch):
+    """Knowledge base with one document per tenant"""
+    collection = client.create_collection(f"kb_{uuid.uuid4().hex}")
+    for n, (doc_id, tenant) in enumerate((("doc_a", "acme"), ("doc_b", "globex"))):
+        collection.add(
+            ids=[f"{doc_id}_chunk_{i}" for i in range(2)],
+            embeddings=[_vector(n * 2 + i) for i in range(2)],
+            documents=[f"{tenant} text {i}" for i in range(2)],
+            metadatas=[{"doc_id": doc_id, "chunk_id": i, "filename": f"{doc_id}.txt", "tenant": tenant}
+                       for i in range(2)],
+        )
+    monkeypatch.setattr(knowledge_base, "get_collection", lambda: collection)
+    return collection
+
+
+@pytest.fixture
+def summary_index(client):
+    collection = client.create_collection(f"summaries_{uuid.uuid4().hex}")
+    for n, (doc_id, tenant) in enumerate((("doc_a", "acme"), ("doc_b", "globex"))):
+        collection.add(
+            ids=[f"{doc_id}_summary"], embeddings=[_vector(n)], documents=[f"Summary of the {tenant} document"],
+            metadatas=[{"doc_id": doc_id, "filename": f"{doc_id}.txt", "tenant": tenant, "level": "document"}],
+        )
+    index = SummaryIndex(llm_enabled=False)
+    index._collection = collection
+    return index
+
+
+def test_session_query_skips_other_tenants_document(chunks):
+    results = SessionIndexCache().query("conv", ["doc_b"], _vector(2), top_k=5, tenant="acme")
+
+    assert results is None or results["ids"] == [[]]
+
+
+def test_session_query_keeps_own_tenants_document(chunks):
+    cache = SessionIndexCache()
+
+    results = cache.query("conv", ["doc_a", "doc_b"], _vector(0), top_k=5, tenant="acme")
+
+    assert {metadata["doc_id"] for metadata in results["metadatas"][0]} == {"doc_a"}
+
+
+def test_session_query_filters_documents_already_loaded(chunks):
+    cache = SessionIndexCache()
+    cache.query("conv", ["doc_a", "doc_b"], _vector(0), top_k=5)  # No tenant: both documents are loaded
+
+    results = cache.query("conv", ["doc_a", "doc_b"], _vector(2), top_k=5, tenant="acme")
+
+    assert {metadata["doc_id"] for metadata in results["metadatas"][0]} == {"doc_a"}
+
+
+def test_summary_context_skips_other_tenants_document(summary_index):
+    assert summary_index.context_for("summarize", [_vector(1)], 4000, ["doc_b"], tenant="acme") is None
+
+
+def test_summary_context_keeps_own_tenants_document(summary_index):
+    context, sources, covered = summary_index.context_for("summarize", [_vector(0)], 4000, ["doc_a"], tenant="acme")
+
+    assert covered == 1
+    assert sources == ["doc_a.txt (summary)"]
+    assert "acme" in context
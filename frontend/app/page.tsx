@@ -540,9 +540,9 @@ export default function Home() {
     }
   }
 
-  const deleteDocument = async (docId: string | number) => {
+  const deleteDocument = async (docId: string) => {
     try {
-      await axios.delete(`http://localhost:8000/knowledge-base/document/${docId}`)
+      await axios.delete(`http://localhost:8000/documents/${encodeURIComponent(docId)}`)
 
       const successMessage: Message = {
         id: Date.now().toString(),
@@ -826,8 +826,9 @@ export default function Home() {
                             </div>
                           </div>
                           <button
-                            onClick={() => deleteDocument(doc.id || index)}
-                            className="p-2 text-gray-400 hover:text-red-600 hover:bg-red-50 rounded-lg transition-colors"
+                            onClick={() => doc.doc_id && deleteDocument(doc.doc_id)}
+                            disabled={!doc.doc_id}
+                            className="p-2 text-gray-400 hover:text-red-600 hover:bg-red-50 rounded-lg transition-colors disabled:opacity-50 disabled:cursor-not-allowed"
                             title="Delete document"
                           >
                             <svg